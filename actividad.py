@@ -0,0 +1,106 @@
+# actividad.py
+"""
+Mapa de bits de actividad diaria por usuario y chat.
+
+Un bit por día (bit i = día base_dia + i, días como ordinal de fecha) en
+un entero de Python que se guarda como bytes en activity_bitmaps. Un año
+de actividad ocupa 46 bytes. Marcar un día es un OR; la racha actual, la
+racha máxima y los días activos en una ventana se calculan con
+operaciones de bits sobre el entero, sin consultar user_points.
+
+Este módulo no toca la base de datos (db.py lo usa al sumar puntos).
+"""
+
+from datetime import date, datetime
+from typing import Optional, Union
+
+def dia(instante: Union[date, datetime, str, None] = None) -> int:
+    """Ordinal del día de una fecha, datetime o texto ISO (hoy si no se indica)"""
+    if instante is None:
+        return date.today().toordinal()
+    if isinstance(instante, str):
+        instante = datetime.fromisoformat(instante[:10]).date()
+    elif isinstance(instante, datetime):
+        instante = instante.date()
+    return instante.toordinal()
+
+class BitmapActividad:
+    """Días con actividad a partir de base_dia"""
+
+    __slots__ = ("base_dia", "bits")
+
+    def __init__(self, base_dia: int = 0, bits: int = 0):
+        self.base_dia = base_dia
+        self.bits = bits
+
+    @classmethod
+    def desde_bytes(cls, base_dia: int, datos: Optional[bytes]) -> "BitmapActividad":
+        return cls(base_dia, int.from_bytes(bytes(datos or b""), "little"))
+
+    def a_bytes(self) -> bytes:
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+
+    def marcar(self, dia_ordinal: int) -> bool:
+        """Marca un día como activo; devuelve False si ya lo estaba"""
+        if not self.bits:
+            self.base_dia = dia_ordinal
+        elif dia_ordinal < self.base_dia:
+            # Día anterior a la base (p. ej. al rellenar historial): se desplaza todo
+            self.bits <<= self.base_dia - dia_ordinal
+            self.base_dia = dia_ordinal
+        bit = 1 << (dia_ordinal - self.base_dia)
+        if self.bits & bit:
+            return False
+        self.bits |= bit
+        return True
+
+    def unir(self, otro: "BitmapActividad") -> None:
+        """Añade los días activos de otro mapa"""
+        if not otro.bits:
+            return
+        if not self.bits:
+            self.base_dia, self.bits = otro.base_dia, otro.bits
+            return
+        base = min(self.base_dia, otro.base_dia)
+        self.bits = (self.bits << (self.base_dia - base)) | (otro.bits << (otro.base_dia - base))
+        self.base_dia = base
+
+    def activo(self, dia_ordinal: int) -> bool:
+        indice = dia_ordinal - self.base_dia
+        return indice >= 0 and bool((self.bits >> indice) & 1)
+
+    @property
+    def total(self) -> int:
+        """Días activos en total"""
+        return self.bits.bit_count()
+
+    def dias_activos(self, desde: int, hasta: int) -> int:
+        """Días activos entre desde y hasta (ordinales, ambos incluidos)"""
+        inicio = max(desde - self.base_dia, 0)
+        fin = hasta - self.base_dia
+        if fin < inicio:
+            return 0
+        return ((self.bits >> inicio) & ((1 << (fin - inicio + 1)) - 1)).bit_count()
+
+    def racha_actual(self, hoy: Optional[int] = None) -> int:
+        """Días seguidos activos hasta hoy; la racha sigue viva si el último fue ayer"""
+        indice = (dia() if hoy is None else hoy) - self.base_dia
+        if indice >= 0 and not (self.bits >> indice) & 1:
+            indice -= 1
+        if indice < 0 or not (self.bits >> indice) & 1:
+            return 0
+        mascara = (1 << (indice + 1)) - 1
+        # El cero más alto por debajo de `indice` marca dónde empezó la racha
+        ceros = ~self.bits & mascara
+        return indice + 1 - ceros.bit_length()
+
+    def racha_maxima(self) -> int:
+        """Racha más larga: cada x &= x >> 1 acorta en uno todas las rachas"""
+        bits, longitud = self.bits, 0
+        while bits:
+            bits &= bits >> 1
+            longitud += 1
+        return longitud
+
+    def __repr__(self) -> str:
+        return f"BitmapActividad(base_dia={self.base_dia}, dias={self.total})"
@@ -0,0 +1,132 @@
+# apagado.py
+"""
+Apagado ordenado del bot.
+
+Al recibir SIGTERM/SIGINT (o al perder el liderazgo) el coordinador:
+  1. deja de pedir updates a Telegram (para el Updater)
+  2. espera a los updates ya recibidos, hasta un plazo; los que sigan
+     pendientes al vencer se cancelan
+  3. vacía el estado en memoria con los hooks registrados en al_vaciar
+     (tendencias, ventanas de spam, marca de agua...)
+  4. cierra recursos en orden con los hooks de al_cerrar (cola de salida,
+     sesiones HTTP, lock de líder...)
+y deja en el log lo que tardó cada fase. Los hooks pueden ser funciones
+normales o corrutinas; el fallo de uno no impide que se ejecuten los demás.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Union[None, Awaitable[None]]]
+
+class CoordinadorApagado:
+    """Secuencia de apagado: dejar de recibir, drenar, vaciar y cerrar"""
+
+    def __init__(self, plazo_drenaje: float = 20.0):
+        self.plazo_drenaje = plazo_drenaje
+        self._vaciar: List[Tuple[str, Hook]] = []
+        self._cerrar: List[Tuple[str, Hook]] = []
+        self._tarea: Optional[asyncio.Task] = None
+        self.iniciado = False
+        self.duraciones: dict = {}
+        self.cancelados = 0
+
+    def al_vaciar(self, nombre: str, hook: Hook) -> None:
+        """Registra un hook que persiste estado en memoria (se ejecutan en orden de registro)"""
+        self._vaciar.append((nombre, hook))
+
+    def al_cerrar(self, nombre: str, hook: Hook) -> None:
+        """Registra un hook que libera un recurso (se ejecutan en orden de registro)"""
+        self._cerrar.append((nombre, hook))
+
+    def solicitar(self, application) -> None:
+        """Inicia el apagado desde el loop y, al terminar, devuelve el control a run_polling"""
+        if self._tarea is not None or self.iniciado:
+            return
+        logger.info("🛑 Apagado solicitado, dejando de recibir updates...")
+        loop = asyncio.get_running_loop()
+        self._tarea = loop.create_task(self.apagar(application))
+        self._tarea.add_done_callback(lambda _: loop.stop())
+
+    @staticmethod
+    def _pendientes(application) -> int:
+        """Updates recibidos que aún no terminaron de procesarse"""
+        procesador = application.update_processor
+        pendientes = application.update_queue.qsize()
+        if hasattr(procesador, "pendientes"):
+            pendientes += procesador.pendientes()
+        return pendientes
+
+    @staticmethod
+    async def _parar_recepcion(application) -> None:
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+
+    async def _drenar(self, application) -> None:
+        limite = time.monotonic() + self.plazo_drenaje
+        while self._pendientes(application) and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        self.cancelados = self._pendientes(application)
+        if self.cancelados:
+            logger.warning(f"⚠️ Plazo de drenaje agotado: se cancelan {self.cancelados} updates en curso")
+            await application.update_processor.shutdown()
+        if application.running:
+            # stop() espera a que la cola de PTB se vacíe; con updates cancelados
+            # podría no volver nunca, así que también lleva plazo
+            try:
+                await asyncio.wait_for(application.stop(), timeout=max(limite - time.monotonic(), 1.0))
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ La aplicación no terminó de pararse a tiempo, se continúa el apagado")
+
+    async def _ejecutar(self, fase: str, hooks: List[Tuple[str, Hook]]) -> None:
+        for nombre, hook in hooks:
+            inicio = time.perf_counter()
+            try:
+                resultado = hook()
+                if inspect.isawaitable(resultado):
+                    await resultado
+            except Exception as e:
+                logger.error(f"❌ Error en {fase} ({nombre}): {e}")
+            self.duraciones[f"{fase}:{nombre}"] = time.perf_counter() - inicio
+
+    async def apagar(self, application) -> None:
+        """Ejecuta las cuatro fases; sólo la primera llamada hace algo"""
+        if self.iniciado:
+            return
+        self.iniciado = True
+        inicio = time.perf_counter()
+        fases = [
+            ("recepción", lambda: self._parar_recepcion(application)),
+            ("drenaje", lambda: self._drenar(application)),
+            ("vaciado", lambda: self._ejecutar("vaciado", self._vaciar)),
+            ("cierre", lambda: self._ejecutar("cierre", self._cerrar)),
+        ]
+        for fase, paso in fases:
+            comienzo = time.perf_counter()
+            try:
+                await paso()
+            except Exception as e:
+                logger.error(f"❌ Error en la fase de {fase} del apagado: {e}")
+            self.duraciones[fase] = time.perf_counter() - comienzo
+            logger.info(f"⏹️ Apagado · {fase}: {self.duraciones[fase] * 1000:.0f} ms")
+        self.duraciones["total"] = time.perf_counter() - inicio
+        logger.info(f"✅ Apagado completo en {self.duraciones['total']:.2f}s")
+
+    def metricas(self) -> dict:
+        return {
+            "iniciado": self.iniciado,
+            "plazo_drenaje": self.plazo_drenaje,
+            "cancelados": self.cancelados,
+            "duraciones_ms": {fase: round(d * 1000, 1) for fase, d in self.duraciones.items()},
+        }
+
+def crear_coordinador_desde_config() -> CoordinadorApagado:
+    """Crea el coordinador con el plazo de SHUTDOWN_DRAIN_TIMEOUT"""
+    from config import Config
+
+    return CoordinadorApagado(plazo_drenaje=Config.SHUTDOWN_DRAIN_TIMEOUT)
@@ -0,0 +1,86 @@
+# arranque.py
+"""
+Perfil del arranque en frío.
+
+bot.py importa este módulo antes que nada, así que INICIO marca el
+comienzo del proceso (a efectos prácticos). Cada fase se cierra con
+marcar(nombre) y dura lo transcurrido desde la anterior; los pasos que
+corren en paralelo dentro de una fase se miden aparte con medir(). Al
+empezar el polling, informe() escribe el desglose en el log y queda en
+/metrics bajo "arranque" para comparar entre despliegues.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+INICIO = time.perf_counter()
+
+class PerfilArranque:
+    """Duración de cada fase del arranque y de sus pasos concurrentes"""
+
+    def __init__(self, inicio: float = INICIO):
+        self.inicio = inicio
+        self._ultima = inicio
+        self._fases: List[Tuple[str, float]] = []
+        self._pasos: List[Tuple[str, str, float]] = []
+        self._lock = threading.Lock()
+        self.terminado = False
+
+    def marcar(self, nombre: str) -> float:
+        """Cierra la fase `nombre`; devuelve su duración en segundos"""
+        ahora = time.perf_counter()
+        duracion = ahora - self._ultima
+        self._ultima = ahora
+        with self._lock:
+            self._fases.append((nombre, duracion))
+        return duracion
+
+    def medir(self, nombre: str, funcion: Callable, *args):
+        """Ejecuta un paso de la fase en curso (puede ir en un hilo) y guarda su duración"""
+        fase = f"#{len(self._fases) + 1}"
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            with self._lock:
+                self._pasos.append((fase, nombre, time.perf_counter() - inicio))
+
+    @property
+    def total(self) -> float:
+        return self._ultima - self.inicio
+
+    def informe(self) -> str:
+        """Tabla con las fases (y sus pasos en paralelo) y el total"""
+        with self._lock:
+            fases, pasos = list(self._fases), list(self._pasos)
+        lineas = ["⏱️ Arranque en frío:"]
+        for indice, (nombre, duracion) in enumerate(fases, 1):
+            lineas.append(f"   {nombre:<24}{duracion * 1000:>9.1f} ms")
+            for fase, paso, duracion_paso in pasos:
+                if fase == f"#{indice}":
+                    lineas.append(f"     ∥ {paso:<20}{duracion_paso * 1000:>9.1f} ms")
+        lineas.append(f"   {'total':<24}{self.total * 1000:>9.1f} ms")
+        return "\n".join(lineas)
+
+    def terminar(self, nombre: str) -> None:
+        """Cierra la última fase y escribe el informe en el log (una sola vez)"""
+        if self.terminado:
+            return
+        self.marcar(nombre)
+        self.terminado = True
+        logger.info(self.informe())
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "total_ms": round(self.total * 1000, 1),
+                "fases_ms": {nombre: round(d * 1000, 1) for nombre, d in self._fases},
+                "pasos_ms": {nombre: round(d * 1000, 1) for _, nombre, d in self._pasos},
+                "terminado": self.terminado,
+            }
+
+perfil = PerfilArranque()
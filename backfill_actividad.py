@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Construye los mapas de actividad diaria (activity_bitmaps) a partir del
+historial de user_points. Sólo hace falta una vez tras desplegar los
+mapas: desde entonces add_points los mantiene al día.
+
+Lee los días distintos por usuario y chat en lotes y une el resultado
+con lo que ya haya guardado, así que se puede ejecutar con el bot en
+marcha y repetir sin riesgo.
+
+Uso:
+    python3 backfill_actividad.py
+    python3 backfill_actividad.py --lote 5000
+"""
+
+import argparse
+import logging
+import time
+
+import db
+from actividad import BitmapActividad, dia
+
+logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def construir_mapas(lote: int) -> dict:
+    """{(user_id, chat_id): BitmapActividad} con un bit por cada día con puntos"""
+    mapas = {}
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        # created_at va en milisegundos desde epoch (ver db.epoch_ms)
+        if db.is_postgresql():
+            fecha = "to_timestamp(created_at / 1000.0)::date"
+        else:
+            fecha = "date(created_at / 1000, 'unixepoch', 'localtime')"
+        cursor.execute(
+            f"SELECT DISTINCT user_id, chat_id, {fecha} FROM user_points WHERE created_at IS NOT NULL"
+        )
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                break
+            for user_id, chat_id, fecha in filas:
+                mapas.setdefault((user_id, chat_id), BitmapActividad()).marcar(dia(fecha))
+    finally:
+        cursor.close()
+        conn.close()
+    return mapas
+
+def main():
+    parser = argparse.ArgumentParser(description="Rellena activity_bitmaps desde user_points")
+    parser.add_argument("--lote", type=int, default=10_000, help="Filas leídas por lote")
+    args = parser.parse_args()
+
+    db.create_all_tables()
+    inicio = time.perf_counter()
+    mapas = construir_mapas(args.lote)
+    dias = sum(m.total for m in mapas.values())
+    logger.info(f"📅 {len(mapas)} usuarios/chat con {dias} días activos leídos")
+
+    db.merge_activity_bitmaps(mapas)
+    tamaño = sum(len(m.a_bytes()) for m in mapas.values())
+    logger.info(f"✅ Mapas guardados ({tamaño} bytes en total) en {time.perf_counter() - inicio:.1f}s")
+
+if __name__ == "__main__":
+    main()
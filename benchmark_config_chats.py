@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark del coste de consultar la configuración de un chat por mensaje:
+db.get_chat_config (una consulta por llamada) frente a la caché de
+configuracion_chats (configuración + reglas de puntuación efectivas).
+
+Crea --chats chats (10.000 por defecto) en un SQLite nuevo en un
+directorio temporal, un 10% de ellos con ajustes de puntuación propios, y
+simula mensajes repartidos entre ellos. DATABASE_URL se ignora: para medir
+contra PostgreSQL hay que pasar --database-url con una base de datos
+desechable. Los chats de prueba se borran al terminar.
+
+Uso:
+    python3 benchmark_config_chats.py
+    python3 benchmark_config_chats.py --chats 10000 --mensajes 20000
+    python3 benchmark_config_chats.py --database-url postgresql://localhost/puntum_bench
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456789:BENCH-BENCH-BENCH-BENCH-BENCH-BENCH")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def limpiar(ids: list) -> None:
+    """Borra los chats de prueba (también los que dejara una ejecución interrumpida)"""
+    import db
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    marca = "%s" if db.is_postgresql() else "?"
+    for tabla in ("chat_scoring", "chat_config"):
+        cursor.executemany(f"DELETE FROM {tabla} WHERE chat_id = {marca}", [(chat_id,) for chat_id in ids])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def poblar(chats: int, con_ajustes: float) -> list:
+    import db
+
+    db.create_all_tables()
+    ids = [-1000000000000 - i for i in range(chats)]
+    limpiar(ids)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    marca = "%s" if db.is_postgresql() else "?"
+    cursor.executemany(
+        f"INSERT INTO chat_config (chat_id, chat_name, rankings_enabled, challenges_enabled) "
+        f"VALUES ({marca}, {marca}, {marca}, {marca})",
+        [(chat_id, f"Grupo {chat_id}", True, True) for chat_id in ids],
+    )
+    ajustes = json.dumps({"hashtags": {"documental": {"points": 8}, "spoiler": {"points": 0}}})
+    cursor.executemany(
+        f"INSERT INTO chat_scoring (chat_id, overrides) VALUES ({marca}, {marca})",
+        [(chat_id, ajustes) for chat_id in ids[: int(chats * con_ajustes)]],
+    )
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return ids
+
+def medir(funcion, secuencia) -> float:
+    inicio = time.perf_counter()
+    for chat_id in secuencia:
+        funcion(chat_id)
+    return (time.perf_counter() - inicio) / len(secuencia)
+
+def medir_todo(args, ids: list) -> None:
+    import db
+    from configuracion_chats import configuracion_chats, reglas_para_chat
+
+    aleatorio = random.Random(3)
+    secuencia = [aleatorio.choice(ids) for _ in range(args.mensajes)]
+
+    inicio = time.perf_counter()
+    configuracion_chats.cargar()
+    carga = time.perf_counter() - inicio
+
+    # Calentamiento: compila las reglas de los chats con ajustes que aparecen en la secuencia
+    for chat_id in secuencia:
+        reglas_para_chat(chat_id)
+
+    # La consulta directa es lenta: basta con una muestra para estimar el coste por mensaje
+    muestra = secuencia[: min(len(secuencia), 2000)]
+    por_consulta = medir(db.get_chat_config, muestra)
+    por_cache = medir(lambda chat_id: (configuracion_chats.obtener(chat_id), reglas_para_chat(chat_id)), secuencia)
+
+    print(f"\n{args.chats} chats ({int(args.chats * args.con_ajustes)} con ajustes), "
+          f"{args.mensajes} mensajes")
+    print(f"carga inicial de la caché: {carga * 1000:.1f} ms (una vez al arrancar)")
+    print(f"{'método':<28} {'µs/mensaje':>11}")
+    print(f"{'db.get_chat_config':<28} {por_consulta * 1e6:>11.1f}")
+    print(f"{'caché (config + reglas)':<28} {por_cache * 1e6:>11.2f}")
+    print(f"aceleración: {por_consulta / por_cache:.0f}x")
+    print(f"métricas: {configuracion_chats.metricas()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la configuración por chat")
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--mensajes", type=int, default=20_000)
+    parser.add_argument("--con-ajustes", type=float, default=0.1, help="Fracción de chats con ajustes")
+    parser.add_argument("--database-url", default="",
+                        help="PostgreSQL desechable para el benchmark (por defecto, SQLite temporal)")
+    args = parser.parse_args()
+
+    if args.database_url and args.database_url == os.environ.get("DATABASE_URL"):
+        sys.exit("❌ --database-url es la DATABASE_URL del bot: usa una base de datos desechable")
+    # Vacías (no borradas) para que load_dotenv no las rellene desde un .env
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_REPLICA_URL"] = ""
+    os.environ["POINTS_SPOOL_PATH"] = "spool_puntos.db"
+
+    directorio = tempfile.mkdtemp(prefix="puntum_bench_")
+    os.chdir(directorio)
+    print(f"📂 Directorio de trabajo: {directorio}")
+
+    ids = poblar(args.chats, args.con_ajustes)
+    try:
+        medir_todo(args, ids)
+    finally:
+        limpiar(ids)
+
+if __name__ == "__main__":
+    main()
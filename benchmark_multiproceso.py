@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Benchmark del modo multiproceso: throughput de extremo a extremo (POST al
+receptor de webhook -> worker -> manejadores) con 1, 2, 4 y 8 workers en
+la misma máquina. Los workers usan el Bot simulado de reproducir_trafico,
+así que no se envía nada a Telegram; la base de datos es un SQLite nuevo
+en un directorio temporal. DATABASE_URL se ignora: para medir contra
+PostgreSQL hay que pasar --database-url con una base de datos desechable.
+Los chats de prueba (y sus puntos, logros...) se borran al terminar.
+
+Uso:
+    python3 benchmark_multiproceso.py
+    python3 benchmark_multiproceso.py --workers 1 2 4 --updates 5000 --chats 200
+    python3 benchmark_multiproceso.py --database-url postgresql://localhost/puntum_bench
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("BOT_TOKEN", "123456789:BENCH-BENCH-BENCH-BENCH-BENCH-BENCH")
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RAIZ)
+
+TEXTOS = [
+    "#pelicula El padrino sigue siendo la mejor película de la historia del cine",
+    "#critica Una dirección impecable, la fotografía y el guion funcionan a la perfección "
+    "y las actuaciones sostienen cada escena sin caer en el melodrama fácil",
+    "alguien vio la nueva de Villeneuve?",
+    "jajaja",
+    "#recomendacion Título: Amélie / Año: 2001 / Por qué verla: por su fotografía",
+    "#debate ¿Es mejor el cine de antes o el de ahora?",
+    "me quedo con la original, la secuela no aporta nada",
+]
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+def generar_updates(cantidad: int, chats: int, inicio: int = 1):
+    """Updates sintéticos de texto repartidos entre `chats` grupos"""
+    aleatorio = random.Random(42)
+    for i in range(cantidad):
+        chat_id = -1000000000000 - aleatorio.randrange(chats)
+        user_id = 1000 + aleatorio.randrange(chats * 5)
+        yield {
+            "update_id": inicio + i,
+            "message": {
+                "message_id": inicio + i,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup", "title": f"Grupo {chat_id}"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"Usuario{user_id}"},
+                "text": aleatorio.choice(TEXTOS),
+            },
+        }
+
+# Tablas con chat_id en las que escriben los manejadores durante el benchmark
+TABLAS_CON_CHAT = (
+    "active_games", "active_trivias", "authorized_chats", "auth_requests", "user_points",
+    "user_ranking", "chat_config", "challenges", "chat_scoring", "activity_bitmaps",
+    "user_achievements", "user_points_summary", "chats",
+)
+
+def autorizar_chats(chats: int) -> None:
+    from db import create_all_tables
+    from sistema_autorizacion import authorize_chat
+
+    create_all_tables()
+    for i in range(chats):
+        chat_id = -1000000000000 - i
+        authorize_chat(chat_id, f"Grupo {chat_id}", 1)
+
+def limpiar_chats(chats: int) -> None:
+    """Borra todo lo escrito para los chats de prueba"""
+    import db
+
+    ids = [(-1000000000000 - i,) for i in range(chats)]
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    marca = "%s" if db.is_postgresql() else "?"
+    # point_awards sólo existe en PostgreSQL (ver migraciones/m0004_retencion_puntos.py)
+    for tabla in TABLAS_CON_CHAT + (("point_awards",) if db.is_postgresql() else ()):
+        cursor.executemany(f"DELETE FROM {tabla} WHERE chat_id = {marca}", ids)
+    cursor.executemany(f"DELETE FROM rate_limit_state WHERE scope = 'tendencias' AND key = {marca}",
+                       [(str(chat_id),) for (chat_id,) in ids])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def enviar(puerto: int, ruta: str, lote) -> None:
+    """Envía un lote de updates por una conexión keep-alive"""
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+    for datos in lote:
+        cuerpo = json.dumps(datos).encode()
+        conexion.request("POST", ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+    conexion.close()
+
+def esperar_procesados(receptor, objetivo: int, timeout: float) -> bool:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if sum(receptor.procesados[:]) >= objetivo:
+            return True
+        time.sleep(0.01)
+    return False
+
+def medir(workers: int, updates: int, chats: int, clientes: int) -> dict:
+    from multiproceso import ReceptorWebhook, shard_de_update
+
+    puerto = _puerto_libre()
+    receptor = ReceptorWebhook(workers, puerto, "/webhook", simulado=True)
+    receptor.iniciar()
+    try:
+        # Calentamiento: al menos un update por worker, y esperar a que todos estén listos
+        calentamiento = []
+        cubiertos = set()
+        for datos in generar_updates(chats * 4, chats, inicio=10_000_000):
+            indice = shard_de_update(datos, workers)
+            if indice not in cubiertos:
+                cubiertos.add(indice)
+                calentamiento.append(datos)
+        enviar(puerto, "/webhook", calentamiento)
+        if not esperar_procesados(receptor, len(calentamiento), 120):
+            raise RuntimeError("los workers no arrancaron a tiempo")
+        base = sum(receptor.procesados[:])
+
+        lotes = [[] for _ in range(clientes)]
+        for i, datos in enumerate(generar_updates(updates, chats)):
+            lotes[i % clientes].append(datos)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clientes) as ejecutor:
+            list(ejecutor.map(lambda lote: enviar(puerto, "/webhook", lote), lotes))
+        recibidos = time.perf_counter() - inicio
+        completo = esperar_procesados(receptor, base + updates, 300)
+        duracion = time.perf_counter() - inicio
+
+        por_worker = [receptor.procesados[i] for i in range(workers)]
+        return {
+            "workers": workers,
+            "updates": updates,
+            "completo": completo,
+            "recepcion_s": recibidos,
+            "duracion_s": duracion,
+            "updates_s": updates / duracion,
+            "por_worker": por_worker,
+        }
+    finally:
+        receptor.detener(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escalado del modo multiproceso")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--clientes", type=int, default=16, help="Conexiones HTTP simultáneas")
+    parser.add_argument("--database-url", default="",
+                        help="PostgreSQL desechable para el benchmark (por defecto, SQLite temporal)")
+    args = parser.parse_args()
+
+    if args.database_url and args.database_url == os.environ.get("DATABASE_URL"):
+        sys.exit("❌ --database-url es la DATABASE_URL del bot: usa una base de datos desechable")
+    # Vacías (no borradas) para que load_dotenv no las rellene desde un .env; los workers las heredan
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_REPLICA_URL"] = ""
+    os.environ["POINTS_SPOOL_PATH"] = "spool_puntos.db"
+
+    directorio = tempfile.mkdtemp(prefix="puntum_bench_")
+    os.chdir(directorio)
+    print(f"📂 Directorio de trabajo: {directorio}")
+    autorizar_chats(args.chats)
+
+    resultados = []
+    try:
+        for workers in args.workers:
+            print(f"\n⏱️ Midiendo con {workers} worker(s)...")
+            resultado = medir(workers, args.updates, args.chats, args.clientes)
+            resultados.append(resultado)
+            print(f"   {resultado['updates_s']:.0f} updates/s "
+                  f"({resultado['duracion_s']:.2f}s, recepción {resultado['recepcion_s']:.2f}s, "
+                  f"completo: {resultado['completo']})")
+    finally:
+        limpiar_chats(args.chats)
+
+    base = resultados[0]["updates_s"]
+    print("\n" + "=" * 60)
+    print(f"{'workers':>8} {'updates/s':>10} {'aceleración':>12} {'eficiencia':>11}")
+    for resultado in resultados:
+        aceleracion = resultado["updates_s"] / base
+        eficiencia = aceleracion / (resultado["workers"] / resultados[0]["workers"])
+        print(f"{resultado['workers']:>8} {resultado['updates_s']:>10.0f} "
+              f"{aceleracion:>11.2f}x {eficiencia:>10.0%}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark del detector de spam: implementación anterior de
+SecurityManager.is_spam_content frente a SpamEngine (handlers/spam.py).
+
+Uso:
+    python3 benchmark_spam.py
+    python3 benchmark_spam.py --longitudes 200 2000 20000 --repeticiones 300
+"""
+
+import argparse
+import random
+import re
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from handlers.spam import SpamEngine
+
+RUTA_REGLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spam_rules.json")
+
+# Copia literal de la implementación anterior, como referencia
+PATRONES_ANTERIORES = [
+    r'(?i)(descarga|download)\s+(gratis|free)',
+    r'(?i)(oferta|promocion|descuento)\s*[0-9]+%',
+    r'(?i)(gana|earn)\s+(dinero|money)',
+    r'https?://(?!t\.me|youtube\.com|imdb\.com)',
+    r'(?i)telegram\s*@\w+',
+]
+
+def is_spam_content_anterior(text):
+    for pattern in PATRONES_ANTERIORES:
+        if re.search(pattern, text):
+            return "Patrón spam detectado"
+    if len(text) > 20:
+        caps_ratio = sum(1 for c in text if c.isupper()) / len(text)
+        if caps_ratio > 0.7:
+            return "Exceso de mayúsculas"
+    if re.search(r'(.)\1{4,}', text):
+        return "Repetición excesiva de caracteres"
+    return None
+
+PALABRAS = (
+    "la película tiene una fotografía preciosa y un guion que no decae nunca "
+    "aunque el tercer acto se alarga demasiado y la banda sonora de Morricone "
+    "sostiene cada escena del director con actuaciones memorables en Cannes"
+).split()
+
+def mensaje_normal(longitud, aleatorio):
+    palabras = []
+    total = 0
+    while total < longitud:
+        palabra = aleatorio.choice(PALABRAS)
+        palabras.append(palabra)
+        total += len(palabra) + 1
+    return " ".join(palabras)[:longitud]
+
+def corpus(longitud, aleatorio):
+    """Mezcla realista: casi todo limpio, algo de spam al final del mensaje"""
+    base = [mensaje_normal(longitud, aleatorio) for _ in range(8)]
+    return base + [
+        mensaje_normal(longitud, aleatorio) + " descarga gratis aquí",
+        mensaje_normal(longitud, aleatorio).upper(),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de spam")
+    parser.add_argument("--longitudes", type=int, nargs="+", default=[100, 1000, 4000, 16000])
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(7)
+    motor = SpamEngine(RUTA_REGLAS)
+    assert len(motor._reglas.reglas) == len(PATRONES_ANTERIORES)
+
+    print(f"{'longitud':>9} {'anterior µs/msg':>16} {'motor µs/msg':>13} {'aceleración':>12}")
+    for longitud in args.longitudes:
+        mensajes = corpus(longitud, aleatorio)
+
+        # Ambos deben decidir lo mismo (spam / no spam) sobre el mismo corpus
+        for texto in mensajes:
+            assert (is_spam_content_anterior(texto) is None) == (motor.analizar(texto) is None), texto[:60]
+
+        anterior = timeit.timeit(lambda: [is_spam_content_anterior(t) for t in mensajes],
+                                 number=args.repeticiones)
+        nuevo = timeit.timeit(lambda: [motor.analizar(t) for t in mensajes], number=args.repeticiones)
+        por_mensaje = args.repeticiones * len(mensajes)
+        print(f"{longitud:>9} {anterior / por_mensaje * 1e6:>16.1f} {nuevo / por_mensaje * 1e6:>13.1f} "
+              f"{anterior / nuevo:>11.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 # bot.py
 #!/usr/bin/env python3
 
+# Primero: marca el inicio del perfil de arranque
+from arranque import perfil
+
 import os
 import threading
 import asyncio
 import signal
 import sys
+import json
+import atexit
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from telegram.ext import (
     ApplicationBuilder,
@@ -14,6 +19,7 @@ from telegram.ext import (
     filters,
     CallbackQueryHandler,
     ContextTypes,
+    TypeHandler,
     Application
 )
 from telegram import Update
@@ -26,6 +32,7 @@ from comandos_basicos import (
     cmd_ranking,
     cmd_miperfil,
     cmd_reto,
+    cmd_tendencias,
 )
 
 # Importar desde hashtags.py
@@ -52,7 +59,9 @@ from sistema_autorizacion import (
     cmd_solicitar_autorizacion,
     cmd_aprobar_grupo,
     cmd_ver_solicitudes,
-    cmd_status_auth
+    cmd_status_auth,
+    cmd_recargar_reglas,
+    cmd_puntos_chat
 )
 
 # Importar funciones de db.py
@@ -61,6 +70,23 @@ from db import (
     get_connection
 )
 from db import get_configured_chats, save_chat_config, get_chat_config
+from db import load_rate_limit_state, save_rate_limit_state, replay_point_spool
+from spool_puntos import reaplicar_periodicamente
+from retencion import compactar_periodicamente
+from hashtags import export_spam_cache, import_spam_cache
+from configuracion_chats import configuracion_chats
+from tendencias import tendencias
+
+# Grabación opcional de tráfico para perfilado
+from grabador_trafico import crear_grabador_desde_config
+
+# Cola de salida con control de flood y métricas
+from cola_salida import despachador
+from metricas import obtener_metricas, registrar_fuente
+from planificador_updates import crear_procesador_desde_config
+from recuperacion import LimitadorRecuperacion, recuperacion
+from liderazgo import MarcaAguaUpdates, UpdaterConMarca, crear_eleccion_desde_config
+from apagado import crear_coordinador_desde_config
 
 # Configurar logging
 import logging
@@ -69,10 +95,16 @@ logging.basicConfig(
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
+perfil.marcar("imports")
 
 # Variables globales para manejo de shutdown
 shutdown_event = threading.Event()
 application = None
+lider = None
+coordinador = None
+
+# Ámbito en rate_limit_state de las ventanas de spam de hashtags
+AMBITO_VENTANAS_SPAM = "hashtags"
 
 # Cargar configuración del bot
 def load_config():
@@ -105,16 +137,26 @@ def load_config():
 
 # Cargar configuración
 BOT_TOKEN, ADMIN_USER_ID = load_config()
+perfil.marcar("configuración")
 
 # Clase de servidor HTTP mejorada
 class HealthCheckHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path.startswith('/metrics'):
+            self.send_metrics()
+            return
+
         self.send_response(200)
         self.send_header('Content-type', 'text/html')
         self.end_headers()
         
         # Estado del bot
-        bot_status = "🟢 Activo" if application and not shutdown_event.is_set() else "🔴 Inactivo"
+        if application and not shutdown_event.is_set():
+            bot_status = "🟢 Activo"
+        elif lider and not lider.es_lider and not shutdown_event.is_set():
+            bot_status = "🟡 En espera (otra instancia hace polling)"
+        else:
+            bot_status = "🔴 Inactivo"
         
         response = f"""
         <html>
@@ -141,6 +183,14 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
         """
         self.wfile.write(response.encode())
     
+    def send_metrics(self):
+        """Devuelve las métricas de los subsistemas en JSON"""
+        body = json.dumps(obtener_metricas(), ensure_ascii=False, default=str).encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_HEAD(self):
         self.send_response(200)
         self.send_header('Content-type', 'text/html')
@@ -164,24 +214,48 @@ def start_health_check_server(port=10000):
     except Exception as e:
         logger.error(f"❌ Error en servidor de health check: {e}")
 
+def restaurar_ventanas_spam() -> None:
+    """Recupera las ventanas de spam guardadas en el último apagado"""
+    import_spam_cache(load_rate_limit_state(AMBITO_VENTANAS_SPAM))
+
+def guardar_ventanas_spam() -> None:
+    save_rate_limit_state(AMBITO_VENTANAS_SPAM, export_spam_cache())
+
+def precargar_trivia() -> None:
+    """Llena la reserva de /cinematrivia (el import de requests va en este hilo)"""
+    from config import Config
+    import generador_trivia
+    generador_trivia.precargar(Config.TRIVIA_POOL_SIZE)
+
 async def initialize_bot():
-    """Inicializa el bot: crea tablas, carga estados, etc."""
+    """Inicializa el bot: carga estados en paralelo y programa las tareas de fondo"""
     logger.info("🔄 Inicializando componentes del bot...")
+    from config import Config
 
-    # Crear todas las tablas necesarias usando una sola función
-    try:
-        create_all_tables()
-        logger.info("✅ Tablas de la base de datos verificadas/creadas.")
-    except Exception as e:
-        logger.error(f"❌ Error durante la inicialización de la base de datos: {e}")
-        raise
+    # Pasos independientes entre sí: cada uno en su hilo, a la vez
+    pasos = {
+        "juegos": initialize_games_system,
+        "configuración chats": configuracion_chats.cargar,
+        "tendencias": tendencias.cargar,
+        "ventanas de spam": restaurar_ventanas_spam,
+        "reserva trivia": precargar_trivia,
+    }
+    resultados = await asyncio.gather(
+        *(asyncio.to_thread(perfil.medir, nombre, paso) for nombre, paso in pasos.items()),
+        return_exceptions=True
+    )
+    for nombre, resultado in zip(pasos, resultados):
+        if isinstance(resultado, Exception):
+            logger.error(f"❌ Error inicializando {nombre}: {resultado}")
 
-    # Inicializar el sistema de juegos (carga datos de la DB)
-    try:
-        initialize_games_system()
-        logger.info("✅ Sistema de juegos inicializado.")
-    except Exception as e:
-        logger.error(f"❌ Error inicializando sistema de juegos: {e}")
+    # Tendencias: guardar periódicamente
+    asyncio.create_task(tendencias.guardar_periodicamente(Config.TRENDS_SNAPSHOT_INTERVAL))
+
+    # Puntos guardados en el spool local durante una caída de la base de datos
+    asyncio.create_task(reaplicar_periodicamente(Config.POINTS_SPOOL_REPLAY_INTERVAL))
+
+    # Compactación de los eventos de puntos antiguos (ver retencion.py)
+    asyncio.create_task(compactar_periodicamente(Config.POINTS_COMPACTION_INTERVAL))
 
     # Iniciar el chequeo de juegos activos en segundo plano
     try:
@@ -191,42 +265,96 @@ async def initialize_bot():
     except Exception as e:
         logger.error(f"❌ Error programando chequeo de juegos: {e}")
 
+async def iniciar_servicios(application: Application) -> None:
+    """post_init: arranca los servicios que necesitan el bot ya inicializado"""
+    despachador.iniciar(application.bot)
+    asyncio.create_task(informar_arranque(application))
+
+async def informar_arranque(application: Application) -> None:
+    """Cierra el perfil de arranque cuando el polling ya está en marcha"""
+    while not (application.updater and application.updater.running):
+        await asyncio.sleep(0.05)
+    perfil.terminar("bootstrap + polling")
+
+async def detener_servicios(application: Application) -> None:
+    """post_stop: si el polling terminó sin pasar por el coordinador (p. ej. por un error), vaciar y cerrar igualmente"""
+    await coordinador.apagar(application)
+
+def configurar_apagado(application: Application, grabador=None) -> None:
+    """Registra en el coordinador lo que hay que vaciar y cerrar, en orden"""
+    # Vaciado: con los updates ya drenados, la marca de agua es la definitiva
+    coordinador.al_vaciar("marca de agua", lider.guardar_marca)
+    coordinador.al_vaciar("tendencias", tendencias.guardar)
+    coordinador.al_vaciar("ventanas de spam", guardar_ventanas_spam)
+    coordinador.al_vaciar("spool de puntos", replay_point_spool)
+
+    # Cierre: la cola de salida aún necesita la sesión HTTP del bot; el lock
+    # de líder se suelta al final para que el relevo encuentre todo guardado
+    coordinador.al_cerrar("cola de salida", lambda: despachador.detener(timeout=5.0))
+    coordinador.al_cerrar("aplicación", application.shutdown)
+    if grabador:
+        coordinador.al_cerrar("grabador", grabador.cerrar)
+    coordinador.al_cerrar("liderazgo", lider.liberar)
+    registrar_fuente("apagado", coordinador.metricas)
+
 def setup_signal_handlers():
-    """Configura manejadores de señales para shutdown graceful"""
+    """Mientras no hay polling (p. ej. en espera de liderazgo) no hay nada que vaciar: salir"""
     def signal_handler(signum, frame):
-        logger.info(f"🛑 Señal {signum} recibida, iniciando shutdown graceful...")
+        logger.info(f"🛑 Señal {signum} recibida antes de empezar el polling, saliendo...")
         shutdown_event.set()
-        
-        if application:
-            logger.info("🔄 Deteniendo aplicación de Telegram...")
-            asyncio.create_task(application.stop())
-        
         sys.exit(0)
     
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
-async def cleanup_bot_state():
-    """Limpia el estado del bot antes del inicio"""
-    logger.info("🧹 Limpiando estado previo del bot...")
-    
-    try:
-        # Crear una aplicación temporal solo para limpiar
-        temp_app = ApplicationBuilder().token(BOT_TOKEN).build()
-        
-        # Eliminar webhook si existe
-        await temp_app.bot.delete_webhook(drop_pending_updates=True)
-        logger.info("✅ Webhook eliminado y updates pendientes descartados")
-        
-        # Cerrar la aplicación temporal
-        await temp_app.shutdown()
-        
-    except Exception as e:
-        logger.warning(f"⚠️ Error limpiando estado del bot: {e}")
+def instalar_senales_apagado(loop: asyncio.AbstractEventLoop) -> None:
+    """Con el polling en marcha, SIGTERM/SIGINT pasan por el coordinador"""
+    def al_recibir(signum):
+        logger.info(f"🛑 Señal {signum} recibida, iniciando apagado ordenado...")
+        shutdown_event.set()
+        coordinador.solicitar(application)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, al_recibir, signum)
+
+def registrar_manejadores(application: Application) -> None:
+    """Registra todos los manejadores de comandos y eventos en la aplicación"""
+    # ======= MANEJADORES DE COMANDOS =======
+    application.add_handler(CommandHandler("start", cmd_start))
+    application.add_handler(CommandHandler("help", cmd_help))
+    application.add_handler(CommandHandler("ranking", cmd_ranking))
+    application.add_handler(CommandHandler("miperfil", cmd_miperfil))
+    application.add_handler(CommandHandler("reto", cmd_reto))
+    application.add_handler(CommandHandler("tendencias", cmd_tendencias))
+
+    # Comandos de juegos
+    application.add_handler(CommandHandler("cinematrivia", auth_required(cmd_cinematrivia)))
+    application.add_handler(CommandHandler("adivinapelicula", auth_required(cmd_adivinapelicula)))
+    application.add_handler(CommandHandler("emojipelicula", auth_required(cmd_emojipelicula)))
+    application.add_handler(CommandHandler("pista", auth_required(cmd_pista)))
+    application.add_handler(CommandHandler("rendirse", auth_required(cmd_rendirse)))
+
+    # Comandos de autorización
+    application.add_handler(CommandHandler("solicitar", cmd_solicitar_autorizacion))
+    application.add_handler(CommandHandler("aprobar", cmd_aprobar_grupo))
+    application.add_handler(CommandHandler("solicitudes", cmd_ver_solicitudes))
+    application.add_handler(CommandHandler("statusauth", cmd_status_auth))
+    application.add_handler(CommandHandler("recargarreglas", cmd_recargar_reglas))
+    application.add_handler(CommandHandler("puntoschat", cmd_puntos_chat))
+
+    # ======= MANEJADORES DE EVENTOS =======
+    # Callback queries (botones)
+    application.add_handler(CallbackQueryHandler(handle_trivia_callback))
+
+    # Mensajes de texto (hashtags y juegos); la autorización va dentro del pipeline, tras el prefiltro
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND, 
+        route_text_message
+    ))
 
 def main() -> None:
     """Función principal del bot"""
-    global application
+    global application, lider, coordinador
     
     logger.info("🚀 Iniciando Puntum Bot...")
     
@@ -251,17 +379,32 @@ def main() -> None:
     )
     health_thread.start()
     logger.info(f"🌐 Servidor de Health Check iniciado en hilo separado en puerto {health_check_port}")
+    registrar_fuente("arranque", perfil.metricas)
+    perfil.marcar("health check")
 
-    # Crear el loop de eventos
+    # ======= ELECCIÓN DE LÍDER =======
+    # Sólo una instancia hace polling; las demás quedan en espera hasta que el líder caiga
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Limpiar estado previo del bot
-        loop.run_until_complete(cleanup_bot_state())
+        create_all_tables()
+        perfil.marcar("base de datos")
+        lider = crear_eleccion_desde_config()
+        registrar_fuente("liderazgo", lider.metricas)
+        lider.esperar_liderazgo()
+        atexit.register(lider.liberar)
         
+        marca_agua = MarcaAguaUpdates.desde_db()
+        logger.info(f"📍 Último update procesado por el líder anterior: {marca_agua.inicial}")
+        perfil.marcar("liderazgo")
     except Exception as e:
-        logger.error(f"❌ Error en limpieza inicial: {e}")
+        logger.error(f"❌ Error en la elección de líder: {e}")
+        exit(1)
+
+    coordinador = crear_coordinador_desde_config()
+
+    # Crear el loop de eventos. El webhook se elimina una sola vez, en el
+    # bootstrap de run_polling (conservando los updates pendientes)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
 
     # Construir la aplicación del bot con configuración robusta
     try:
@@ -270,16 +413,25 @@ def main() -> None:
         application = (
             ApplicationBuilder()
             .token(BOT_TOKEN)
-            .concurrent_updates(True)
+            # Orden estricto dentro de cada chat, chats distintos en paralelo
+            .concurrent_updates(crear_procesador_desde_config(marca_agua=marca_agua, recuperacion=recuperacion))
+            # Tras una caída, el backlog se procesa sin contestar a mensajes atrasados
+            .rate_limiter(LimitadorRecuperacion(recuperacion))
             .connection_pool_size(8)
             .pool_timeout(20.0)
             .read_timeout(30.0)
             .write_timeout(30.0)
             .connect_timeout(30.0)
+            .post_init(iniciar_servicios)
+            .post_stop(detener_servicios)
             .build()
         )
+        # Confirmar a Telegram sólo los updates ya procesados, para que tras una caída se vuelvan a recibir
+        application.updater = UpdaterConMarca(application.bot, application.update_queue, marca_agua)
+        registrar_fuente("polling", application.updater.metricas)
         
         logger.info("✅ Aplicación de Telegram creada exitosamente")
+        perfil.marcar("aplicación")
         
     except Exception as e:
         logger.error(f"❌ Error creando aplicación de Telegram: {e}")
@@ -288,36 +440,17 @@ def main() -> None:
 
     # ======= MANEJADORES DE COMANDOS =======
     try:
-        application.add_handler(CommandHandler("start", cmd_start))
-        application.add_handler(CommandHandler("help", cmd_help))
-        application.add_handler(CommandHandler("ranking", cmd_ranking))
-        application.add_handler(CommandHandler("miperfil", cmd_miperfil))
-        application.add_handler(CommandHandler("reto", cmd_reto))
-
-        # Comandos de juegos
-        application.add_handler(CommandHandler("cinematrivia", auth_required(cmd_cinematrivia)))
-        application.add_handler(CommandHandler("adivinapelicula", auth_required(cmd_adivinapelicula)))
-        application.add_handler(CommandHandler("emojipelicula", auth_required(cmd_emojipelicula)))
-        application.add_handler(CommandHandler("pista", auth_required(cmd_pista)))
-        application.add_handler(CommandHandler("rendirse", auth_required(cmd_rendirse)))
-
-        # Comandos de autorización
-        application.add_handler(CommandHandler("solicitar", cmd_solicitar_autorizacion))
-        application.add_handler(CommandHandler("aprobar", cmd_aprobar_grupo))
-        application.add_handler(CommandHandler("solicitudes", cmd_ver_solicitudes))
-        application.add_handler(CommandHandler("statusauth", cmd_status_auth))
-
-        # ======= MANEJADORES DE EVENTOS =======
-        # Callback queries (botones)
-        application.add_handler(CallbackQueryHandler(handle_trivia_callback))
-
-        # Mensajes de texto (hashtags y juegos)
-        application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND, 
-            auth_required(route_text_message)
-        ))
-        
+        registrar_manejadores(application)
         logger.info("✅ Todos los manejadores de comandos registrados")
+
+        # Grabador de tráfico (grupo -1: ve cada update antes que los demás manejadores)
+        grabador = crear_grabador_desde_config()
+        if grabador:
+            application.add_handler(TypeHandler(Update, grabador.callback), group=-1)
+            atexit.register(grabador.cerrar)
+
+        configurar_apagado(application, grabador)
+        perfil.marcar("manejadores")
         
     except Exception as e:
         logger.error(f"❌ Error registrando manejadores: {e}")
@@ -329,6 +462,11 @@ def main() -> None:
     try:
         # Ejecutar la inicialización
         loop.run_until_complete(initialize_bot())
+        perfil.marcar("inicialización")
+        
+        # Renovar el liderazgo y guardar el último update_id; si se pierde, dejar de hacer polling
+        lider.mantener(marca_agua, al_perder=lambda: loop.call_soon_threadsafe(coordinador.solicitar, application))
+        instalar_senales_apagado(loop)
         
         logger.info("🎯 Iniciando polling del bot con configuración robusta...")
         
@@ -340,9 +478,10 @@ def main() -> None:
             read_timeout=30,
             write_timeout=30,
             connect_timeout=30,
-            drop_pending_updates=True,   # Descartar updates pendientes
+            drop_pending_updates=False,  # El nuevo líder retoma el backlog desde la marca de agua
             allowed_updates=None,        # Permitir todos los tipos de updates
-            close_loop=False            # No cerrar el loop automáticamente
+            close_loop=False,           # No cerrar el loop automáticamente
+            stop_signals=None            # Las señales las gestiona el coordinador de apagado
         )
         
     except KeyboardInterrupt:
@@ -0,0 +1,91 @@
+# caracteristicas_mensaje.py
+"""
+Características de un mensaje calculadas una sola vez por update.
+
+Antes cada pieza (puntuación de hashtags, seguridad, retos, logros)
+volvía a recorrer el texto con sus propias expresiones regulares para
+contar palabras, buscar hashtags o mayúsculas. MessageFeatures.de_texto
+hace todo en una pasada y cachea el resultado por texto, así que los
+distintos manejadores que procesan el mismo update comparten el objeto.
+La caché se indexa también por la versión de las reglas de puntuación
+(los patrones de bonus salen de ellas), así que recargarlas la invalida.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from handlers.palabras_clave import normalizar
+from handlers.spam import contar_mayusculas
+from reglas_puntuacion import ReglasPuntuacion, reglas_actuales
+
+_LETRA = r"[\w\u00C0-\u024F\u1E00-\u1EFF]"
+# '#palabra' y también '# palabra' (con espacio), como en find_hashtags_in_message
+_HASHTAG = re.compile(rf"#\s*({_LETRA}+)")
+_MENCION = re.compile(r"@\w+")
+_URL = re.compile(r"https?://\S+")
+# Lo que no cuenta como palabra: hashtags, menciones y URLs
+_EXCLUIDO = re.compile(r"#\w+|@\w+|https?://\S+")
+_PALABRA = re.compile(r"\b\w+\b")
+
+class MessageFeatures:
+    """Rasgos de un texto: normalizado, tokens, hashtags, URLs, mayúsculas y bonus"""
+
+    __slots__ = ("texto", "normalizado", "tokens", "palabras", "hashtags", "hashtags_normalizados",
+                 "menciones", "urls", "mayusculas", "ratio_mayusculas", "bonus", "version_reglas")
+
+    def __init__(self, texto: str, reglas: Optional[ReglasPuntuacion] = None):
+        texto = texto or ""
+        self.texto = texto
+        self.normalizado = normalizar(texto)
+
+        limpio = _EXCLUIDO.sub("", texto)
+        self.tokens: Tuple[str, ...] = tuple(_PALABRA.findall(limpio.lower()))
+        self.palabras = len(self.tokens)
+
+        # Hashtags tal como se escribieron ('#Reseña') y normalizados ('resena'), sin repetir
+        hashtags: Dict[str, str] = {}
+        for palabra in _HASHTAG.findall(texto):
+            hashtags.setdefault(normalizar(palabra), f"#{palabra}")
+        self.hashtags: Tuple[str, ...] = tuple(hashtags.values())
+        self.hashtags_normalizados: FrozenSet[str] = frozenset(hashtags)
+
+        self.menciones: Tuple[str, ...] = tuple(_MENCION.findall(texto))
+        self.urls: Tuple[str, ...] = tuple(_URL.findall(texto))
+        self.mayusculas = contar_mayusculas(texto) if texto else 0
+        self.ratio_mayusculas = self.mayusculas / len(texto) if texto else 0.0
+        # Patrones de bonus de las reglas de puntuación vigentes
+        reglas = reglas or reglas_actuales()
+        self.version_reglas = reglas.version
+        self.bonus: FrozenSet[str] = reglas.bonus_encontrados(texto)
+
+    def tiene_hashtag(self, hashtag: str) -> bool:
+        """'#Crítica', '#critica' y 'critica' son el mismo hashtag"""
+        return normalizar(hashtag.lstrip("#")) in self.hashtags_normalizados
+
+    @staticmethod
+    def de_texto(texto: str) -> "MessageFeatures":
+        return _caracteristicas_cacheadas(texto or "", reglas_actuales())
+
+    @classmethod
+    def de_update(cls, update) -> Optional["MessageFeatures"]:
+        """Características del texto del mensaje del update (None si no tiene texto)"""
+        mensaje = getattr(update, "effective_message", None)
+        texto = getattr(mensaje, "text", None)
+        return cls.de_texto(texto) if texto else None
+
+    def __repr__(self) -> str:
+        return (f"MessageFeatures(palabras={self.palabras}, hashtags={list(self.hashtags)}, "
+                f"urls={len(self.urls)}, mayusculas={self.ratio_mayusculas:.2f}, bonus={sorted(self.bonus)})")
+
+# Un update pasa por varios manejadores con el mismo texto: todos reciben el mismo objeto
+@lru_cache(maxsize=512)
+def _caracteristicas_cacheadas(texto: str, reglas: ReglasPuntuacion) -> MessageFeatures:
+    # `reglas` forma parte de la clave: otra versión de las reglas no reutiliza entradas
+    return MessageFeatures(texto, reglas)
+
+def caracteristicas(texto_o_features) -> MessageFeatures:
+    """Acepta un texto o unas MessageFeatures ya calculadas"""
+    if isinstance(texto_o_features, MessageFeatures):
+        return texto_o_features
+    return MessageFeatures.de_texto(texto_o_features)
@@ -0,0 +1,339 @@
+# cola_salida.py
+"""
+Despachador de mensajes salientes que respeta los límites de Telegram.
+
+Los manejadores encolan sus respuestas y siguen; un bucle en segundo plano
+las envía respetando un token bucket por chat (~20 msg/min en grupos) y uno
+global (~30 msg/s). Los mensajes tienen prioridad (resultados de juegos antes
+que confirmaciones de hashtags), un RetryAfter pausa solo el chat afectado y
+reprograma el mensaje, y varias confirmaciones pendientes para el mismo chat
+pueden agruparse en un único mensaje.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.error import RetryAfter
+
+from metricas import registrar_fuente
+from recuperacion import recuperacion
+
+logger = logging.getLogger(__name__)
+
+# Clases de prioridad (menor = se envía antes)
+PRIORIDAD_JUEGO = 0     # Resultados de juegos y trivias
+PRIORIDAD_NORMAL = 1    # Respuestas a comandos, avisos, aprobaciones
+PRIORIDAD_ACK = 2       # Confirmaciones de hashtags
+
+NOMBRES_PRIORIDAD = {PRIORIDAD_JUEGO: "juego", PRIORIDAD_NORMAL: "normal", PRIORIDAD_ACK: "ack"}
+
+# Límite de longitud de un mensaje de Telegram
+MAX_LONGITUD_MENSAJE = 4096
+
+class TokenBucket:
+    """Token bucket clásico con pausa explícita (para RetryAfter)"""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "ultimo", "pausado_hasta")
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+        self.pausado_hasta = 0.0
+
+    def _recargar(self, ahora: float) -> None:
+        if ahora > self.ultimo:
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+            self.ultimo = ahora
+
+    def espera(self, ahora: float) -> float:
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)"""
+        if ahora < self.pausado_hasta:
+            return self.pausado_hasta - ahora
+        self._recargar(ahora)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def consumir(self, ahora: float) -> None:
+        self._recargar(ahora)
+        self.tokens -= 1
+
+    def pausar(self, segundos: float) -> None:
+        self.pausado_hasta = max(self.pausado_hasta, time.monotonic() + segundos)
+        self.tokens = 0
+
+    def lleno(self, ahora: float) -> bool:
+        self._recargar(ahora)
+        return self.tokens >= self.capacidad and ahora >= self.pausado_hasta
+
+class MensajeSaliente:
+    """Mensaje pendiente de envío"""
+
+    __slots__ = ("chat_id", "texto", "kwargs", "prioridad", "secuencia", "agrupable", "agrupados",
+                 "intentos", "encolado_en")
+
+    def __init__(self, chat_id: int, texto: str, kwargs: Dict[str, Any], prioridad: int,
+                 secuencia: int, agrupable: bool):
+        self.chat_id = chat_id
+        self.texto = texto
+        self.kwargs = kwargs
+        self.prioridad = prioridad
+        self.secuencia = secuencia
+        self.agrupable = agrupable
+        self.agrupados = 1
+        self.intentos = 0
+        self.encolado_en = time.monotonic()
+
+class DespachadorSalida:
+    """Cola de salida con token buckets por chat y global"""
+
+    def __init__(self, mensajes_por_minuto_grupo: int = 20, mensajes_por_segundo_privado: float = 1.0,
+                 mensajes_por_segundo_global: int = 30, max_en_vuelo: int = 8,
+                 max_intentos: int = 5, agrupar: bool = True):
+        self.tasa_grupo = mensajes_por_minuto_grupo / 60.0
+        self.tasa_privado = mensajes_por_segundo_privado
+        self.max_en_vuelo = max_en_vuelo
+        self.max_intentos = max_intentos
+        self.agrupar = agrupar
+
+        self._global = TokenBucket(mensajes_por_segundo_global, mensajes_por_segundo_global)
+        self._buckets: Dict[int, TokenBucket] = {}
+        # chat_id -> heap de (prioridad, secuencia, mensaje)
+        self._colas: Dict[int, List[Tuple[int, int, MensajeSaliente]]] = {}
+        self._en_vuelo: set = set()
+        self._tareas_envio: set = set()
+        self._secuencia = itertools.count()
+        self._despertar: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._bot = None
+
+        self.estadisticas = {
+            "encolados": 0,
+            "enviados": 0,
+            "agrupados": 0,
+            "retry_after": 0,
+            "fallidos": 0,
+            "descartados": 0,
+            "profundidad_maxima": 0,
+        }
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def iniciar(self, bot) -> None:
+        """Arranca el bucle de envío (llamar con el loop de la aplicación en marcha)"""
+        if self.activo:
+            return
+        self._bot = bot
+        self._despertar = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle(), name="cola_salida")
+        logger.info("📤 Despachador de mensajes salientes iniciado")
+
+    def limitar_global(self, mensajes_por_segundo: float) -> None:
+        """Ajusta el límite global (p. ej. repartido entre varios procesos con el mismo token)"""
+        self._global = TokenBucket(mensajes_por_segundo, max(1.0, mensajes_por_segundo))
+
+    async def detener(self, timeout: float = 10.0) -> None:
+        """Intenta vaciar la cola durante `timeout` segundos y detiene el bucle"""
+        if not self.activo:
+            return
+        limite = time.monotonic() + timeout
+        while (self.profundidad() or self._en_vuelo) and time.monotonic() < limite:
+            await asyncio.sleep(0.1)
+        pendientes = self.profundidad()
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        if pendientes:
+            self.estadisticas["descartados"] += pendientes
+            logger.warning(f"⚠️ Despachador detenido con {pendientes} mensajes sin enviar")
+        else:
+            logger.info("📤 Despachador de mensajes salientes detenido")
+
+    def _bucket_chat(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(self.tasa_grupo, 3)
+            else:
+                bucket = TokenBucket(self.tasa_privado, 3)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def profundidad(self) -> int:
+        return sum(len(cola) for cola in self._colas.values())
+
+    def encolar(self, chat_id: int, texto: str, prioridad: int = PRIORIDAD_NORMAL,
+                agrupable: bool = False, **kwargs) -> None:
+        """Encola un mensaje; las confirmaciones agrupables se funden con otra pendiente del mismo chat"""
+        self.estadisticas["encolados"] += 1
+        cola = self._colas.setdefault(chat_id, [])
+
+        if agrupable and self.agrupar:
+            for _, _, pendiente in cola:
+                if (pendiente.agrupable
+                        and pendiente.kwargs.get("parse_mode") == kwargs.get("parse_mode")
+                        and len(pendiente.texto) + len(texto) + 2 <= MAX_LONGITUD_MENSAJE):
+                    pendiente.texto += "\n\n" + texto
+                    pendiente.agrupados += 1
+                    # Un mensaje agrupado ya no responde a un único mensaje
+                    pendiente.kwargs.pop("reply_to_message_id", None)
+                    self.estadisticas["agrupados"] += 1
+                    return
+
+        mensaje = MensajeSaliente(chat_id, texto, kwargs, prioridad, next(self._secuencia), agrupable)
+        heapq.heappush(cola, (prioridad, mensaje.secuencia, mensaje))
+
+        profundidad = self.profundidad()
+        if profundidad > self.estadisticas["profundidad_maxima"]:
+            self.estadisticas["profundidad_maxima"] = profundidad
+        if self._despertar:
+            self._despertar.set()
+
+    def _elegir_siguiente(self, ahora: float) -> Tuple[Optional[int], float]:
+        """Devuelve el chat con el mensaje más prioritario listo para enviar, o la espera mínima"""
+        elegido = None
+        clave_elegida = None
+        espera_minima = float("inf")
+
+        for chat_id, cola in self._colas.items():
+            if not cola or chat_id in self._en_vuelo:
+                continue
+            espera = self._bucket_chat(chat_id).espera(ahora)
+            if espera > 0:
+                espera_minima = min(espera_minima, espera)
+                continue
+            clave = cola[0][:2]
+            if clave_elegida is None or clave < clave_elegida:
+                elegido, clave_elegida = chat_id, clave
+
+        return elegido, espera_minima
+
+    def _limpiar_inactivos(self, ahora: float) -> None:
+        """Libera colas vacías y buckets llenos de chats sin actividad"""
+        for chat_id in [c for c, cola in self._colas.items() if not cola and c not in self._en_vuelo]:
+            del self._colas[chat_id]
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._colas and b.lleno(ahora)]:
+            del self._buckets[chat_id]
+
+    async def _esperar(self, segundos: Optional[float]) -> None:
+        self._despertar.clear()
+        try:
+            await asyncio.wait_for(self._despertar.wait(), timeout=segundos)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _bucle(self) -> None:
+        ultima_limpieza = time.monotonic()
+        while True:
+            try:
+                ahora = time.monotonic()
+                if ahora - ultima_limpieza > 60:
+                    self._limpiar_inactivos(ahora)
+                    ultima_limpieza = ahora
+
+                if len(self._en_vuelo) >= self.max_en_vuelo:
+                    await self._esperar(None)
+                    continue
+
+                chat_id, espera = self._elegir_siguiente(ahora)
+                if chat_id is None:
+                    await self._esperar(None if espera == float("inf") else espera)
+                    continue
+
+                espera_global = self._global.espera(ahora)
+                if espera_global > 0:
+                    await asyncio.sleep(espera_global)
+                    continue
+
+                _, _, mensaje = heapq.heappop(self._colas[chat_id])
+                self._global.consumir(ahora)
+                self._bucket_chat(chat_id).consumir(ahora)
+                self._en_vuelo.add(chat_id)
+                tarea = asyncio.create_task(self._enviar(mensaje))
+                self._tareas_envio.add(tarea)
+                tarea.add_done_callback(self._tareas_envio.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en el bucle de la cola de salida: {e}")
+                await asyncio.sleep(1)
+
+    async def _enviar(self, mensaje: MensajeSaliente) -> None:
+        try:
+            mensaje.intentos += 1
+            await self._bot.send_message(chat_id=mensaje.chat_id, text=mensaje.texto, **mensaje.kwargs)
+            self.estadisticas["enviados"] += 1
+        except RetryAfter as e:
+            self.estadisticas["retry_after"] += 1
+            logger.warning(f"⏳ RetryAfter de {e.retry_after}s en chat {mensaje.chat_id}, reprogramando")
+            self._bucket_chat(mensaje.chat_id).pausar(float(e.retry_after))
+            if mensaje.intentos < self.max_intentos:
+                # Conserva su secuencia original: vuelve a la cabeza de su chat
+                heapq.heappush(self._colas.setdefault(mensaje.chat_id, []),
+                               (mensaje.prioridad, mensaje.secuencia, mensaje))
+            else:
+                self.estadisticas["descartados"] += 1
+                logger.error(f"❌ Mensaje a {mensaje.chat_id} descartado tras {mensaje.intentos} intentos")
+        except Exception as e:
+            self.estadisticas["fallidos"] += 1
+            logger.error(f"❌ Error enviando mensaje a {mensaje.chat_id}: {e}")
+        finally:
+            self._en_vuelo.discard(mensaje.chat_id)
+            if self._despertar:
+                self._despertar.set()
+
+    def metricas(self) -> dict:
+        """Profundidad de la cola y contadores del despachador"""
+        por_prioridad = {nombre: 0 for nombre in NOMBRES_PRIORIDAD.values()}
+        por_chat = []
+        for chat_id, cola in list(self._colas.items()):
+            if cola:
+                por_chat.append((len(cola), chat_id))
+            for prioridad, _, _ in list(cola):
+                por_prioridad[NOMBRES_PRIORIDAD.get(prioridad, str(prioridad))] += 1
+
+        por_chat.sort(reverse=True)
+        return {
+            "activo": self.activo,
+            "profundidad": sum(por_prioridad.values()),
+            "profundidad_por_prioridad": por_prioridad,
+            "chats_mas_cargados": {str(chat_id): n for n, chat_id in por_chat[:10]},
+            "en_vuelo": len(self._en_vuelo),
+            **self.estadisticas,
+        }
+
+# Instancia global del despachador
+despachador = DespachadorSalida()
+registrar_fuente("cola_salida", despachador.metricas)
+
+async def enviar_mensaje(bot, chat_id: int, texto: str, prioridad: int = PRIORIDAD_NORMAL,
+                         agrupable: bool = False, **kwargs):
+    """Envía a través de la cola si está activa; si no, directamente"""
+    if recuperacion.suprimir_respuesta():
+        # Respuesta a un update atrasado (ver recuperacion.py)
+        return None
+    if despachador.activo:
+        despachador.encolar(chat_id, texto, prioridad=prioridad, agrupable=agrupable, **kwargs)
+        return None
+    return await bot.send_message(chat_id=chat_id, text=texto, **kwargs)
+
+async def responder(update: Update, texto: str, prioridad: int = PRIORIDAD_NORMAL,
+                    agrupable: bool = False, **kwargs):
+    """Equivalente a update.message.reply_text pasando por la cola de salida"""
+    message = update.effective_message
+    kwargs.setdefault("reply_to_message_id", message.message_id)
+    kwargs.setdefault("allow_sending_without_reply", True)
+    return await enviar_mensaje(message.get_bot(), message.chat_id, texto,
+                                prioridad=prioridad, agrupable=agrupable, **kwargs)
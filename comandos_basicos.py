@@ -3,6 +3,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from db import get_user_stats, get_top10
+from tendencias import tendencias
 import random
 import datetime
 import logging
@@ -130,20 +131,23 @@ async def cmd_miperfil(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mostrar el perfil del usuario"""
     user = update.effective_user
     try:
-        stats = get_user_stats(user.id)
-        if not stats:
+        stats = get_user_stats(user.id, update.effective_chat.id)
+        if not stats or not stats.get('total_entries'):
             await update.message.reply_text("📊 Aún no tienes estadísticas. ¡Usa hashtags como #pelicula para empezar a ganar puntos!")
             return
 
-        points = stats.get('points', 0)
+        points = stats.get('total_points', 0)
         level = calculate_level(points)
         level_name, level_emoji = LEVEL_THRESHOLDS[level][2], LEVEL_THRESHOLDS[level][3]
         
         profile_text = (
             f"{level_emoji} <b>PERFIL DE {user.first_name.upper()}</b>\n\n"
             f"💎 Puntos totales: <b>{points}</b>\n"
-            f"📝 Contribuciones: <b>{stats.get('count', 0)}</b>\n"
-            f"🎯 Nivel: <b>{level} - {level_name}</b>"
+            f"📝 Contribuciones: <b>{stats.get('total_entries', 0)}</b>\n"
+            f"🎯 Nivel: <b>{level} - {level_name}</b>\n"
+            f"📅 Días activo: <b>{stats.get('active_days', 0)}</b>\n"
+            f"🔥 Racha: <b>{stats.get('current_streak', 0)}</b> días "
+            f"(mejor: {stats.get('longest_streak', 0)})"
         )
         
         # Información sobre próximo nivel
@@ -165,6 +169,31 @@ async def cmd_miperfil(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error en cmd_miperfil para {user.id}: {e}")
         await update.message.reply_text("❌ Error al obtener tu perfil.")
 
+async def cmd_tendencias(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mostrar hashtags en tendencia y usuarios más activos del grupo (sin consultar la BD)"""
+    chat_id = update.effective_chat.id
+    try:
+        def lista_hashtags(top):
+            return "\n".join(f"  {i}. {tag} ({n})" for i, (tag, n) in enumerate(top, 1)) or "  Sin actividad"
+
+        usuarios = tendencias.top_usuarios(chat_id, 5)
+        texto_usuarios = "\n".join(
+            f"  {i}. {nombre} - <b>{puntos} pts</b>" for i, (_, nombre, puntos) in enumerate(usuarios, 1)
+        ) or "  Sin actividad"
+
+        texto = (
+            f"📈 <b>TENDENCIAS DEL GRUPO</b>\n\n"
+            f"⏱️ <b>Última hora</b>\n{lista_hashtags(tendencias.top_hashtags(chat_id, 'hora', 5))}\n\n"
+            f"📅 <b>Últimas 24 h</b>\n{lista_hashtags(tendencias.top_hashtags(chat_id, 'dia', 5))}\n\n"
+            f"🏅 <b>Más activos (7 días)</b>\n{texto_usuarios}\n\n"
+            f"👥 Participantes: ~{tendencias.usuarios_unicos(chat_id, 1)} hoy, "
+            f"~{tendencias.usuarios_unicos(chat_id, 7)} esta semana"
+        )
+        await update.message.reply_text(texto, parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error en cmd_tendencias: {e}")
+        await update.message.reply_text("❌ Error al obtener las tendencias.")
+
 async def cmd_reto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mostrar el reto diario"""
     today = datetime.date.today()
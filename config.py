@@ -48,31 +48,76 @@ class Config:
     # Configuración de producción
     PORT = int(os.environ.get("PORT", 8000))
     WEBHOOK_URL = os.environ.get("RENDER_EXTERNAL_URL", "")
+    WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+    
+    # Elección de líder de polling (varias instancias: una hace polling, el resto en espera)
+    INSTANCE_ID = os.environ.get("INSTANCE_ID", os.environ.get("RENDER_INSTANCE_ID", ""))
+    LEADER_LEASE_TTL = float(os.environ.get("LEADER_LEASE_TTL", 15))
+    
+    # Modo multiproceso (multiproceso.py): número de workers por chat_id
+    BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 1))
     
     # Configuración de logging
     LOG_DIR = "logs"
     LOG_LEVEL = "DEBUG" if DEBUG else "INFO"
     
+    # Grabación de tráfico real (vacío = desactivado)
+    RECORD_UPDATES_PATH = os.environ.get("RECORD_UPDATES_PATH", "")
+    RECORD_ANONYMIZE = os.environ.get("RECORD_ANONYMIZE", "1") == "1"
+
+    # Reglas de spam (se recargan automáticamente al modificar el archivo)
+    SPAM_RULES_PATH = os.environ.get("SPAM_RULES_PATH", str(Path(__file__).parent / "spam_rules.json"))
+
+    # Reglas de puntuación de hashtags (puntos, mínimos, bonus y alias; recargables)
+    SCORING_RULES_PATH = os.environ.get("SCORING_RULES_PATH", str(Path(__file__).parent / "scoring_rules.json"))
+
+    # Casi-duplicados (SimHash): bits de diferencia tolerados, ventana en segundos y huellas en memoria
+    NEAR_DUPLICATE_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_DISTANCE", "8"))
+    NEAR_DUPLICATE_WINDOW = int(os.environ.get("NEAR_DUPLICATE_WINDOW", str(24 * 3600)))
+    NEAR_DUPLICATE_CAPACITY = int(os.environ.get("NEAR_DUPLICATE_CAPACITY", "50000"))
+
+    # Tendencias (/tendencias): entradas por sketch, chats en memoria y segundos entre snapshots
+    TRENDS_TOP_K = int(os.environ.get("TRENDS_TOP_K", "32"))
+    TRENDS_MAX_CHATS = int(os.environ.get("TRENDS_MAX_CHATS", "5000"))
+    TRENDS_SNAPSHOT_INTERVAL = int(os.environ.get("TRENDS_SNAPSHOT_INTERVAL", "300"))
+
+    # Preguntas de /cinematrivia generadas por adelantado (0 desactiva la reserva)
+    TRIVIA_POOL_SIZE = int(os.environ.get("TRIVIA_POOL_SIZE", "3"))
+
+    # Planificador de updates: workers en paralelo y updates seguidos por chat
+    UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", 8))
+    UPDATE_QUANTUM = int(os.environ.get("UPDATE_QUANTUM", 2))
+
+    # Recuperación del backlog: updates con más de estos segundos se procesan sin responder
+    CATCHUP_STALE_SECONDS = float(os.environ.get("CATCHUP_STALE_SECONDS", 120))
+
+    # Segundos entre intentos de reaplicar el spool de puntos (caídas de la base de datos)
+    POINTS_SPOOL_REPLAY_INTERVAL = float(os.environ.get("POINTS_SPOOL_REPLAY_INTERVAL", 15))
+
+    # Retención de user_points: los eventos con más de estos días se compactan
+    # en user_points_summary (0 desactiva la compactación)
+    POINTS_RETENTION_DAYS = int(os.environ.get("POINTS_RETENTION_DAYS", 180))
+    POINTS_COMPACTION_BATCH = int(os.environ.get("POINTS_COMPACTION_BATCH", 1000))
+    POINTS_COMPACTION_PAUSE = float(os.environ.get("POINTS_COMPACTION_PAUSE", 0.5))
+    POINTS_COMPACTION_INTERVAL = float(os.environ.get("POINTS_COMPACTION_INTERVAL", 6 * 3600))
+
+    # Apagado: segundos para terminar los updates en curso tras SIGTERM
+    SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 20))
+
     # Configuración de juegos
     GAME_TIMEOUT = int(os.environ.get("GAME_TIMEOUT", 300))  # 5 minutos
     MAX_HINTS = int(os.environ.get("MAX_HINTS", 3))
     
     # Puntos del sistema
     POINTS_CONFIG = {
-        "hashtag_basic": 1,
-        "hashtag_weekly": 5,
         "daily_challenge": 10,
         "game_win": 15,
         "first_contribution": 5,
         "streak_bonus": 3
     }
     
-    # Hashtags válidos
-    VALID_HASHTAGS = [
-        "#pelicula", "#serie", "#documental", "#corto", "#animacion",
-        "#terror", "#comedia", "#drama", "#accion", "#cienciaficcion",
-        "#romance", "#thriller", "#musical", "#biografia", "#western"
-    ]
+    # Hashtags válidos y sus puntos: scoring_rules.json (SCORING_RULES_PATH)
     
     # Niveles del usuario
     LEVELS = {
@@ -207,6 +252,7 @@ MESSAGES = {
 📊 **INFORMACIÓN**
 • /ranking - Top 10 usuarios
 • /miperfil - Tu perfil completo
+• /tendencias - Hashtags y usuarios en tendencia del grupo
 • /estadisticasjuegos - Tus stats de juegos
 • /topjugadores - Ranking de juegos
 
@@ -214,6 +260,8 @@ MESSAGES = {
 • /addadmin - Agregar administrador
 • /solicitudes - Ver solicitudes de grupos
 • /aprobar - Autorizar grupo nuevo
+• /recargarreglas - Recargar reglas de puntuación
+• /puntoschat - Ajustar puntos de hashtags en el grupo
 
 💡 **TIPS**
 • Usa hashtags en tus mensajes para ganar puntos
@@ -0,0 +1,136 @@
+# configuracion_chats.py
+"""
+Configuración por chat servida desde memoria.
+
+get_chat_config consultaba la base de datos en cada llamada. Aquí se
+cargan de una vez chat_config y chat_scoring (ajustes de puntuación por
+chat) y las escrituras pasan por esta caché (write-through): se guardan
+en la base de datos y se actualiza la entrada en memoria en el mismo
+paso. Puntuar un mensaje nunca hace una consulta de configuración.
+
+Las reglas efectivas de cada chat (reglas generales + sus ajustes) se
+compilan la primera vez que se usan y se recompilan solas cuando cambia
+la versión de las reglas generales.
+
+En modo multiproceso cada worker tiene su propia caché, pero los updates
+de un chat (también sus comandos) siempre van al mismo worker.
+"""
+
+import json
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import db
+from metricas import registrar_fuente
+from reglas_puntuacion import ReglasPuntuacion, reglas_actuales
+
+logger = logging.getLogger(__name__)
+
+class ConfigChat(NamedTuple):
+    chat_name: Optional[str] = None
+    rankings_enabled: bool = True
+    challenges_enabled: bool = True
+    # Ajustes sobre scoring_rules.json, p. ej. {"hashtags": {"documental": {"points": 8}}}
+    puntuacion: dict = {}
+
+CONFIG_POR_DEFECTO = ConfigChat()
+
+class CacheConfigChats:
+    """chat_id -> ConfigChat en memoria, con escritura directa a la base de datos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs: Dict[int, ConfigChat] = {}
+        # chat_id -> (reglas generales con las que se compiló, reglas del chat)
+        self._reglas: Dict[int, Tuple[ReglasPuntuacion, ReglasPuntuacion]] = {}
+        self._cargada = False
+        self.estadisticas = {"consultas": 0, "cargas": 0, "escrituras": 0, "compilaciones": 0}
+
+    def cargar(self) -> None:
+        """Lee toda la configuración de la base de datos (dos consultas)"""
+        configs: Dict[int, ConfigChat] = {}
+        for fila in db.get_configured_chats():
+            configs[fila["chat_id"]] = ConfigChat(
+                fila["chat_name"], fila["rankings_enabled"], fila["challenges_enabled"]
+            )
+        for chat_id, datos in db.get_all_chat_scoring().items():
+            try:
+                ajustes = json.loads(datos)
+            except ValueError:
+                logger.warning(f"⚠️ Ajustes de puntuación inválidos para el chat {chat_id}")
+                continue
+            configs[chat_id] = configs.get(chat_id, CONFIG_POR_DEFECTO)._replace(puntuacion=ajustes)
+        with self._lock:
+            self._configs = configs
+            self._reglas.clear()
+            self._cargada = True
+        self.estadisticas["cargas"] += 1
+        logger.info(f"⚙️ Configuración de {len(configs)} chats cargada en memoria")
+
+    def obtener(self, chat_id: int) -> ConfigChat:
+        """Configuración del chat (la de por defecto si no tiene ninguna guardada)"""
+        if not self._cargada:
+            self.cargar()
+        self.estadisticas["consultas"] += 1
+        return self._configs.get(chat_id, CONFIG_POR_DEFECTO)
+
+    def reglas(self, chat_id: int) -> ReglasPuntuacion:
+        """Reglas de puntuación efectivas del chat"""
+        generales = reglas_actuales()
+        config = self.obtener(chat_id)
+        if not config.puntuacion:
+            return generales
+        compiladas = self._reglas.get(chat_id)
+        if compiladas is not None and compiladas[0] is generales:
+            return compiladas[1]
+        try:
+            propias = generales.con_ajustes(config.puntuacion)
+        except Exception as e:
+            # Unos ajustes que ya no encajan con las reglas generales no deben romper la puntuación
+            logger.error(f"❌ Ajustes de puntuación del chat {chat_id} no aplicables: {e}")
+            propias = generales
+        self._reglas[chat_id] = (generales, propias)
+        self.estadisticas["compilaciones"] += 1
+        return propias
+
+    # ---- escrituras (write-through) ----
+
+    def guardar_config(self, chat_id: int, chat_name: str, rankings_enabled: bool, challenges_enabled: bool) -> None:
+        db.save_chat_config(chat_id, chat_name, rankings_enabled, challenges_enabled)
+        with self._lock:
+            actual = self._configs.get(chat_id, CONFIG_POR_DEFECTO)
+            self._configs[chat_id] = actual._replace(
+                chat_name=chat_name, rankings_enabled=rankings_enabled, challenges_enabled=challenges_enabled
+            )
+        self.estadisticas["escrituras"] += 1
+
+    def guardar_puntuacion(self, chat_id: int, ajustes: Optional[dict]) -> None:
+        """Guarda (o borra, con None o {}) los ajustes de puntuación del chat.
+
+        Lanza ValueError si no son compatibles con las reglas generales.
+        """
+        if ajustes:
+            reglas_actuales().con_ajustes(ajustes)  # validar antes de guardar
+            db.save_chat_scoring(chat_id, json.dumps(ajustes, ensure_ascii=False))
+        else:
+            db.delete_chat_scoring(chat_id)
+        with self._lock:
+            actual = self._configs.get(chat_id, CONFIG_POR_DEFECTO)
+            self._configs[chat_id] = actual._replace(puntuacion=ajustes or {})
+            self._reglas.pop(chat_id, None)
+        self.estadisticas["escrituras"] += 1
+
+    def metricas(self) -> dict:
+        return {
+            "chats": len(self._configs),
+            "chats_con_ajustes": sum(1 for c in self._configs.values() if c.puntuacion),
+            "reglas_compiladas": len(self._reglas),
+            **self.estadisticas,
+        }
+
+configuracion_chats = CacheConfigChats()
+registrar_fuente("configuracion_chats", configuracion_chats.metricas)
+
+def reglas_para_chat(chat_id: int) -> ReglasPuntuacion:
+    return configuracion_chats.reglas(chat_id)
@@ -0,0 +1,91 @@
+# cortacircuitos.py
+"""
+Cortacircuitos para la conexión a la base de datos.
+
+Con la base de datos caída, cada operación esperaba el timeout de conexión
+completo antes de fallar. Tras `umbral` fallos seguidos el circuito se
+abre y get_connection falla al instante (CircuitoAbierto). Pasada la
+espera deja pasar una única conexión de prueba (semiabierto): si funciona
+se cierra, y si no vuelve a abrirse con el doble de espera, hasta
+espera_maxima.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+class CircuitoAbierto(Exception):
+    """La base de datos está marcada como caída: no se intenta conectar"""
+
+class Cortacircuitos:
+    """Estado cerrado / abierto / semiabierto con reintento exponencial"""
+
+    def __init__(self, umbral: int = 3, espera: float = 5.0, espera_maxima: float = 120.0):
+        self.umbral = umbral
+        self.espera_inicial = espera
+        self.espera_maxima = espera_maxima
+        self.estado = CERRADO
+        self._fallos = 0
+        self._espera = espera
+        self._reintento_en = 0.0
+        self._probando = False
+        self._lock = threading.Lock()
+        self.estadisticas = {"aperturas": 0, "rechazadas": 0, "fallos": 0}
+        self.abierto_desde = None
+
+    def permitir(self) -> bool:
+        """True si se puede intentar conectar ahora"""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO and time.monotonic() >= self._reintento_en:
+                self.estado = SEMIABIERTO
+            if self.estado == SEMIABIERTO and not self._probando:
+                self._probando = True
+                return True
+            self.estadisticas["rechazadas"] += 1
+            return False
+
+    def exito(self) -> None:
+        with self._lock:
+            if self.estado != CERRADO:
+                caido = time.time() - self.abierto_desde if self.abierto_desde else 0
+                logger.info(f"🟢 Base de datos recuperada tras {caido:.0f}s, circuito cerrado")
+            self.estado = CERRADO
+            self._fallos = 0
+            self._espera = self.espera_inicial
+            self._probando = False
+            self.abierto_desde = None
+
+    def fallo(self) -> None:
+        with self._lock:
+            self._fallos += 1
+            self.estadisticas["fallos"] += 1
+            if self.estado == SEMIABIERTO:
+                # La prueba falló: otra espera, más larga
+                self._espera = min(self._espera * 2, self.espera_maxima)
+            elif self.estado == ABIERTO or self._fallos < self.umbral:
+                return
+            else:
+                self.estadisticas["aperturas"] += 1
+                self.abierto_desde = time.time()
+                logger.error(f"🔴 Base de datos inaccesible tras {self._fallos} fallos, circuito abierto")
+            self.estado = ABIERTO
+            self._probando = False
+            self._reintento_en = time.monotonic() + self._espera
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self._fallos,
+                "espera_s": self._espera,
+                "abierto_desde": self.abierto_desde,
+                **self.estadisticas,
+            }
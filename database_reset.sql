@@ -2,6 +2,7 @@
 -- ====================================================
 -- SCRIPT DE RECREACIÓN COMPLETA DE BASE DE DATOS
 -- Ejecutar en el panel de PostgreSQL de Render
+-- Generado por simple_reset.py desde el paquete migraciones
 -- ====================================================
 
 -- 1. ELIMINAR TODAS LAS TABLAS EXISTENTES
@@ -13,52 +14,66 @@ DROP TABLE IF EXISTS user_points CASCADE;
 DROP TABLE IF EXISTS user_ranking CASCADE;
 DROP TABLE IF EXISTS chat_config CASCADE;
 DROP TABLE IF EXISTS challenges CASCADE;
+DROP TABLE IF EXISTS rate_limit_state CASCADE;
+DROP TABLE IF EXISTS bot_state CASCADE;
+DROP TABLE IF EXISTS chat_scoring CASCADE;
+DROP TABLE IF EXISTS achievement_counters CASCADE;
+DROP TABLE IF EXISTS activity_bitmaps CASCADE;
+DROP TABLE IF EXISTS user_achievements CASCADE;
+DROP TABLE IF EXISTS leader_lease CASCADE;
+DROP TABLE IF EXISTS user_points_summary CASCADE;
+DROP TABLE IF EXISTS point_awards CASCADE;
+DROP TABLE IF EXISTS users CASCADE;
+DROP TABLE IF EXISTS chats CASCADE;
+DROP TABLE IF EXISTS reason_codes CASCADE;
+DROP TABLE IF EXISTS schema_version CASCADE;
 
--- 2. CREAR TABLAS CON ESTRUCTURA CORRECTA
+-- ====================================================
+-- 2. CREAR TABLAS E ÍNDICES (migraciones en orden)
+-- ====================================================
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
 
--- Tabla de juegos activos (con todas las columnas necesarias)
-CREATE TABLE active_games (
+-- 0001 esquema_inicial: Esquema inicial: todas las tablas que creaba db.create_all_tables()
+CREATE TABLE IF NOT EXISTS active_games (
     chat_id BIGINT PRIMARY KEY,
-    juego TEXT NOT NULL,
-    respuesta TEXT NOT NULL,
+    juego TEXT,
+    respuesta TEXT,
     pistas TEXT,
-    intentos INTEGER DEFAULT 0,
-    started_by BIGINT NOT NULL,
+    intentos INTEGER,
+    started_by BIGINT,
     last_activity TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
-
--- Tabla de trivias activas (con columna 'opciones')
-CREATE TABLE active_trivias (
+CREATE TABLE IF NOT EXISTS active_trivias (
     chat_id BIGINT PRIMARY KEY,
-    pregunta TEXT NOT NULL,
-    respuesta TEXT NOT NULL,
-    start_time DOUBLE PRECISION NOT NULL,
+    pregunta TEXT,
+    respuesta TEXT,
+    start_time DOUBLE PRECISION,
     opciones TEXT,
     message_id BIGINT,
     inline_keyboard_message_id BIGINT
 );
-
--- Tablas de autorización
-CREATE TABLE authorized_chats (
+CREATE TABLE IF NOT EXISTS authorized_chats (
     chat_id BIGINT PRIMARY KEY,
     chat_title TEXT,
     authorized_by BIGINT,
     authorized_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     status TEXT DEFAULT 'active'
 );
-
-CREATE TABLE auth_requests (
+CREATE TABLE IF NOT EXISTS auth_requests (
     id SERIAL PRIMARY KEY,
-    chat_id BIGINT NOT NULL,
+    chat_id BIGINT,
     chat_title TEXT,
-    requested_by BIGINT NOT NULL,
+    requested_by BIGINT,
     requester_username TEXT,
     requested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     status TEXT DEFAULT 'pending'
 );
-
--- Tablas de usuarios y puntos
-CREATE TABLE user_points (
+CREATE TABLE IF NOT EXISTS user_points (
     id SERIAL PRIMARY KEY,
     user_id BIGINT NOT NULL,
     chat_id BIGINT NOT NULL,
@@ -69,8 +84,7 @@ CREATE TABLE user_points (
     message_id BIGINT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
-
-CREATE TABLE user_ranking (
+CREATE TABLE IF NOT EXISTS user_ranking (
     user_id BIGINT NOT NULL,
     chat_id BIGINT NOT NULL,
     username TEXT,
@@ -78,17 +92,13 @@ CREATE TABLE user_ranking (
     total_points INTEGER DEFAULT 0,
     PRIMARY KEY (user_id, chat_id)
 );
-
--- Tabla de configuración de chats
-CREATE TABLE chat_config (
+CREATE TABLE IF NOT EXISTS chat_config (
     chat_id BIGINT PRIMARY KEY,
     chat_name TEXT,
     rankings_enabled BOOLEAN DEFAULT TRUE,
     challenges_enabled BOOLEAN DEFAULT TRUE
 );
-
--- Tabla de desafíos
-CREATE TABLE challenges (
+CREATE TABLE IF NOT EXISTS challenges (
     id SERIAL PRIMARY KEY,
     challenger_id BIGINT NOT NULL,
     challengee_id BIGINT NOT NULL,
@@ -99,15 +109,153 @@ CREATE TABLE challenges (
     data TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
+CREATE TABLE IF NOT EXISTS rate_limit_state (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, key)
+);
+CREATE TABLE IF NOT EXISTS bot_state (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS chat_scoring (
+    chat_id BIGINT PRIMARY KEY,
+    overrides TEXT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS achievement_counters (
+    user_id BIGINT NOT NULL,
+    counter TEXT NOT NULL,
+    value INTEGER NOT NULL DEFAULT 0,
+    period INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, counter)
+);
+CREATE TABLE IF NOT EXISTS activity_bitmaps (
+    user_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    base_day INTEGER NOT NULL,
+    bits BYTEA NOT NULL,
+    PRIMARY KEY (user_id, chat_id)
+);
+CREATE TABLE IF NOT EXISTS user_achievements (
+    user_id BIGINT NOT NULL,
+    achievement_id INTEGER NOT NULL,
+    chat_id BIGINT,
+    unlocked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, achievement_id)
+);
+INSERT INTO schema_version (version, name) VALUES (1, 'esquema_inicial') ON CONFLICT (version) DO NOTHING;
+
+-- 0002 indices: Índices que sólo tenían las copias del esquema de los scripts de reset
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_created_at ON user_points(created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_ranking_total_points ON user_ranking(chat_id, total_points DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_requests_status ON auth_requests(status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_challenges_status ON challenges(status);
+INSERT INTO schema_version (version, name) VALUES (2, 'indices') ON CONFLICT (version) DO NOTHING;
 
--- 3. CREAR ÍNDICES PARA MEJORAR RENDIMIENTO
-CREATE INDEX idx_user_points_user_chat ON user_points(user_id, chat_id);
-CREATE INDEX idx_user_points_created_at ON user_points(created_at);
-CREATE INDEX idx_user_ranking_total_points ON user_ranking(total_points DESC);
-CREATE INDEX idx_auth_requests_status ON auth_requests(status);
-CREATE INDEX idx_challenges_status ON challenges(status);
+-- 0003 puntos_idempotentes: Un solo premio por (chat_id, message_id, reason) en user_points
+WITH repetidos AS (
+    DELETE FROM user_points p
+    USING user_points q
+    WHERE p.chat_id = q.chat_id AND p.message_id = q.message_id
+      AND p.reason = q.reason AND p.id > q.id
+    RETURNING p.user_id, p.chat_id, p.points_gained
+), por_usuario AS (
+    SELECT user_id, chat_id, SUM(points_gained) AS puntos FROM repetidos GROUP BY user_id, chat_id
+)
+UPDATE user_ranking r SET total_points = r.total_points - d.puntos
+FROM por_usuario d
+WHERE r.user_id = d.user_id AND r.chat_id = d.chat_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_user_points_award
+ON user_points(chat_id, message_id, reason);
+INSERT INTO schema_version (version, name) VALUES (3, 'puntos_idempotentes') ON CONFLICT (version) DO NOTHING;
+
+-- 0004 retencion_puntos: Resumen mensual de user_points y, en PostgreSQL, user_points particionada por mes
+CREATE TABLE IF NOT EXISTS user_points_summary (
+    user_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    period DATE NOT NULL,
+    reason TEXT NOT NULL DEFAULT '',
+    points BIGINT NOT NULL,
+    entries INTEGER NOT NULL,
+    PRIMARY KEY (user_id, chat_id, period, reason)
+);
+CREATE INDEX IF NOT EXISTS idx_user_points_summary_chat ON user_points_summary(chat_id);
+CREATE TABLE IF NOT EXISTS point_awards (
+    chat_id BIGINT NOT NULL,
+    message_id BIGINT,
+    reason TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (chat_id, message_id, reason)
+);
+CREATE INDEX IF NOT EXISTS idx_point_awards_created_at ON point_awards(created_at);
+INSERT INTO point_awards (chat_id, message_id, reason, created_at)
+SELECT chat_id, message_id, reason, COALESCE(created_at, CURRENT_TIMESTAMP) FROM user_points
+ON CONFLICT (chat_id, message_id, reason) DO NOTHING;
+DROP INDEX IF EXISTS uq_user_points_award;
+-- (esta migración incluye pasos en Python: aplícala con python3 -m migraciones)
+INSERT INTO schema_version (version, name) VALUES (4, 'retencion_puntos') ON CONFLICT (version) DO NOTHING;
 
--- 4. INSERTAR DATOS DE EJEMPLO (OPCIONAL)
+-- 0005 dimensiones: Tablas users, chats y reason_codes, y reason_id en los eventos de puntos
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id BIGINT PRIMARY KEY,
+    chat_name TEXT
+);
+CREATE TABLE IF NOT EXISTS reason_codes (
+    id SERIAL PRIMARY KEY,
+    reason TEXT NOT NULL UNIQUE,
+    category SMALLINT NOT NULL DEFAULT 0
+);
+ALTER TABLE user_points ADD COLUMN IF NOT EXISTS reason_id INTEGER;
+ALTER TABLE user_points_summary ADD COLUMN IF NOT EXISTS reason_id INTEGER;
+ALTER TABLE point_awards ADD COLUMN IF NOT EXISTS reason_id INTEGER;
+-- (esta migración incluye pasos en Python: aplícala con python3 -m migraciones)
+INSERT INTO schema_version (version, name) VALUES (5, 'dimensiones') ON CONFLICT (version) DO NOTHING;
+
+-- 0006 columnas_normalizadas: Quita username, chat_name y reason de los eventos y del ranking (ya están en las dimensiones)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_point_awards_code ON point_awards(chat_id, message_id, reason_id);
+ALTER TABLE point_awards DROP COLUMN IF EXISTS reason;
+ALTER TABLE user_points_summary DROP CONSTRAINT IF EXISTS user_points_summary_pkey;
+ALTER TABLE user_points_summary DROP COLUMN IF EXISTS reason;
+ALTER TABLE user_points_summary ALTER COLUMN reason_id SET NOT NULL;
+ALTER TABLE user_points_summary ADD PRIMARY KEY (user_id, chat_id, period, reason_id);
+ALTER TABLE user_points DROP COLUMN IF EXISTS username, DROP COLUMN IF EXISTS chat_name, DROP COLUMN IF EXISTS reason;
+ALTER TABLE user_ranking DROP COLUMN IF EXISTS username, DROP COLUMN IF EXISTS chat_name;
+INSERT INTO schema_version (version, name) VALUES (6, 'columnas_normalizadas') ON CONFLICT (version) DO NOTHING;
+
+-- 0007 tiempos_epoch_ms: Todas las columnas de tiempo pasan a milisegundos desde epoch (BIGINT)
+ALTER TABLE active_games ALTER COLUMN last_activity DROP DEFAULT, ALTER COLUMN last_activity TYPE BIGINT USING (EXTRACT(EPOCH FROM last_activity) * 1000)::BIGINT, ALTER COLUMN last_activity SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE active_trivias ALTER COLUMN start_time TYPE BIGINT USING (start_time * 1000)::BIGINT;
+ALTER TABLE authorized_chats ALTER COLUMN authorized_at DROP DEFAULT, ALTER COLUMN authorized_at TYPE BIGINT USING (EXTRACT(EPOCH FROM authorized_at) * 1000)::BIGINT, ALTER COLUMN authorized_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE auth_requests ALTER COLUMN requested_at DROP DEFAULT, ALTER COLUMN requested_at TYPE BIGINT USING (EXTRACT(EPOCH FROM requested_at) * 1000)::BIGINT, ALTER COLUMN requested_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE challenges ALTER COLUMN created_at DROP DEFAULT, ALTER COLUMN created_at TYPE BIGINT USING (EXTRACT(EPOCH FROM created_at) * 1000)::BIGINT, ALTER COLUMN created_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE rate_limit_state ALTER COLUMN updated_at DROP DEFAULT, ALTER COLUMN updated_at TYPE BIGINT USING (EXTRACT(EPOCH FROM updated_at) * 1000)::BIGINT, ALTER COLUMN updated_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE bot_state ALTER COLUMN updated_at DROP DEFAULT, ALTER COLUMN updated_at TYPE BIGINT USING (EXTRACT(EPOCH FROM updated_at) * 1000)::BIGINT, ALTER COLUMN updated_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE chat_scoring ALTER COLUMN updated_at DROP DEFAULT, ALTER COLUMN updated_at TYPE BIGINT USING (EXTRACT(EPOCH FROM updated_at) * 1000)::BIGINT, ALTER COLUMN updated_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE user_achievements ALTER COLUMN unlocked_at DROP DEFAULT, ALTER COLUMN unlocked_at TYPE BIGINT USING (EXTRACT(EPOCH FROM unlocked_at) * 1000)::BIGINT, ALTER COLUMN unlocked_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+ALTER TABLE point_awards ALTER COLUMN created_at DROP DEFAULT, ALTER COLUMN created_at TYPE BIGINT USING (EXTRACT(EPOCH FROM created_at) * 1000)::BIGINT, ALTER COLUMN created_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'user_points'::regclass) = 'r' THEN
+        ALTER TABLE user_points ALTER COLUMN created_at DROP DEFAULT, ALTER COLUMN created_at TYPE BIGINT USING (EXTRACT(EPOCH FROM created_at) * 1000)::BIGINT, ALTER COLUMN created_at SET DEFAULT (EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT;
+    END IF;
+END
+$$;
+CREATE INDEX IF NOT EXISTS idx_active_games_last_activity ON active_games(last_activity);
+CREATE INDEX IF NOT EXISTS idx_active_trivias_start_time ON active_trivias(start_time);
+CREATE INDEX IF NOT EXISTS idx_auth_requests_requested_at ON auth_requests(requested_at);
+-- (esta migración incluye pasos en Python: aplícala con python3 -m migraciones)
+INSERT INTO schema_version (version, name) VALUES (7, 'tiempos_epoch_ms') ON CONFLICT (version) DO NOTHING;
+
+-- 3. INSERTAR DATOS DE EJEMPLO (OPCIONAL)
 -- Descomenta las siguientes líneas si quieres datos de prueba:
 
 /*
@@ -124,24 +272,15 @@ ON CONFLICT (chat_id) DO NOTHING;
 -- VERIFICACIÓN (Ejecutar después para confirmar)
 -- ====================================================
 
+-- Versión del esquema
+SELECT version, name, applied_at FROM schema_version ORDER BY version;
+
 -- Verificar que las tablas existan
 SELECT table_name 
 FROM information_schema.tables 
 WHERE table_schema = 'public'
 ORDER BY table_name;
 
--- Verificar columnas problemáticas de active_games
-SELECT column_name, data_type 
-FROM information_schema.columns 
-WHERE table_name = 'active_games'
-ORDER BY column_name;
-
--- Verificar columnas problemáticas de active_trivias  
-SELECT column_name, data_type 
-FROM information_schema.columns 
-WHERE table_name = 'active_trivias'
-ORDER BY column_name;
-
 -- ====================================================
 -- FIN DEL SCRIPT
 -- ====================================================
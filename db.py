@@ -2,250 +2,159 @@
 import sqlite3
 from datetime import datetime
 import os
+import re
+import time
 import psycopg2
 import logging
 
+from actividad import BitmapActividad, dia
+from cortacircuitos import CircuitoAbierto, Cortacircuitos
+from dimensiones import (CATEGORIA_HASHTAG, CATEGORIA_JUEGO, CATEGORIA_RETO,
+                         CacheDimensiones, categoria_razon)
+from metricas import registrar_fuente
+from replicas import EnrutadorLecturas
+from spool_puntos import SpoolPuntos
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+
+# Falla al instante mientras la base de datos está caída (ver cortacircuitos.py)
+cortacircuitos = Cortacircuitos(
+    umbral=int(os.environ.get('DB_BREAKER_THRESHOLD', 3)),
+    espera=float(os.environ.get('DB_BREAKER_COOLDOWN', 5)),
+)
+# Puntos pendientes de escribir mientras el circuito está abierto (ver spool_puntos.py)
+spool_puntos = SpoolPuntos(os.environ.get('POINTS_SPOOL_PATH', 'spool_puntos.db'))
+# Ids de razón y nombres ya escritos en users / chats / reason_codes (ver dimensiones.py)
+dimensiones = CacheDimensiones()
+
+# Códigos de PostgreSQL que son la conexión y no la consulta (clase 08 y el servidor parándose)
+_PGCODES_CONEXION = ("57P01", "57P02", "57P03")
+
+def _es_error_conexion(error: Exception) -> bool:
+    """True si `error` indica que la base de datos no está accesible (no un error de la consulta).
+
+    OperationalError también cubre errores de verdad ("no such column",
+    "database is locked", cancelaciones, deadlocks): esos no cuentan.
+    """
+    if isinstance(error, (CircuitoAbierto, psycopg2.InterfaceError)):
+        return True
+    if isinstance(error, psycopg2.OperationalError):
+        # Sin pgcode: el cliente no llegó a hablar con el servidor o la conexión se cortó
+        return error.pgcode is None or error.pgcode.startswith("08") or error.pgcode in _PGCODES_CONEXION
+    if isinstance(error, sqlite3.OperationalError):
+        # Sólo no poder abrir el archivo de la base de datos
+        return getattr(error, "sqlite_errorcode", None) == 14 or "unable to open database file" in str(error)
+    return False
 
 def get_connection():
     """Obtiene una conexión a la base de datos."""
-    if DATABASE_URL:
-        # Entorno de producción (Render)
-        return psycopg2.connect(DATABASE_URL)
-    else:
-        # Entorno local
-        return sqlite3.connect("puntum.db")
+    if not cortacircuitos.permitir():
+        raise CircuitoAbierto("Base de datos no disponible (circuito abierto)")
+    try:
+        if DATABASE_URL:
+            # Entorno de producción (Render)
+            conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+        else:
+            # Entorno local
+            conn = sqlite3.connect("puntum.db")
+    except (psycopg2.OperationalError, sqlite3.OperationalError):
+        cortacircuitos.fallo()
+        raise
+    cortacircuitos.exito()
+    return conn
 
-def is_postgresql():
-    """Detecta si estamos usando PostgreSQL"""
-    return DATABASE_URL is not None
+# Réplica de lectura opcional: URL de PostgreSQL o ruta a un archivo SQLite
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
 
-def create_all_tables():
-    """Crea todas las tablas necesarias del sistema en una sola transacción."""
-    conn = get_connection()
+def _connect_replica():
+    """Conexión de sólo lectura a la réplica"""
+    if is_postgresql():
+        conn = psycopg2.connect(DATABASE_REPLICA_URL, connect_timeout=DB_CONNECT_TIMEOUT)
+        conn.set_session(readonly=True, autocommit=True)
+        return conn
+    ruta = DATABASE_REPLICA_URL.removeprefix("sqlite:///")
+    return sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+
+def _replica_lag(conn) -> float:
+    """Segundos que la réplica va por detrás de la primaria (0 si no es una réplica)"""
+    if not is_postgresql():
+        # Una copia SQLite no informa de su retraso: se confía en max_staleness
+        return 0.0
     cursor = conn.cursor()
-    
     try:
-        logger.info("🔄 Creando/verificando tablas de la base de datos...")
-        
-        if is_postgresql():
-            # === TABLAS POSTGRESQL ===
-            logger.info("📊 Usando PostgreSQL")
-            
-            # Tabla para juegos activos
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS active_games (
-                    chat_id BIGINT PRIMARY KEY,
-                    juego TEXT,
-                    respuesta TEXT,
-                    pistas TEXT,
-                    intentos INTEGER,
-                    started_by BIGINT,
-                    last_activity TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Tabla para trivias activas
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS active_trivias (
-                    chat_id BIGINT PRIMARY KEY,
-                    pregunta TEXT,
-                    respuesta TEXT,
-                    start_time DOUBLE PRECISION,
-                    opciones TEXT,
-                    message_id BIGINT,
-                    inline_keyboard_message_id BIGINT
-                )
-            """)
-            
-            # Tablas de autorización
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS authorized_chats (
-                    chat_id BIGINT PRIMARY KEY,
-                    chat_title TEXT,
-                    authorized_by BIGINT,
-                    authorized_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'active'
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS auth_requests (
-                    id SERIAL PRIMARY KEY,
-                    chat_id BIGINT,
-                    chat_title TEXT,
-                    requested_by BIGINT,
-                    requester_username TEXT,
-                    requested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'pending'
-                )
-            """)
-            
-            # Tablas de usuarios
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_points (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    chat_id BIGINT NOT NULL,
-                    username TEXT,
-                    chat_name TEXT,
-                    points_gained INTEGER NOT NULL,
-                    reason TEXT,
-                    message_id BIGINT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_ranking (
-                    user_id BIGINT NOT NULL,
-                    chat_id BIGINT NOT NULL,
-                    username TEXT,
-                    chat_name TEXT,
-                    total_points INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, chat_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_config (
-                    chat_id BIGINT PRIMARY KEY,
-                    chat_name TEXT,
-                    rankings_enabled BOOLEAN DEFAULT TRUE,
-                    challenges_enabled BOOLEAN DEFAULT TRUE
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS challenges (
-                    id SERIAL PRIMARY KEY,
-                    challenger_id BIGINT NOT NULL,
-                    challengee_id BIGINT NOT NULL,
-                    chat_id BIGINT NOT NULL,
-                    message_id BIGINT,
-                    status TEXT DEFAULT 'pending',
-                    type TEXT,
-                    data TEXT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-        else:
-            # === TABLAS SQLITE ===
-            logger.info("📊 Usando SQLite")
-            
-            # Tabla para juegos activos
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS active_games (
-                    chat_id INTEGER PRIMARY KEY,
-                    juego TEXT,
-                    respuesta TEXT,
-                    pistas TEXT,
-                    intentos INTEGER,
-                    started_by INTEGER,
-                    last_activity TEXT
-                )
-            """)
-            
-            # Tabla para trivias activas
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS active_trivias (
-                    chat_id INTEGER PRIMARY KEY,
-                    pregunta TEXT,
-                    respuesta TEXT,
-                    start_time REAL,
-                    opciones TEXT,
-                    message_id INTEGER,
-                    inline_keyboard_message_id INTEGER
-                )
-            """)
-            
-            # Tablas de autorización
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS authorized_chats (
-                    chat_id INTEGER PRIMARY KEY,
-                    chat_title TEXT,
-                    authorized_by INTEGER,
-                    authorized_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'active'
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS auth_requests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER,
-                    chat_title TEXT,
-                    requested_by INTEGER,
-                    requester_username TEXT,
-                    requested_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'pending'
-                )
-            """)
-            
-            # Tablas de usuarios
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_points (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    username TEXT,
-                    chat_name TEXT,
-                    points_gained INTEGER NOT NULL,
-                    reason TEXT,
-                    message_id INTEGER,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_ranking (
-                    user_id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    username TEXT,
-                    chat_name TEXT,
-                    total_points INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, chat_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_config (
-                    chat_id INTEGER PRIMARY KEY,
-                    chat_name TEXT,
-                    rankings_enabled INTEGER DEFAULT 1,
-                    challenges_enabled INTEGER DEFAULT 1
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS challenges (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    challenger_id INTEGER NOT NULL,
-                    challengee_id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    message_id INTEGER,
-                    status TEXT DEFAULT 'pending',
-                    type TEXT,
-                    data TEXT,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        
-        conn.commit()
-        logger.info("✅ Todas las tablas creadas/verificadas exitosamente")
-        
-    except Exception as e:
-        logger.error(f"❌ Error al crear tablas: {e}")
-        conn.rollback()
-        raise
+        cursor.execute(
+            """SELECT CASE WHEN pg_is_in_recovery()
+                        THEN COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+                        ELSE 0 END"""
+        )
+        return float(cursor.fetchone()[0])
     finally:
         cursor.close()
-        conn.close()
+
+lecturas = EnrutadorLecturas(
+    _connect_replica,
+    _replica_lag,
+    ventana_escritura=float(os.environ.get('READ_YOUR_WRITES_SECONDS', 15)),
+    intervalo_retraso=float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 10)),
+) if DATABASE_REPLICA_URL else None
+
+def get_read_connection(max_staleness: float = 30.0, user_id: int = None):
+    """Conexión para una consulta de sólo lectura.
+
+    Va a la réplica si hay una configurada, su retraso no pasa de
+    max_staleness segundos y user_id (si se indica) no ha escrito hace
+    poco; si no, a la primaria como get_connection.
+    """
+    if lecturas is not None:
+        conn = lecturas.conectar(user_id=user_id, max_retraso=max_staleness)
+        if conn is not None:
+            return conn
+    return get_connection()
+
+def _note_write(user_id: int):
+    """Las lecturas de este usuario irán a la primaria durante un rato"""
+    if lecturas is not None:
+        lecturas.registrar_escritura(user_id)
+
+def _metricas_db() -> dict:
+    metricas = {
+        "circuito": cortacircuitos.metricas(),
+        "spool_puntos": spool_puntos.metricas(),
+        "dimensiones": dimensiones.metricas(),
+    }
+    if lecturas is not None:
+        metricas["lecturas"] = lecturas.metricas()
+    return metricas
+
+registrar_fuente("base_datos", _metricas_db)
+
+def is_postgresql():
+    """Detecta si estamos usando PostgreSQL"""
+    return bool(DATABASE_URL)
+
+def epoch_ms(instante: datetime = None) -> int:
+    """Milisegundos desde epoch de `instante` (ahora si no se pasa): así se guardan todos los tiempos"""
+    return int((instante.timestamp() if instante else time.time()) * 1000)
+
+def from_epoch_ms(ms: int) -> datetime:
+    """Fecha y hora local de un tiempo guardado en milisegundos"""
+    return datetime.fromtimestamp(ms / 1000)
+
+def create_all_tables():
+    """Deja el esquema en la última versión (ver el paquete migraciones).
+
+    Con el esquema al día es una sola consulta a schema_version.
+    """
+    import migraciones
+
+    aplicadas = migraciones.migrar()
+    if aplicadas:
+        logger.info(f"✅ Esquema actualizado a la versión {aplicadas[-1].version}")
 
 # FUNCIONES DE COMPATIBILIDAD (mantener para evitar romper imports)
 def create_games_tables():
@@ -265,46 +174,157 @@ def create_user_tables():
 
 # === FUNCIONES DE PUNTOS Y RANKING ===
 
-def add_points(user_id: int, chat_id: int, points: int, username: str, chat_name: str, reason: str, message_id: int):
-    """Agregar puntos a un usuario"""
+def _reason_code(reason: str) -> int:
+    """reason_id de una razón; la crea en reason_codes la primera vez.
+
+    Casi siempre sale de la caché: sólo la primera aparición de una razón
+    en el proceso cuesta una consulta, en su propia transacción (así el id
+    vale aunque falle la transacción que lo pidió).
+    """
+    reason = reason or ''
+    reason_id = dimensiones.razon(reason)
+    if reason_id is not None:
+        return reason_id
     conn = get_connection()
     cursor = conn.cursor()
-    
     try:
         if is_postgresql():
             cursor.execute(
-                """INSERT INTO user_points (user_id, chat_id, username, chat_name, points_gained, reason, message_id, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-                """,
-                (user_id, chat_id, username, chat_name, points, reason, message_id)
-            )
-            cursor.execute(
-                """INSERT INTO user_ranking (user_id, chat_id, username, chat_name, total_points)
-                   VALUES (%s, %s, %s, %s, %s)
-                   ON CONFLICT (user_id, chat_id) DO UPDATE SET
-                   username = EXCLUDED.username,
-                   chat_name = EXCLUDED.chat_name,
-                   total_points = user_ranking.total_points + EXCLUDED.total_points
-                """,
-                (user_id, chat_id, username, chat_name, points)
+                """INSERT INTO reason_codes (reason, category) VALUES (%s, %s)
+                   ON CONFLICT (reason) DO UPDATE SET reason = EXCLUDED.reason
+                   RETURNING id""",
+                (reason, categoria_razon(reason))
             )
         else:
-            cursor.execute(
-                """INSERT INTO user_points (user_id, chat_id, username, chat_name, points_gained, reason, message_id, created_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (user_id, chat_id, username, chat_name, points, reason, message_id, datetime.now().isoformat())
-            )
-            cursor.execute(
-                """INSERT OR REPLACE INTO user_ranking (user_id, chat_id, username, chat_name, total_points)
-                   VALUES (?, ?, ?, ?, COALESCE((SELECT total_points FROM user_ranking WHERE user_id = ? AND chat_id = ?), 0) + ?)
-                """,
-                (user_id, chat_id, username, chat_name, user_id, chat_id, points)
-            )
+            cursor.execute("INSERT OR IGNORE INTO reason_codes (reason, category) VALUES (?, ?)",
+                           (reason, categoria_razon(reason)))
+            cursor.execute("SELECT id FROM reason_codes WHERE reason = ?", (reason,))
+        reason_id = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    dimensiones.guardar_razon(reason, reason_id)
+    return reason_id
+
+def _dimension_upserts(user_id: int, username: str, chat_id: int, chat_name: str):
+    """[(sql, params)] para guardar los nombres que la caché no tiene ya escritos"""
+    p = "%s" if is_postgresql() else "?"
+    sentencias = []
+    if dimensiones.usuario_cambiado(user_id, username):
+        sentencias.append((
+            f"INSERT INTO users (user_id, username) VALUES ({p}, {p}) "
+            "ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username",
+            (user_id, username)
+        ))
+    if dimensiones.chat_cambiado(chat_id, chat_name):
+        sentencias.append((
+            f"INSERT INTO chats (chat_id, chat_name) VALUES ({p}, {p}) "
+            "ON CONFLICT (chat_id) DO UPDATE SET chat_name = EXCLUDED.chat_name",
+            (chat_id, chat_name)
+        ))
+    return sentencias
 
+def _insert_points(cursor, user_id: int, chat_id: int, points: int, username: str, chat_name: str,
+                   reason: str, message_id: int, created_at: str = None) -> bool:
+    """Inserta el evento, suma al ranking y marca el día como activo (sin commit).
+
+    Un premio se identifica por (chat_id, message_id, reason): si ya existe
+    no se suma nada y devuelve False. Los nombres y la razón van a las
+    dimensiones (users, chats, reason_codes); el evento sólo guarda ids.
+    """
+    # created_at (ISO con zona) sólo viene al reaplicar el spool; si no, es ahora
+    instante = epoch_ms(datetime.fromisoformat(created_at)) if created_at else epoch_ms()
+    reason_id = _reason_code(reason)
+    dimensiones_nuevas = _dimension_upserts(user_id, username, chat_id, chat_name)
+    if is_postgresql():
+        # Un solo viaje: los nombres que falten y, en una sentencia, el evento y el
+        # ranking, que sólo se escriben si el premio no existía. user_points está
+        # particionada por mes y no admite un índice único sin created_at: la
+        # unicidad la da point_awards (ver migraciones/m0004_retencion_puntos.py)
+        cursor.execute(
+            "".join(sql + ";\n" for sql, _ in dimensiones_nuevas) +
+            """WITH premio AS (
+                   INSERT INTO point_awards (chat_id, message_id, reason_id, created_at)
+                   VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (chat_id, message_id, reason_id) DO NOTHING
+                   RETURNING created_at
+               ), nuevo AS (
+                   INSERT INTO user_points (user_id, chat_id, points_gained, reason_id, message_id, created_at)
+                   SELECT %s, %s, %s, %s, %s, created_at FROM premio
+                   RETURNING user_id, chat_id, points_gained
+               )
+               INSERT INTO user_ranking (user_id, chat_id, total_points)
+               SELECT user_id, chat_id, points_gained FROM nuevo
+               ON CONFLICT (user_id, chat_id) DO UPDATE SET
+               total_points = user_ranking.total_points + EXCLUDED.total_points
+            """,
+            tuple(valor for _, params in dimensiones_nuevas for valor in params) +
+            (chat_id, message_id, reason_id, instante,
+             user_id, chat_id, points, reason_id, message_id)
+        )
+        dimensiones.recordar(user_id, username, chat_id, chat_name)
+        if cursor.rowcount == 0:
+            return False
+    else:
+        for sql, params in dimensiones_nuevas:
+            cursor.execute(sql, params)
+        dimensiones.recordar(user_id, username, chat_id, chat_name)
+        cursor.execute(
+            """INSERT INTO user_points (user_id, chat_id, points_gained, reason_id, message_id, created_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (chat_id, message_id, reason_id) DO NOTHING
+            """,
+            (user_id, chat_id, points, reason_id, message_id, instante)
+        )
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute(
+            """INSERT INTO user_ranking (user_id, chat_id, total_points) VALUES (?, ?, ?)
+               ON CONFLICT (user_id, chat_id) DO UPDATE SET total_points = total_points + excluded.total_points
+            """,
+            (user_id, chat_id, points)
+        )
+    _mark_activity(cursor, user_id, chat_id, dia(from_epoch_ms(instante)))
+    return True
+
+def add_points(user_id: int, chat_id: int, points: int, username: str, chat_name: str, reason: str, message_id: int) -> bool:
+    """Agregar puntos a un usuario.
+
+    Devuelve False si ese mensaje ya tenía un premio con la misma razón
+    (update reentregado, reintento): los puntos no se suman dos veces.
+    Si la base de datos no está accesible, el evento va al spool local y se
+    reaplica al volver (replay_point_spool): los puntos no se pierden.
+    """
+    evento = dict(user_id=user_id, chat_id=chat_id, points=points, username=username,
+                  chat_name=chat_name, reason=reason, message_id=message_id)
+    try:
+        _reason_code(reason)
+        conn = get_connection()
+    except Exception as e:
+        if not _es_error_conexion(e):
+            logger.error(f"❌ Error añadiendo puntos: {e}")
+            raise
+        _spool_points(evento, e)
+        return True
+    cursor = conn.cursor()
+    
+    try:
+        inserted = _insert_points(cursor, **evento)
         conn.commit()
-        logger.debug(f"✅ Puntos agregados: {points} a usuario {user_id} en chat {chat_id}")
+        if inserted:
+            _note_write(user_id)
+            logger.debug(f"✅ Puntos agregados: {points} a usuario {user_id} en chat {chat_id}")
+        else:
+            logger.info(f"♻️ Premio repetido ignorado: mensaje {message_id} del chat {chat_id} ({reason})")
+        return inserted
     except Exception as e:
+        dimensiones.olvidar(user_id, chat_id)
+        if _es_error_conexion(e):
+            # La conexión se cayó a mitad de la transacción
+            cortacircuitos.fallo()
+            _spool_points(evento, e)
+            return True
         logger.error(f"❌ Error añadiendo puntos: {e}")
         conn.rollback()
         raise
@@ -312,25 +332,163 @@ def add_points(user_id: int, chat_id: int, points: int, username: str, chat_name
         cursor.close()
         conn.close()
 
+def _spool_points(evento: dict, error: Exception):
+    evento["created_at"] = datetime.now().astimezone().isoformat()
+    spool_puntos.guardar(evento)
+    logger.warning(f"💾 Base de datos no disponible ({error}): {evento['points']} puntos de {evento['user_id']} al spool")
+
+def replay_point_spool(batch_size: int = 200) -> int:
+    """Reaplica el spool de puntos en lotes; devuelve cuántos eventos aplicó.
+
+    Cada lote va en una transacción que también guarda en bot_state el
+    último seq aplicado, así que un lote repetido no suma dos veces; además
+    cada premio es idempotente por (chat_id, message_id, reason).
+    """
+    if not spool_puntos.profundidad():
+        return 0
+    key = f"points_spool:{spool_puntos.id}"
+    applied = 0
+    while True:
+        batch = spool_puntos.lote(batch_size)
+        if not batch:
+            return applied
+        # Razones nuevas antes de abrir la transacción del lote (cada una va en la suya)
+        for _, evento in batch:
+            _reason_code(evento["reason"])
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            if is_postgresql():
+                cursor.execute(
+                    "INSERT INTO bot_state (key, value, updated_at) VALUES (%s, '0', %s) ON CONFLICT (key) DO NOTHING",
+                    (key, epoch_ms())
+                )
+                # Serializa a los procesos que compartan el spool
+                cursor.execute("SELECT value FROM bot_state WHERE key = %s FOR UPDATE", (key,))
+            else:
+                cursor.execute("INSERT OR IGNORE INTO bot_state (key, value, updated_at) VALUES (?, '0', ?)",
+                               (key, epoch_ms()))
+                cursor.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
+            last_applied = int(cursor.fetchone()[0])
+
+            for seq, evento in batch:
+                if seq > last_applied and _insert_points(cursor, **evento):
+                    _note_write(evento["user_id"])
+                    applied += 1
+
+            last_seq = batch[-1][0]
+            if is_postgresql():
+                cursor.execute("UPDATE bot_state SET value = %s, updated_at = %s WHERE key = %s",
+                               (str(max(last_seq, last_applied)), epoch_ms(), key))
+            else:
+                cursor.execute("UPDATE bot_state SET value = ?, updated_at = ? WHERE key = ?",
+                               (str(max(last_seq, last_applied)), epoch_ms(), key))
+            conn.commit()
+        except Exception as e:
+            for _, evento in batch:
+                dimensiones.olvidar(evento["user_id"], evento["chat_id"])
+            if _es_error_conexion(e):
+                cortacircuitos.fallo()
+                raise
+            logger.error(f"❌ Error reaplicando el spool de puntos: {e}")
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        spool_puntos.borrar_hasta(last_seq)
+
+def _read_activity(cursor, user_id: int, chat_id: int, for_update: bool = False):
+    if is_postgresql():
+        cursor.execute(
+            "SELECT base_day, bits FROM activity_bitmaps WHERE user_id = %s AND chat_id = %s"
+            + (" FOR UPDATE" if for_update else ""),
+            (user_id, chat_id)
+        )
+    else:
+        cursor.execute(
+            "SELECT base_day, bits FROM activity_bitmaps WHERE user_id = ? AND chat_id = ?",
+            (user_id, chat_id)
+        )
+    row = cursor.fetchone()
+    return BitmapActividad.desde_bytes(row[0], row[1]) if row else None
+
+def _write_activity(cursor, user_id: int, chat_id: int, bitmap: BitmapActividad):
+    if is_postgresql():
+        cursor.execute(
+            """INSERT INTO activity_bitmaps (user_id, chat_id, base_day, bits)
+               VALUES (%s, %s, %s, %s)
+               ON CONFLICT (user_id, chat_id) DO UPDATE SET
+               base_day = EXCLUDED.base_day,
+               bits = EXCLUDED.bits
+            """,
+            (user_id, chat_id, bitmap.base_dia, psycopg2.Binary(bitmap.a_bytes()))
+        )
+    else:
+        cursor.execute(
+            "INSERT OR REPLACE INTO activity_bitmaps (user_id, chat_id, base_day, bits) VALUES (?, ?, ?, ?)",
+            (user_id, chat_id, bitmap.base_dia, bitmap.a_bytes())
+        )
+
+def _mark_activity(cursor, user_id: int, chat_id: int, day: int):
+    """Marca el día en el mapa de actividad dentro de la transacción de add_points"""
+    bitmap = _read_activity(cursor, user_id, chat_id, for_update=True) or BitmapActividad()
+    if bitmap.marcar(day):
+        _write_activity(cursor, user_id, chat_id, bitmap)
+
+def get_activity_bitmap(user_id: int, chat_id: int):
+    """Obtener el mapa de actividad diaria de un usuario en un chat (o uno vacío)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        return _read_activity(cursor, user_id, chat_id) or BitmapActividad()
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo actividad de usuario: {e}")
+        return BitmapActividad()
+    finally:
+        cursor.close()
+        conn.close()
+
+def merge_activity_bitmaps(bitmaps):
+    """Unir mapas de actividad {(user_id, chat_id): BitmapActividad} con los guardados"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        for (user_id, chat_id), bitmap in bitmaps.items():
+            existente = _read_activity(cursor, user_id, chat_id, for_update=True)
+            if existente is not None:
+                bitmap.unir(existente)
+            _write_activity(cursor, user_id, chat_id, bitmap)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error guardando mapas de actividad: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
 def get_top_users(chat_id: int, limit: int = 10):
     """Obtener top usuarios por puntos"""
-    conn = get_connection()
+    conn = get_read_connection(max_staleness=30)
     cursor = conn.cursor()
     try:
         if is_postgresql():
             cursor.execute(
-                """SELECT username, total_points FROM user_ranking 
-                   WHERE chat_id = %s
-                   ORDER BY total_points DESC
+                """SELECT u.username, r.total_points FROM user_ranking r
+                   LEFT JOIN users u ON u.user_id = r.user_id
+                   WHERE r.chat_id = %s
+                   ORDER BY r.total_points DESC
                    LIMIT %s
                 """,
                 (chat_id, limit)
             )
         else:
             cursor.execute(
-                """SELECT username, total_points FROM user_ranking 
-                   WHERE chat_id = ?
-                   ORDER BY total_points DESC
+                """SELECT u.username, r.total_points FROM user_ranking r
+                   LEFT JOIN users u ON u.user_id = r.user_id
+                   WHERE r.chat_id = ?
+                   ORDER BY r.total_points DESC
                    LIMIT ?
                 """,
                 (chat_id, limit)
@@ -346,7 +504,7 @@ def get_top_users(chat_id: int, limit: int = 10):
 
 def get_user_rank(user_id: int, chat_id: int):
     """Obtener puntos totales de un usuario"""
-    conn = get_connection()
+    conn = get_read_connection(max_staleness=30, user_id=user_id)
     cursor = conn.cursor()
     try:
         if is_postgresql():
@@ -382,25 +540,27 @@ def update_user_ranking_points(user_id: int, chat_id: int, new_total_points: int
     conn = get_connection()
     cursor = conn.cursor()
     try:
+        for sql, params in _dimension_upserts(user_id, username, chat_id, chat_name):
+            cursor.execute(sql, params)
         if is_postgresql():
             cursor.execute(
-                """INSERT INTO user_ranking (user_id, chat_id, username, chat_name, total_points)
-                   VALUES (%s, %s, %s, %s, %s)
+                """INSERT INTO user_ranking (user_id, chat_id, total_points)
+                   VALUES (%s, %s, %s)
                    ON CONFLICT (user_id, chat_id) DO UPDATE SET
-                   username = EXCLUDED.username,
-                   chat_name = EXCLUDED.chat_name,
                    total_points = EXCLUDED.total_points
                 """,
-                (user_id, chat_id, username, chat_name, new_total_points)
+                (user_id, chat_id, new_total_points)
             )
         else:
             cursor.execute(
-                """INSERT OR REPLACE INTO user_ranking (user_id, chat_id, username, chat_name, total_points)
-                   VALUES (?, ?, ?, ?, ?)
+                """INSERT OR REPLACE INTO user_ranking (user_id, chat_id, total_points)
+                   VALUES (?, ?, ?)
                 """,
-                (user_id, chat_id, username, chat_name, new_total_points)
+                (user_id, chat_id, new_total_points)
             )
         conn.commit()
+        dimensiones.recordar(user_id, username, chat_id, chat_name)
+        _note_write(user_id)
     except Exception as e:
         logger.error(f"❌ Error actualizando puntos de usuario: {e}")
         conn.rollback()
@@ -409,6 +569,222 @@ def update_user_ranking_points(user_id: int, chat_id: int, new_total_points: int
         cursor.close()
         conn.close()
 
+# === RETENCIÓN DE PUNTOS (ver retencion.py) ===
+
+_PATRON_PARTICION = re.compile(r"^user_points_p(\d{4})(\d{2})$")
+
+def _month_start(fecha: datetime, meses: int = 0) -> datetime:
+    """Primer día del mes de `fecha` desplazado `meses` meses (sin hora ni zona)"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+_SUMMARY_UPSERT_PG = """
+    INSERT INTO user_points_summary (user_id, chat_id, period, reason_id, points, entries)
+    SELECT user_id, chat_id, date_trunc('month', to_timestamp(created_at / 1000.0))::date, reason_id, SUM(points_gained), COUNT(*)
+    FROM {fuente}
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (user_id, chat_id, period, reason_id) DO UPDATE SET
+    points = user_points_summary.points + EXCLUDED.points,
+    entries = user_points_summary.entries + EXCLUDED.entries
+"""
+
+def _points_partitioned(cursor) -> bool:
+    """True si user_points es una tabla particionada (sólo PostgreSQL)"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'user_points'::regclass")
+    return cursor.fetchone()[0] == 'p'
+
+def _point_partitions(cursor):
+    """[(nombre, inicio del mes)] de las particiones mensuales de user_points, de la más antigua a la más nueva"""
+    cursor.execute(
+        """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'user_points'::regclass"""
+    )
+    particiones = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = _PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            particiones.append((nombre, datetime(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)))
+    return sorted(particiones, key=lambda p: p[1])
+
+def ensure_point_partitions(cursor, desde: datetime = None, months_ahead: int = 2) -> int:
+    """Crea las particiones mensuales de user_points desde `desde` hasta dentro de months_ahead meses.
+
+    Un mes cuyas filas ya estén en la partición DEFAULT no se puede crear:
+    se salta y esas filas se compactan desde la DEFAULT. Devuelve cuántas creó.
+    """
+    existentes = {nombre for nombre, _ in _point_partitions(cursor)}
+    mes = _month_start(desde or datetime.now())
+    ultimo = _month_start(datetime.now(), months_ahead)
+    creadas = 0
+    while mes <= ultimo:
+        nombre = f"user_points_p{mes:%Y%m}"
+        if nombre not in existentes:
+            cursor.execute("SAVEPOINT particion")
+            try:
+                cursor.execute(
+                    f"CREATE TABLE {nombre} PARTITION OF user_points FOR VALUES FROM (%s) TO (%s)",
+                    (epoch_ms(mes), epoch_ms(_month_start(mes, 1)))
+                )
+                cursor.execute("RELEASE SAVEPOINT particion")
+                creadas += 1
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT particion")
+                logger.warning(f"⚠️ No se pudo crear la partición {nombre}: {e}")
+        mes = _month_start(mes, 1)
+    return creadas
+
+def maintain_point_partitions() -> int:
+    """Crea por adelantado las particiones de los próximos meses (no hace nada sin particiones)"""
+    if not is_postgresql():
+        return 0
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        creadas = ensure_point_partitions(cursor) if _points_partitioned(cursor) else 0
+        conn.commit()
+        return creadas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def count_points_before(cutoff: datetime) -> int:
+    """Eventos de user_points anteriores a `cutoff` (lo que queda por compactar)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute("SELECT COUNT(*) FROM user_points WHERE created_at < %s", (epoch_ms(cutoff),))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM user_points WHERE created_at < ?", (epoch_ms(cutoff),))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+def compact_point_partition(cutoff: datetime) -> int:
+    """Compacta la partición mensual más antigua si todo su mes es anterior a `cutoff`.
+
+    Suma el mes entero a user_points_summary y suelta la partición
+    (DETACH + DROP), sin borrar fila a fila. Devuelve cuántos eventos
+    compactó (0 si no hay particiones o ninguna cabe entera antes del corte).
+    """
+    if not is_postgresql():
+        return 0
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if not _points_partitioned(cursor):
+            return 0
+        limite = cutoff.astimezone().replace(tzinfo=None)
+        antiguas = [nombre for nombre, mes in _point_partitions(cursor) if _month_start(mes, 1) <= limite]
+        if not antiguas:
+            return 0
+        nombre = antiguas[0]
+        cursor.execute(f"SELECT COUNT(*) FROM {nombre}")
+        eventos = cursor.fetchone()[0]
+        cursor.execute(_SUMMARY_UPSERT_PG.format(fuente=nombre))
+        cursor.execute(f"ALTER TABLE user_points DETACH PARTITION {nombre}")
+        cursor.execute(f"DROP TABLE {nombre}")
+        conn.commit()
+        logger.info(f"🗜️ Partición {nombre} compactada y eliminada ({eventos} eventos)")
+        return eventos
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def compact_points_batch(cutoff: datetime, batch_size: int = 1000) -> int:
+    """Mueve a user_points_summary los `batch_size` eventos más antiguos anteriores a `cutoff`.
+
+    El resumen y el borrado van en la misma transacción, así que para cada
+    usuario y chat user_points + user_points_summary sigue cuadrando con
+    user_ranking. Devuelve cuántos eventos compactó (0: no queda nada).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute(
+                """WITH lote AS (
+                       DELETE FROM user_points WHERE (id, created_at) IN (
+                           SELECT id, created_at FROM user_points
+                           WHERE created_at < %s
+                           ORDER BY created_at
+                           LIMIT %s
+                       )
+                       RETURNING user_id, chat_id, created_at, reason_id, points_gained
+                   ), resumen AS ("""
+                + _SUMMARY_UPSERT_PG.format(fuente="lote") +
+                """    RETURNING 1
+                   )
+                   SELECT COUNT(*) FROM lote""",
+                (epoch_ms(cutoff), batch_size)
+            )
+            compactados = cursor.fetchone()[0]
+        else:
+            corte = epoch_ms(cutoff)
+            cursor.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM user_points WHERE created_at < ? ORDER BY id LIMIT ?)",
+                (corte, batch_size)
+            )
+            hasta = cursor.fetchone()[0]
+            if hasta is None:
+                return 0
+            cursor.execute(
+                """INSERT INTO user_points_summary (user_id, chat_id, period, reason_id, points, entries)
+                   SELECT user_id, chat_id, strftime('%Y-%m-01', created_at / 1000, 'unixepoch', 'localtime'), reason_id, SUM(points_gained), COUNT(*)
+                   FROM user_points
+                   WHERE created_at < ? AND id <= ?
+                   GROUP BY 1, 2, 3, 4
+                   ON CONFLICT (user_id, chat_id, period, reason_id) DO UPDATE SET
+                   points = points + excluded.points,
+                   entries = entries + excluded.entries
+                """,
+                (corte, hasta)
+            )
+            cursor.execute("DELETE FROM user_points WHERE created_at < ? AND id <= ?", (corte, hasta))
+            compactados = cursor.rowcount
+        conn.commit()
+        return compactados
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def prune_point_awards(cutoff: datetime, batch_size: int = 1000) -> int:
+    """Borra de point_awards hasta `batch_size` premios anteriores a `cutoff` (sólo PostgreSQL).
+
+    Su evento ya está compactado y un premio tan antiguo no se puede
+    reentregar (Telegram guarda los updates 24 horas).
+    """
+    if not is_postgresql():
+        return 0
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """DELETE FROM point_awards WHERE ctid = ANY(ARRAY(
+                   SELECT ctid FROM point_awards WHERE created_at < %s LIMIT %s
+               ))""",
+            (epoch_ms(cutoff), batch_size)
+        )
+        borrados = cursor.rowcount
+        conn.commit()
+        return borrados
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
 # === FUNCIONES DE CHALLENGES ===
 
 def add_challenge(challenge_data):
@@ -419,12 +795,12 @@ def add_challenge(challenge_data):
         if is_postgresql():
             cursor.execute(
                 """INSERT INTO challenges (challenger_id, challengee_id, chat_id, message_id, status, type, data, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 """,
                 (challenge_data['challenger_id'], challenge_data['challengee_id'], 
                  challenge_data['chat_id'], challenge_data['message_id'], 
                  challenge_data['status'], challenge_data['type'], 
-                 challenge_data['data'])
+                 challenge_data['data'], epoch_ms())
             )
         else:
             cursor.execute(
@@ -434,7 +810,7 @@ def add_challenge(challenge_data):
                 (challenge_data['challenger_id'], challenge_data['challengee_id'], 
                  challenge_data['chat_id'], challenge_data['message_id'], 
                  challenge_data['status'], challenge_data['type'], 
-                 challenge_data['data'], datetime.now().isoformat())
+                 challenge_data['data'], epoch_ms())
             )
         conn.commit()
     except Exception as e:
@@ -626,6 +1002,184 @@ def get_configured_chats():
         cursor.close()
         conn.close()
 
+def save_chat_scoring(chat_id: int, overrides: str):
+    """Guardar los ajustes de puntuación de un chat (JSON serializado)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute(
+                """INSERT INTO chat_scoring (chat_id, overrides, updated_at)
+                   VALUES (%s, %s, %s)
+                   ON CONFLICT (chat_id) DO UPDATE SET
+                   overrides = EXCLUDED.overrides,
+                   updated_at = EXCLUDED.updated_at
+                """,
+                (chat_id, overrides, epoch_ms())
+            )
+        else:
+            cursor.execute(
+                """INSERT OR REPLACE INTO chat_scoring (chat_id, overrides, updated_at)
+                   VALUES (?, ?, ?)
+                """,
+                (chat_id, overrides, epoch_ms())
+            )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error guardando ajustes de puntuación del chat: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def delete_chat_scoring(chat_id: int):
+    """Eliminar los ajustes de puntuación de un chat (vuelve a las reglas generales)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute("DELETE FROM chat_scoring WHERE chat_id = %s", (chat_id,))
+        else:
+            cursor.execute("DELETE FROM chat_scoring WHERE chat_id = ?", (chat_id,))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error eliminando ajustes de puntuación del chat: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_all_chat_scoring():
+    """Obtener los ajustes de puntuación de todos los chats como {chat_id: JSON}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT chat_id, overrides FROM chat_scoring")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo ajustes de puntuación: {e}")
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+# === FUNCIONES DE LOGROS ===
+
+# Cómo se actualiza cada contador al recibir un evento en el periodo `period`:
+# total suma siempre, distinct suma sólo si el periodo cambió (días distintos)
+# y periodic vuelve a empezar en cada periodo nuevo (p. ej. retos de la semana)
+_ACTUALIZACION_CONTADOR = {
+    "total": "achievement_counters.value + 1",
+    "distinct": "CASE WHEN achievement_counters.period = excluded.period "
+                "THEN achievement_counters.value ELSE achievement_counters.value + 1 END",
+    "periodic": "CASE WHEN achievement_counters.period = excluded.period "
+                "THEN achievement_counters.value + 1 ELSE 1 END",
+}
+
+def bump_achievement_counters(user_id: int, increments):
+    """Incrementa los contadores de un usuario en una transacción.
+
+    increments: lista de (counter, mode, period). Devuelve {counter: valor nuevo}.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    marca = "%s" if is_postgresql() else "?"
+    try:
+        valores = {}
+        for counter, mode, period in increments:
+            cursor.execute(
+                f"""INSERT INTO achievement_counters (user_id, counter, value, period)
+                    VALUES ({marca}, {marca}, 1, {marca})
+                    ON CONFLICT (user_id, counter) DO UPDATE SET
+                    value = {_ACTUALIZACION_CONTADOR[mode]},
+                    period = excluded.period
+                    RETURNING value
+                """,
+                (user_id, counter, period)
+            )
+            valores[counter] = cursor.fetchone()[0]
+        conn.commit()
+        return valores
+    except Exception as e:
+        logger.error(f"❌ Error actualizando contadores de logros: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_achievement_counters(user_id: int, counters):
+    """Obtener {counter: (value, period)} de los contadores pedidos de un usuario"""
+    counters = list(counters)
+    if not counters:
+        return {}
+    conn = get_connection()
+    cursor = conn.cursor()
+    marca = "%s" if is_postgresql() else "?"
+    try:
+        cursor.execute(
+            f"SELECT counter, value, period FROM achievement_counters "
+            f"WHERE user_id = {marca} AND counter IN ({', '.join([marca] * len(counters))})",
+            (user_id, *counters)
+        )
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo contadores de logros: {e}")
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+def add_achievement(user_id: int, achievement_id: int, chat_id: int = None) -> bool:
+    """Registrar un logro desbloqueado; devuelve False si el usuario ya lo tenía"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute(
+                """INSERT INTO user_achievements (user_id, achievement_id, chat_id, unlocked_at)
+                   VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (user_id, achievement_id) DO NOTHING
+                """,
+                (user_id, achievement_id, chat_id, epoch_ms())
+            )
+        else:
+            cursor.execute(
+                """INSERT OR IGNORE INTO user_achievements (user_id, achievement_id, chat_id, unlocked_at)
+                   VALUES (?, ?, ?, ?)
+                """,
+                (user_id, achievement_id, chat_id, epoch_ms())
+            )
+        nuevo = cursor.rowcount == 1
+        conn.commit()
+        return nuevo
+    except Exception as e:
+        logger.error(f"❌ Error registrando logro: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_user_achievements(user_id: int):
+    """Obtener los ids de los logros desbloqueados por un usuario"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute("SELECT achievement_id FROM user_achievements WHERE user_id = %s", (user_id,))
+        else:
+            cursor.execute("SELECT achievement_id FROM user_achievements WHERE user_id = ?", (user_id,))
+        return {row[0] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo logros: {e}")
+        return set()
+    finally:
+        cursor.close()
+        conn.close()
+
 # === FUNCIONES ESPECÍFICAS PARA JUEGOS ===
 
 def save_active_game(chat_id: int, juego: str, respuesta: str, pistas: str, intentos: int, started_by: int):
@@ -636,23 +1190,23 @@ def save_active_game(chat_id: int, juego: str, respuesta: str, pistas: str, inte
         if is_postgresql():
             cursor.execute(
                 """INSERT INTO active_games (chat_id, juego, respuesta, pistas, intentos, started_by, last_activity)
-                   VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)
                    ON CONFLICT (chat_id) DO UPDATE SET
                    juego = EXCLUDED.juego,
                    respuesta = EXCLUDED.respuesta,
                    pistas = EXCLUDED.pistas,
                    intentos = EXCLUDED.intentos,
                    started_by = EXCLUDED.started_by,
-                   last_activity = NOW()
+                   last_activity = EXCLUDED.last_activity
                 """,
-                (chat_id, juego, respuesta, pistas, intentos, started_by)
+                (chat_id, juego, respuesta, pistas, intentos, started_by, epoch_ms())
             )
         else:
             cursor.execute(
                 """INSERT OR REPLACE INTO active_games (chat_id, juego, respuesta, pistas, intentos, started_by, last_activity)
                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                (chat_id, juego, respuesta, pistas, intentos, started_by, datetime.now().isoformat())
+                (chat_id, juego, respuesta, pistas, intentos, started_by, epoch_ms())
             )
         conn.commit()
     except Exception as e:
@@ -718,8 +1272,8 @@ def delete_active_game(chat_id: int):
         cursor.close()
         conn.close()
 
-def save_active_trivia(chat_id: int, pregunta: str, respuesta: str, start_time: float, opciones: str, message_id: int, inline_keyboard_message_id: int):
-    """Guardar trivia activa"""
+def save_active_trivia(chat_id: int, pregunta: str, respuesta: str, start_time: int, opciones: str, message_id: int, inline_keyboard_message_id: int):
+    """Guardar trivia activa (start_time en milisegundos, ver epoch_ms)"""
     conn = get_connection()
     cursor = conn.cursor()
     try:
@@ -884,42 +1438,180 @@ def get_all_active_trivias():
 
 # === FUNCIONES DE UTILIDAD ===
 
-def cleanup_expired_games(timeout_minutes: int = 5):
-    """Limpiar juegos expirados"""
+def save_rate_limit_state(scope: str, entries: dict, replace: bool = True):
+    """Guardar el estado de rate limiting de un ámbito (clave -> JSON serializado)"""
     conn = get_connection()
     cursor = conn.cursor()
     try:
         if is_postgresql():
-            cursor.execute(
-                """DELETE FROM active_games 
-                   WHERE last_activity < NOW() - INTERVAL '%s minutes'
+            if replace:
+                cursor.execute("DELETE FROM rate_limit_state WHERE scope = %s", (scope,))
+            cursor.executemany(
+                """INSERT INTO rate_limit_state (scope, key, data, updated_at)
+                   VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (scope, key) DO UPDATE SET
+                   data = EXCLUDED.data,
+                   updated_at = EXCLUDED.updated_at
                 """,
-                (timeout_minutes,)
+                [(scope, str(key), data, epoch_ms()) for key, data in entries.items()]
             )
-            cursor.execute(
-                """DELETE FROM active_trivias 
-                   WHERE start_time < EXTRACT(EPOCH FROM NOW()) - %s
+        else:
+            if replace:
+                cursor.execute("DELETE FROM rate_limit_state WHERE scope = ?", (scope,))
+            cursor.executemany(
+                """INSERT OR REPLACE INTO rate_limit_state (scope, key, data, updated_at)
+                   VALUES (?, ?, ?, ?)
                 """,
-                (timeout_minutes * 60,)  # convertir a segundos
+                [(scope, str(key), data, epoch_ms()) for key, data in entries.items()]
             )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error guardando estado de rate limiting ({scope}): {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def delete_rate_limit_state(scope: str, keys) -> None:
+    """Borrar claves concretas del estado guardado de un ámbito"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.executemany("DELETE FROM rate_limit_state WHERE scope = %s AND key = %s",
+                               [(scope, str(key)) for key in keys])
         else:
-            # Para SQLite, necesitamos una lógica diferente ya que maneja fechas como strings
-            from datetime import datetime, timedelta
-            cutoff_time = (datetime.now() - timedelta(minutes=timeout_minutes)).isoformat()
-            cutoff_timestamp = (datetime.now() - timedelta(minutes=timeout_minutes)).timestamp()
-            
+            cursor.executemany("DELETE FROM rate_limit_state WHERE scope = ? AND key = ?",
+                               [(scope, str(key)) for key in keys])
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error borrando estado de rate limiting ({scope}): {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def load_rate_limit_state(scope: str) -> dict:
+    """Obtener el estado de rate limiting guardado para un ámbito"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute("SELECT key, data FROM rate_limit_state WHERE scope = %s", (scope,))
+        else:
+            cursor.execute("SELECT key, data FROM rate_limit_state WHERE scope = ?", (scope,))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"❌ Error cargando estado de rate limiting ({scope}): {e}")
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_bot_state(key: str, default=None):
+    """Obtener un valor del estado persistente del bot"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
+            cursor.execute("SELECT value FROM bot_state WHERE key = %s", (key,))
+        else:
+            cursor.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
+        result = cursor.fetchone()
+        return result[0] if result else default
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo estado del bot ({key}): {e}")
+        return default
+    finally:
+        cursor.close()
+        conn.close()
+
+def set_bot_state(key: str, value: str):
+    """Guardar un valor en el estado persistente del bot"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if is_postgresql():
             cursor.execute(
-                """DELETE FROM active_games 
-                   WHERE last_activity < ?
+                """INSERT INTO bot_state (key, value, updated_at) VALUES (%s, %s, %s)
+                   ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at
                 """,
-                (cutoff_time,)
+                (key, value, epoch_ms())
             )
+        else:
             cursor.execute(
-                """DELETE FROM active_trivias 
-                   WHERE start_time < ?
-                """,
-                (cutoff_timestamp,)
+                "INSERT OR REPLACE INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, value, epoch_ms())
             )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error guardando estado del bot ({key}): {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def try_acquire_lease(name: str, holder: str, now: float, ttl: float) -> bool:
+    """Adquirir o renovar un lease (solo SQLite). True si `holder` lo tiene tras la llamada.
+
+    `now` y `ttl` en segundos; expires_at se guarda en milisegundos. False
+    sólo si otro titular tiene el lease en vigor: si la base de datos falla,
+    la excepción se propaga (no dice nada de quién lo tiene).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT OR IGNORE INTO leader_lease (name, holder, expires_at) VALUES (?, NULL, 0)", (name,))
+        cursor.execute(
+            """UPDATE leader_lease SET holder = ?, expires_at = ?
+               WHERE name = ? AND (holder = ? OR holder IS NULL OR expires_at < ?)
+            """,
+            (holder, int((now + ttl) * 1000), name, holder, int(now * 1000))
+        )
+        acquired = cursor.rowcount == 1
+        conn.commit()
+        return acquired
+    except Exception as e:
+        logger.error(f"❌ Error adquiriendo lease {name}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def release_lease(name: str, holder: str):
+    """Liberar un lease si lo tiene `holder` (solo SQLite)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE leader_lease SET holder = NULL, expires_at = 0 WHERE name = ? AND holder = ?",
+            (name, holder)
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ Error liberando lease {name}: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+def cleanup_expired_games(timeout_minutes: int = 5):
+    """Limpiar juegos expirados"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Tiempos en milisegundos: un rango sobre los índices de last_activity y start_time
+        cutoff = epoch_ms() - timeout_minutes * 60_000
+        if is_postgresql():
+            cursor.execute("DELETE FROM active_games WHERE last_activity < %s", (cutoff,))
+            cursor.execute("DELETE FROM active_trivias WHERE start_time < %s", (cutoff,))
+        else:
+            cursor.execute("DELETE FROM active_games WHERE last_activity < ?", (cutoff,))
+            cursor.execute("DELETE FROM active_trivias WHERE start_time < ?", (cutoff,))
         
         deleted_games = cursor.rowcount
         conn.commit()
@@ -936,9 +1628,16 @@ def cleanup_expired_games(timeout_minutes: int = 5):
         cursor.close()
         conn.close()
 
+# Clave de get_user_stats para cada categoría de razón (ver dimensiones.py)
+_STATS_POR_CATEGORIA = {
+    CATEGORIA_HASHTAG: 'hashtag_points',
+    CATEGORIA_JUEGO: 'game_points',
+    CATEGORIA_RETO: 'challenge_points',
+}
+
 def get_user_stats(user_id: int, chat_id: int):
     """Obtener estadísticas completas de un usuario"""
-    conn = get_connection()
+    conn = get_read_connection(max_staleness=30, user_id=user_id)
     cursor = conn.cursor()
     try:
         stats = {
@@ -947,7 +1646,10 @@ def get_user_stats(user_id: int, chat_id: int):
             'hashtag_points': 0,
             'game_points': 0,
             'challenge_points': 0,
-            'rank_position': 0
+            'rank_position': 0,
+            'active_days': 0,
+            'current_streak': 0,
+            'longest_streak': 0
         }
         
         if is_postgresql():
@@ -961,33 +1663,35 @@ def get_user_stats(user_id: int, chat_id: int):
             result = cursor.fetchone()
             stats['total_points'] = result[0] if result else 0
             
-            # Número total de entradas
+            # Número total de entradas (eventos recientes + resumen de los compactados)
             cursor.execute(
-                """SELECT COUNT(*) FROM user_points 
-                   WHERE user_id = %s AND chat_id = %s
+                """SELECT (SELECT COUNT(*) FROM user_points WHERE user_id = %s AND chat_id = %s)
+                        + (SELECT COALESCE(SUM(entries), 0) FROM user_points_summary WHERE user_id = %s AND chat_id = %s)
                 """,
-                (user_id, chat_id)
+                (user_id, chat_id, user_id, chat_id)
             )
             result = cursor.fetchone()
             stats['total_entries'] = result[0] if result else 0
             
             # Puntos por categorías
             cursor.execute(
-                """SELECT reason, SUM(points_gained) FROM user_points 
-                   WHERE user_id = %s AND chat_id = %s
-                   GROUP BY reason
+                """SELECT rc.category, SUM(e.points) FROM (
+                       SELECT reason_id, points_gained AS points FROM user_points
+                       WHERE user_id = %s AND chat_id = %s
+                       UNION ALL
+                       SELECT reason_id, points FROM user_points_summary
+                       WHERE user_id = %s AND chat_id = %s
+                   ) e
+                   JOIN reason_codes rc ON rc.id = e.reason_id
+                   GROUP BY rc.category
                 """,
-                (user_id, chat_id)
+                (user_id, chat_id, user_id, chat_id)
             )
             results = cursor.fetchall()
             
-            for reason, points in results:
-                if 'hashtag' in reason.lower():
-                    stats['hashtag_points'] += points
-                elif 'juego' in reason.lower() or 'trivia' in reason.lower():
-                    stats['game_points'] += points
-                elif 'reto' in reason.lower() or 'challenge' in reason.lower():
-                    stats['challenge_points'] += points
+            for category, points in results:
+                if category in _STATS_POR_CATEGORIA:
+                    stats[_STATS_POR_CATEGORIA[category]] += points
             
             # Posición en ranking
             cursor.execute(
@@ -1014,30 +1718,32 @@ def get_user_stats(user_id: int, chat_id: int):
             stats['total_points'] = result[0] if result else 0
             
             cursor.execute(
-                """SELECT COUNT(*) FROM user_points 
-                   WHERE user_id = ? AND chat_id = ?
+                """SELECT (SELECT COUNT(*) FROM user_points WHERE user_id = ? AND chat_id = ?)
+                        + (SELECT COALESCE(SUM(entries), 0) FROM user_points_summary WHERE user_id = ? AND chat_id = ?)
                 """,
-                (user_id, chat_id)
+                (user_id, chat_id, user_id, chat_id)
             )
             result = cursor.fetchone()
             stats['total_entries'] = result[0] if result else 0
             
             cursor.execute(
-                """SELECT reason, SUM(points_gained) FROM user_points 
-                   WHERE user_id = ? AND chat_id = ?
-                   GROUP BY reason
+                """SELECT rc.category, SUM(e.points) FROM (
+                       SELECT reason_id, points_gained AS points FROM user_points
+                       WHERE user_id = ? AND chat_id = ?
+                       UNION ALL
+                       SELECT reason_id, points FROM user_points_summary
+                       WHERE user_id = ? AND chat_id = ?
+                   ) e
+                   JOIN reason_codes rc ON rc.id = e.reason_id
+                   GROUP BY rc.category
                 """,
-                (user_id, chat_id)
+                (user_id, chat_id, user_id, chat_id)
             )
             results = cursor.fetchall()
             
-            for reason, points in results:
-                if 'hashtag' in reason.lower():
-                    stats['hashtag_points'] += points
-                elif 'juego' in reason.lower() or 'trivia' in reason.lower():
-                    stats['game_points'] += points
-                elif 'reto' in reason.lower() or 'challenge' in reason.lower():
-                    stats['challenge_points'] += points
+            for category, points in results:
+                if category in _STATS_POR_CATEGORIA:
+                    stats[_STATS_POR_CATEGORIA[category]] += points
             
             cursor.execute(
                 """SELECT COUNT(*) + 1 FROM user_ranking 
@@ -1051,6 +1757,13 @@ def get_user_stats(user_id: int, chat_id: int):
             result = cursor.fetchone()
             stats['rank_position'] = result[0] if result else 0
         
+        # Días activos y rachas desde el mapa de bits (una fila, sin recorrer user_points)
+        actividad = _read_activity(cursor, user_id, chat_id)
+        if actividad is not None:
+            stats['active_days'] = actividad.total
+            stats['current_streak'] = actividad.racha_actual()
+            stats['longest_streak'] = actividad.racha_maxima()
+        
         return stats
     except Exception as e:
         logger.error(f"❌ Error obteniendo estadísticas de usuario: {e}")
@@ -1060,7 +1773,10 @@ def get_user_stats(user_id: int, chat_id: int):
             'hashtag_points': 0,
             'game_points': 0,
             'challenge_points': 0,
-            'rank_position': 0
+            'rank_position': 0,
+            'active_days': 0,
+            'current_streak': 0,
+            'longest_streak': 0
         }
     finally:
         cursor.close()
@@ -1068,7 +1784,7 @@ def get_user_stats(user_id: int, chat_id: int):
 
 def get_chat_stats(chat_id: int):
     """Obtener estadísticas del chat"""
-    conn = get_connection()
+    conn = get_read_connection(max_staleness=60)
     cursor = conn.cursor()
     try:
         stats = {
@@ -1093,10 +1809,10 @@ def get_chat_stats(chat_id: int):
             
             # Total de puntos distribuidos
             cursor.execute(
-                """SELECT SUM(points_gained) FROM user_points 
-                   WHERE chat_id = %s
+                """SELECT (SELECT COALESCE(SUM(points_gained), 0) FROM user_points WHERE chat_id = %s)
+                        + (SELECT COALESCE(SUM(points), 0) FROM user_points_summary WHERE chat_id = %s)
                 """,
-                (chat_id,)
+                (chat_id, chat_id)
             )
             result = cursor.fetchone()
             stats['total_points_distributed'] = result[0] if result else 0
@@ -1113,9 +1829,10 @@ def get_chat_stats(chat_id: int):
             
             # Usuario con más puntos
             cursor.execute(
-                """SELECT username, total_points FROM user_ranking 
-                   WHERE chat_id = %s
-                   ORDER BY total_points DESC
+                """SELECT u.username, r.total_points FROM user_ranking r
+                   LEFT JOIN users u ON u.user_id = r.user_id
+                   WHERE r.chat_id = %s
+                   ORDER BY r.total_points DESC
                    LIMIT 1
                 """,
                 (chat_id,)
@@ -1137,10 +1854,10 @@ def get_chat_stats(chat_id: int):
             stats['total_users'] = result[0] if result else 0
             
             cursor.execute(
-                """SELECT SUM(points_gained) FROM user_points 
-                   WHERE chat_id = ?
+                """SELECT (SELECT COALESCE(SUM(points_gained), 0) FROM user_points WHERE chat_id = ?)
+                        + (SELECT COALESCE(SUM(points), 0) FROM user_points_summary WHERE chat_id = ?)
                 """,
-                (chat_id,)
+                (chat_id, chat_id)
             )
             result = cursor.fetchone()
             stats['total_points_distributed'] = result[0] if result else 0
@@ -1154,9 +1871,10 @@ def get_chat_stats(chat_id: int):
             stats['active_trivias'] = result[0] if result else 0
             
             cursor.execute(
-                """SELECT username, total_points FROM user_ranking 
-                   WHERE chat_id = ?
-                   ORDER BY total_points DESC
+                """SELECT u.username, r.total_points FROM user_ranking r
+                   LEFT JOIN users u ON u.user_id = r.user_id
+                   WHERE r.chat_id = ?
+                   ORDER BY r.total_points DESC
                    LIMIT 1
                 """,
                 (chat_id,)
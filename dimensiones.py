@@ -0,0 +1,95 @@
+# dimensiones.py
+"""
+Dimensiones de los puntos: usuarios, chats y códigos de razón.
+
+user_points y user_ranking ya no repiten el nombre de usuario, el del
+chat y el texto de la razón en cada fila: guardan user_id, chat_id y
+reason_id, y los textos viven una sola vez en users, chats y
+reason_codes (ver migraciones/m0005_dimensiones.py).
+
+CacheDimensiones recuerda lo que ya está escrito para que la ruta de
+escritura no pague consultas extra: el id de cada razón, y el último
+nombre guardado de cada usuario y chat (sólo se vuelve a escribir si
+cambia). Cada razón tiene además una categoría entera, que es por lo que
+agrupan las estadísticas.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+CATEGORIA_OTRA = 0
+CATEGORIA_HASHTAG = 1
+CATEGORIA_JUEGO = 2
+CATEGORIA_RETO = 3
+
+def categoria_razon(reason: str) -> int:
+    """Categoría de una razón de puntos ("#aporte", "Cinematrivia ganada", "(reto_diario)"...)"""
+    texto = (reason or "").lower()
+    if "reto" in texto or "challenge" in texto:
+        return CATEGORIA_RETO
+    if texto.startswith("#") or "hashtag" in texto:
+        return CATEGORIA_HASHTAG
+    if "juego" in texto or "trivia" in texto:
+        return CATEGORIA_JUEGO
+    return CATEGORIA_OTRA
+
+class CacheDimensiones:
+    """Ids de razón y últimos nombres escritos de usuarios y chats (LRU acotado)"""
+
+    def __init__(self, max_entradas: int = 50_000):
+        self.max_entradas = max_entradas
+        self._razones: "OrderedDict[str, int]" = OrderedDict()
+        self._usuarios: "OrderedDict[int, str]" = OrderedDict()
+        self._chats: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.estadisticas = {"aciertos": 0, "fallos": 0}
+
+    def _guardar(self, tabla: OrderedDict, clave, valor) -> None:
+        with self._lock:
+            tabla[clave] = valor
+            tabla.move_to_end(clave)
+            while len(tabla) > self.max_entradas:
+                tabla.popitem(last=False)
+
+    def _buscar(self, tabla: OrderedDict, clave):
+        with self._lock:
+            valor = tabla.get(clave)
+            if valor is None:
+                self.estadisticas["fallos"] += 1
+            else:
+                tabla.move_to_end(clave)
+                self.estadisticas["aciertos"] += 1
+            return valor
+
+    def razon(self, reason: str) -> Optional[int]:
+        return self._buscar(self._razones, reason)
+
+    def guardar_razon(self, reason: str, reason_id: int) -> None:
+        self._guardar(self._razones, reason, reason_id)
+
+    def usuario_cambiado(self, user_id: int, username: str) -> bool:
+        """True si hay que escribir este nombre (no consta o era otro)"""
+        return self._buscar(self._usuarios, user_id) != username
+
+    def chat_cambiado(self, chat_id: int, chat_name: str) -> bool:
+        return self._buscar(self._chats, chat_id) != chat_name
+
+    def recordar(self, user_id: int, username: str, chat_id: int, chat_name: str) -> None:
+        """Los nombres ya están escritos (llamar tras escribirlos)"""
+        self._guardar(self._usuarios, user_id, username)
+        self._guardar(self._chats, chat_id, chat_name)
+
+    def olvidar(self, user_id: int, chat_id: int) -> None:
+        """La transacción que los escribía falló: se volverán a escribir"""
+        with self._lock:
+            self._usuarios.pop(user_id, None)
+            self._chats.pop(chat_id, None)
+
+    def metricas(self) -> dict:
+        return {
+            "razones": len(self._razones),
+            "usuarios": len(self._usuarios),
+            "chats": len(self._chats),
+            **self.estadisticas,
+        }
@@ -0,0 +1,214 @@
+# duplicados.py
+"""
+Detección de casi-duplicados para frenar el copia-pega de aportes.
+
+Cada mensaje puntuado se resume en una huella SimHash de 64 bits sobre
+sus palabras (sin hashtags, menciones ni URLs): dos textos con pequeñas
+ediciones dan huellas a pocos bits de distancia. Con bigramas una sola
+palabra cambiada movía demasiado la huella de un mensaje de chat corto. Las
+huellas recientes se guardan por usuario y por chat en un índice LSH:
+la huella se parte en DISTANCIA_MAXIMA + 1 bandas y, por el principio
+del palomar, dos huellas a distancia <= DISTANCIA_MAXIMA coinciden
+exactamente en al menos una banda. Buscar es mirar esas pocas cubetas y
+comparar las candidatas con un XOR y un bit_count.
+
+No se guarda ningún texto, sólo enteros; el índice tiene capacidad
+fija (se expulsan las huellas más antiguas) y una ventana de tiempo.
+"""
+
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+BITS = 64
+_MASCARA = (1 << BITS) - 1
+# Con menos palabras distintas la huella no es fiable (mensajes de dos palabras se parecen todos)
+MIN_TOKENS = 8
+
+def _hash64(texto: str) -> int:
+    """Hash estable entre procesos (hash() de Python cambia en cada arranque)"""
+    datos = texto.encode("utf-8")
+    return zlib.crc32(datos) | (zlib.crc32(datos, 0x9E3779B9) << 32)
+
+def huella_simhash(tokens: Sequence[str]) -> Optional[int]:
+    """SimHash de 64 bits de las palabras de `tokens` (None si el texto es demasiado corto)"""
+    hashes = {_hash64(token) for token in set(tokens)}
+    if len(hashes) < MIN_TOKENS:
+        return None
+
+    # Contadores por bit en vertical: planos[i] guarda el bit i del contador de cada
+    # una de las 64 columnas, así sumar un hash son unas pocas operaciones con enteros
+    planos: List[int] = []
+    for h in hashes:
+        acarreo = h
+        for i, plano in enumerate(planos):
+            planos[i] = plano ^ acarreo
+            acarreo &= plano
+            if not acarreo:
+                break
+        if acarreo:
+            planos.append(acarreo)
+
+    # Bit de la huella = 1 si más de la mitad de los hashes lo tienen (contador >= umbral)
+    umbral = len(hashes) // 2 + 1
+    mayor, igual = 0, _MASCARA
+    for i in reversed(range(max(len(planos), umbral.bit_length()))):
+        plano = planos[i] if i < len(planos) else 0
+        if (umbral >> i) & 1:
+            igual &= plano
+        else:
+            mayor |= igual & plano
+            igual &= ~plano & _MASCARA
+    return mayor | igual
+
+class Coincidencia(NamedTuple):
+    ambito: Tuple[str, Hashable]  # ("usuario", user_id) o ("chat", chat_id)
+    distancia: int
+    antiguedad: float
+    chat_id: int
+    user_id: int
+
+class IndiceDuplicados:
+    """Huellas recientes agrupadas por ámbito, con cubetas LSH por banda"""
+
+    def __init__(self, distancia_maxima: int = 8, capacidad: int = 50_000, ventana: float = 24 * 3600):
+        self.distancia_maxima = distancia_maxima
+        self.capacidad = capacidad
+        self.ventana = ventana
+        # Bandas (desplazamiento, máscara) que cubren los 64 bits
+        numero = distancia_maxima + 1
+        self._bandas: List[Tuple[int, int]] = []
+        inicio = 0
+        for i in range(numero):
+            ancho = BITS // numero + (1 if i < BITS % numero else 0)
+            self._bandas.append((inicio, (1 << ancho) - 1))
+            inicio += ancho
+        # id -> (ámbito, huella, instante, chat_id, user_id), en orden de inserción
+        self._entradas: "OrderedDict[int, Tuple[Tuple[str, Hashable], int, float, int, int]]" = OrderedDict()
+        self._cubetas: Dict[Tuple[Tuple[str, Hashable], int, int], Set[int]] = {}
+        self._siguiente = 0
+        self.estadisticas = {"consultas": 0, "coincidencias": 0, "candidatas": 0, "registradas": 0, "expulsadas": 0}
+
+    def _claves(self, ambito, huella: int):
+        for numero, (desplazamiento, mascara) in enumerate(self._bandas):
+            yield ambito, numero, (huella >> desplazamiento) & mascara
+
+    def _expulsar_antiguas(self, ahora: float) -> None:
+        limite = ahora - self.ventana
+        while self._entradas:
+            identificador, (ambito, huella, instante, _, _) = next(iter(self._entradas.items()))
+            if instante >= limite and len(self._entradas) <= self.capacidad:
+                break
+            self._entradas.popitem(last=False)
+            for clave in self._claves(ambito, huella):
+                cubeta = self._cubetas.get(clave)
+                if cubeta is not None:
+                    cubeta.discard(identificador)
+                    if not cubeta:
+                        del self._cubetas[clave]
+            self.estadisticas["expulsadas"] += 1
+
+    def buscar(self, huella: int, ambitos: Iterable[Tuple[str, Hashable]],
+               ahora: Optional[float] = None) -> Optional[Coincidencia]:
+        """La huella más cercana (dentro de distancia_maxima) en el primer ámbito que tenga alguna"""
+        ahora = time.time() if ahora is None else ahora
+        self._expulsar_antiguas(ahora)
+        self.estadisticas["consultas"] += 1
+        for ambito in ambitos:
+            vistas: Set[int] = set()
+            mejor: Optional[Coincidencia] = None
+            for clave in self._claves(ambito, huella):
+                for identificador in self._cubetas.get(clave, ()):
+                    if identificador in vistas:
+                        continue
+                    vistas.add(identificador)
+                    _, otra, instante, chat_id, user_id = self._entradas[identificador]
+                    distancia = (huella ^ otra).bit_count()
+                    if distancia <= self.distancia_maxima and (mejor is None or distancia < mejor.distancia):
+                        mejor = Coincidencia(ambito, distancia, ahora - instante, chat_id, user_id)
+            self.estadisticas["candidatas"] += len(vistas)
+            if mejor is not None:
+                self.estadisticas["coincidencias"] += 1
+                return mejor
+        return None
+
+    def registrar(self, huella: int, ambitos: Iterable[Tuple[str, Hashable]], chat_id: int, user_id: int,
+                  ahora: Optional[float] = None) -> None:
+        ahora = time.time() if ahora is None else ahora
+        for ambito in ambitos:
+            identificador = self._siguiente
+            self._siguiente += 1
+            self._entradas[identificador] = (ambito, huella, ahora, chat_id, user_id)
+            for clave in self._claves(ambito, huella):
+                self._cubetas.setdefault(clave, set()).add(identificador)
+            self.estadisticas["registradas"] += 1
+        self._expulsar_antiguas(ahora)
+
+    def metricas(self) -> dict:
+        return {
+            "huellas": len(self._entradas),
+            "cubetas": len(self._cubetas),
+            "capacidad": self.capacidad,
+            "distancia_maxima": self.distancia_maxima,
+            **self.estadisticas,
+        }
+
+class Veredicto(NamedTuple):
+    factor: float                 # 1.0 = puntos completos, 0.0 = rechazado
+    aviso: Optional[str]
+    coincidencia: Optional[Coincidencia]
+
+SIN_DUPLICADO = Veredicto(1.0, None, None)
+
+class DetectorDuplicados:
+    """Política sobre el índice: copiarse a sí mismo se rechaza, copiar a otro del chat se descuenta"""
+
+    def __init__(self, indice: IndiceDuplicados, factor_copia_ajena: float = 0.5):
+        self.indice = indice
+        self.factor_copia_ajena = factor_copia_ajena
+
+    @staticmethod
+    def _ambitos(user_id: int, chat_id: int):
+        return (("usuario", user_id), ("chat", chat_id))
+
+    def evaluar(self, user_id: int, chat_id: int, features) -> Veredicto:
+        huella = huella_simhash(features.tokens)
+        if huella is None:
+            return SIN_DUPLICADO
+        coincidencia = self.indice.buscar(huella, self._ambitos(user_id, chat_id))
+        if coincidencia is None:
+            return SIN_DUPLICADO
+        if coincidencia.user_id == user_id:
+            return Veredicto(0.0, "Mensaje casi idéntico a otro tuyo reciente: no suma puntos.", coincidencia)
+        return Veredicto(
+            self.factor_copia_ajena,
+            f"Mensaje muy parecido a otro reciente del grupo: puntos x{self.factor_copia_ajena:g}.",
+            coincidencia,
+        )
+
+    def registrar(self, user_id: int, chat_id: int, features) -> None:
+        """Añade un mensaje ya puntuado al índice"""
+        huella = huella_simhash(features.tokens)
+        if huella is not None:
+            self.indice.registrar(huella, self._ambitos(user_id, chat_id), chat_id, user_id)
+
+def crear_detector_desde_config() -> DetectorDuplicados:
+    """Crea el detector con NEAR_DUPLICATE_DISTANCE, NEAR_DUPLICATE_WINDOW y NEAR_DUPLICATE_CAPACITY"""
+    from config import Config
+
+    indice = IndiceDuplicados(
+        distancia_maxima=Config.NEAR_DUPLICATE_DISTANCE,
+        capacidad=Config.NEAR_DUPLICATE_CAPACITY,
+        ventana=Config.NEAR_DUPLICATE_WINDOW,
+    )
+    registrar_fuente("duplicados", indice.metricas)
+    return DetectorDuplicados(indice)
+
+# Instancia global compartida por los manejadores que puntúan
+detector_duplicados = crear_detector_desde_config()
@@ -1,6 +1,9 @@
 # generador_trivia.py
 import os
 import random
+import threading
+from collections import deque
+
 import requests
 
 # CORREGIDO: Obtener la clave API de una variable de entorno llamada 'TMDB_API_KEY'
@@ -112,3 +115,30 @@ def generar_pregunta():
     # Como fallback, si todas las funciones específicas fallan o no encuentran datos, pregunta el año
     # Asegúrate de que esta última opción siempre tenga datos válidos.
     return pregunta_anio(pelicula)
+
+# Reserva de preguntas ya generadas: /cinematrivia no espera a TMDB si hay alguna
+_reserva = deque()
+_lock_reserva = threading.Lock()
+
+def precargar(cantidad):
+    """Genera preguntas hasta tener `cantidad` en reserva; devuelve cuántas añadió"""
+    if not TMDB_API_KEY or not _lock_reserva.acquire(blocking=False):
+        return 0
+    try:
+        añadidas = 0
+        for _ in range(max(cantidad - len(_reserva), 0)):
+            pregunta, respuesta = generar_pregunta()
+            if respuesta == "Error":
+                break
+            _reserva.append((pregunta, respuesta))
+            añadidas += 1
+        return añadidas
+    finally:
+        _lock_reserva.release()
+
+def sacar_pregunta():
+    """Pregunta de la reserva, o una recién generada si está vacía"""
+    try:
+        return _reserva.popleft()
+    except IndexError:
+        return generar_pregunta()
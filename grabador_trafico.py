@@ -0,0 +1,147 @@
+# grabador_trafico.py
+"""
+Grabación del tráfico real de updates para perfilado.
+
+Cada update entrante se añade como una línea JSON a un archivo JSONL
+comprimido con gzip. Opcionalmente se anonimizan los IDs de usuario/chat,
+los nombres y el texto (conservando longitud, mayúsculas y hashtags para
+que la forma del tráfico siga siendo representativa).
+El archivo se reproduce con reproducir_trafico.py.
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Objetos que identifican a una persona o chat dentro de un update
+CLAVES_IDENTIDAD = {"from", "chat", "user", "sender_chat", "left_chat_member", "via_bot"}
+# Campos con nombres propios que se reemplazan por un seudónimo
+CAMPOS_NOMBRE = {"first_name", "last_name", "username", "title"}
+# Campos de texto libre que se enmascaran
+CAMPOS_TEXTO = {"text", "caption"}
+
+def _seudonimo_id(valor: int, sal: bytes) -> int:
+    """Convierte un ID en otro estable por grabación, conservando el signo"""
+    digest = hmac.new(sal, str(abs(valor)).encode(), hashlib.sha256).digest()
+    anonimo = int.from_bytes(digest[:6], "big") or 1
+    return -anonimo if valor < 0 else anonimo
+
+def _seudonimo_nombre(valor: str, sal: bytes) -> str:
+    """Convierte un nombre en un seudónimo estable por grabación"""
+    digest = hmac.new(sal, valor.encode(), hashlib.sha256).hexdigest()
+    return f"anon_{digest[:8]}"
+
+def enmascarar_texto(texto: str) -> str:
+    """Reemplaza letras y dígitos conservando longitud, mayúsculas, hashtags y comandos"""
+    partes = []
+    for palabra in texto.split(" "):
+        if palabra.startswith("#") or palabra.startswith("/"):
+            partes.append(palabra)
+            continue
+        partes.append("".join(
+            ("X" if c.isupper() else "x") if c.isalpha() else ("0" if c.isdigit() else c)
+            for c in palabra
+        ))
+    return " ".join(partes)
+
+def anonimizar_update(datos: Any, sal: bytes, en_identidad: bool = False) -> Any:
+    """Anonimiza recursivamente el diccionario de un update"""
+    if isinstance(datos, list):
+        return [anonimizar_update(d, sal, en_identidad) for d in datos]
+    if not isinstance(datos, dict):
+        return datos
+
+    resultado = {}
+    for clave, valor in datos.items():
+        if en_identidad and clave == "id" and isinstance(valor, int):
+            resultado[clave] = _seudonimo_id(valor, sal)
+        elif en_identidad and clave in CAMPOS_NOMBRE and isinstance(valor, str):
+            resultado[clave] = _seudonimo_nombre(valor, sal)
+        elif clave in CAMPOS_TEXTO and isinstance(valor, str):
+            resultado[clave] = enmascarar_texto(valor)
+        elif clave in CLAVES_IDENTIDAD or clave == "new_chat_members":
+            resultado[clave] = anonimizar_update(valor, sal, en_identidad=True)
+        else:
+            resultado[clave] = anonimizar_update(valor, sal, en_identidad=False)
+    return resultado
+
+class GrabadorUpdates:
+    """Añade cada update recibido a un archivo JSONL comprimido"""
+
+    def __init__(self, ruta: str, anonimizar: bool = True, flush_cada: int = 50):
+        self.ruta = ruta
+        self.anonimizar = anonimizar
+        self.flush_cada = flush_cada
+        # La sal es aleatoria por proceso: los IDs son estables dentro de una grabación
+        self._sal = os.urandom(16)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.total = 0
+        # Modo 'at': cada arranque añade un nuevo miembro gzip al mismo archivo
+        self._archivo = gzip.open(ruta, "at", encoding="utf-8")
+        logger.info(f"🎙️ Grabando updates en {ruta} (anonimizado: {anonimizar})")
+
+    def registrar(self, update: Update) -> None:
+        """Serializa y añade un update al archivo"""
+        datos = update.to_dict()
+        if self.anonimizar:
+            datos = anonimizar_update(datos, self._sal)
+        linea = json.dumps({"ts": time.time(), "update": datos}, ensure_ascii=False)
+
+        with self._lock:
+            if self._archivo is None:
+                return
+            self._archivo.write(linea + "\n")
+            self.total += 1
+            self._pendientes += 1
+            if self._pendientes >= self.flush_cada:
+                self._archivo.flush()
+                self._pendientes = 0
+
+    async def callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Callback para un TypeHandler en un grupo previo al resto de manejadores"""
+        try:
+            self.registrar(update)
+        except Exception as e:
+            logger.error(f"❌ Error grabando update: {e}")
+
+    def cerrar(self) -> None:
+        """Vacía el buffer y cierra el archivo"""
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+                logger.info(f"🎙️ Grabación cerrada: {self.total} updates en {self.ruta}")
+
+def leer_grabacion(ruta: str):
+    """Itera los registros (ts, datos_update) de un archivo grabado"""
+    with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+        for linea in archivo:
+            linea = linea.strip()
+            if not linea:
+                continue
+            registro = json.loads(linea)
+            yield registro["ts"], registro["update"]
+
+def crear_grabador_desde_config() -> Optional[GrabadorUpdates]:
+    """Crea el grabador si RECORD_UPDATES_PATH está configurado"""
+    from config import Config
+
+    if not Config.RECORD_UPDATES_PATH:
+        return None
+    try:
+        return GrabadorUpdates(Config.RECORD_UPDATES_PATH, anonimizar=Config.RECORD_ANONYMIZE)
+    except Exception as e:
+        logger.error(f"❌ No se pudo abrir el archivo de grabación: {e}")
+        return None
@@ -1,58 +1,68 @@
 # handlers/achievements.py
-import datetime
-from db import add_achievement, get_user_stats
+import logging
 
-# Lista de logros predefinidos
+from cola_salida import enviar_mensaje
+from logros import (
+    DIAS_ACTIVOS, RETOS_DIARIOS_SEMANA, RETOS_SEMANALES_SEMANA,
+    EventoPuntos, contador_hashtag, crear_motor_logros,
+)
+
+logger = logging.getLogger(__name__)
+
+APORTES = contador_hashtag("#aporte")
+CRITICAS = contador_hashtag("#crítica")
+
+# Lista de logros predefinidos. "contadores" son los que lee el trigger:
+# un evento de puntos sólo evalúa los logros de los contadores que incrementa.
 ACHIEVEMENTS = [
     {
         "id": 1,
         "name": "🥇 Primer aporte",
         "description": "Tu primer mensaje con #aporte",
-        "trigger": lambda stats: stats.get("hashtag_counts", {}).get("#aporte", 0) >= 1
+        "contadores": (APORTES,),
+        "trigger": lambda c: c[APORTES] >= 1
     },
     {
         "id": 2,
         "name": "✍️ Crítico en camino",
         "description": "Has publicado 3 críticas",
-        "trigger": lambda stats: stats.get("hashtag_counts", {}).get("#crítica", 0) >= 3
+        "contadores": (CRITICAS,),
+        "trigger": lambda c: c[CRITICAS] >= 3
     },
     {
         "id": 3,
         "name": "📚 Cinéfilo activo",
         "description": "Participaste 5 días diferentes",
-        "trigger": lambda stats: len(stats.get("active_days", set())) >= 5
+        "contadores": (DIAS_ACTIVOS,),
+        "trigger": lambda c: c[DIAS_ACTIVOS] >= 5
     },
     {
         "id": 4,
         "name": "🔥 Retador constante",
         "description": "Completaste 3 retos diarios en una semana",
-        "trigger": lambda stats: stats.get("daily_challenges_week", 0) >= 3
+        "contadores": (RETOS_DIARIOS_SEMANA,),
+        "trigger": lambda c: c[RETOS_DIARIOS_SEMANA] >= 3
     },
     {
         "id": 5,
         "name": "🏆 Desafío maestro",
         "description": "Completaste el reto semanal y 3 diarios en una semana",
-        "trigger": lambda stats: stats.get("weekly_challenge_done", False) and stats.get("daily_challenges_week", 0) >= 3
+        "contadores": (RETOS_SEMANALES_SEMANA, RETOS_DIARIOS_SEMANA),
+        "trigger": lambda c: c[RETOS_SEMANALES_SEMANA] >= 1 and c[RETOS_DIARIOS_SEMANA] >= 3
     }
 ]
 
-def check_achievements(user_id: int, username: str, context, chat_id: int):
-    """Verifica si un usuario ha desbloqueado nuevos logros"""
-    stats = get_user_stats(user_id)
-    nuevos_logros = []
-
-    for logro in ACHIEVEMENTS:
-        if logro["id"] not in stats.get("achievements", []):
-            if logro["trigger"](stats):
-                nuevos_logros.append(logro)
-                add_achievement(user_id, logro["id"])
+motor_logros = crear_motor_logros(ACHIEVEMENTS)
 
-    for logro in nuevos_logros:
-        context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🎉 *¡Nuevo logro desbloqueado!*\n\n"
-                f"{logro['name']}\n{logro['description']}"
-            ),
-            parse_mode="Markdown"
-        )
+async def check_achievements(context, evento: EventoPuntos):
+    """Procesa un evento de puntos y anuncia en el chat los logros desbloqueados"""
+    for logro in motor_logros.procesar(evento):
+        try:
+            await enviar_mensaje(
+                context.bot,
+                evento.chat_id,
+                f"🎉 *¡Nuevo logro desbloqueado!*\n\n{logro['name']}\n{logro['description']}",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"❌ Error anunciando logro {logro['id']} al usuario {evento.user_id}: {e}")
@@ -0,0 +1,130 @@
+# palabras_clave.py
+"""
+Búsqueda de muchas palabras clave a la vez con un autómata Aho-Corasick.
+
+El autómata se construye una sola vez por conjunto de palabras (ver
+obtener_buscador) y recorre el texto en una única pasada, sin importar
+cuántas palabras haya. Opcionalmente ignora tildes ("mexico" encuentra
+"méxico") y exige límites de palabra ("70" no coincide dentro de "1970").
+"""
+
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_MARCAS_DIACRITICAS = re.compile("[\u0300-\u036f]")
+
+def normalizar(texto: str, ignorar_acentos: bool = True) -> str:
+    """Minúsculas y, opcionalmente, sin tildes (ñ -> n, como normalize_text de hashtags)"""
+    if ignorar_acentos and not texto.isascii():
+        texto = _MARCAS_DIACRITICAS.sub("", unicodedata.normalize("NFD", texto))
+    return texto.casefold()
+
+def _es_palabra(caracter: str) -> bool:
+    return caracter.isalnum() or caracter == "_"
+
+class BuscadorPalabras:
+    """Autómata Aho-Corasick inmutable sobre un conjunto de palabras clave"""
+
+    def __init__(self, palabras: Iterable[str], limites_palabra: bool = True, ignorar_acentos: bool = True):
+        self.limites_palabra = limites_palabra
+        self.ignorar_acentos = ignorar_acentos
+        self.palabras: Tuple[str, ...] = tuple(
+            dict.fromkeys(p for p in palabras if p and normalizar(p, ignorar_acentos))
+        )
+
+        # Nodo 0 = raíz; por nodo: transiciones, enlace de fallo y salidas (índice, longitud)
+        self._transiciones: List[Dict[str, int]] = [{}]
+        self._fallo: List[int] = [0]
+        self._salidas: List[Tuple[Tuple[int, int], ...]] = [()]
+        # Por palabra: si hay que comprobar el límite a la izquierda / derecha
+        self._bordes: List[Tuple[bool, bool]] = []
+
+        salidas: List[list] = [[]]
+        for indice, palabra in enumerate(self.palabras):
+            clave = normalizar(palabra, ignorar_acentos)
+            self._bordes.append((_es_palabra(clave[0]), _es_palabra(clave[-1])))
+            nodo = 0
+            for caracter in clave:
+                siguiente = self._transiciones[nodo].get(caracter)
+                if siguiente is None:
+                    siguiente = len(self._transiciones)
+                    self._transiciones[nodo][caracter] = siguiente
+                    self._transiciones.append({})
+                    self._fallo.append(0)
+                    salidas.append([])
+                nodo = siguiente
+            salidas[nodo].append((indice, len(clave)))
+
+        # Enlaces de fallo en anchura; cada nodo hereda las salidas de su sufijo
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for caracter, hijo in self._transiciones[nodo].items():
+                fallo = self._fallo[nodo]
+                while fallo and caracter not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                destino = self._transiciones[fallo].get(caracter, 0)
+                self._fallo[hijo] = destino if destino != hijo else 0
+                salidas[hijo].extend(salidas[self._fallo[hijo]])
+                cola.append(hijo)
+        self._salidas = [tuple(s) for s in salidas]
+
+    def _recorrer(self, texto: str, hasta_primera: bool, normalizado: bool):
+        """Genera (posición_inicial, índice_palabra) en orden de aparición"""
+        if not self.palabras or not texto:
+            return
+        if not normalizado:
+            texto = normalizar(texto, self.ignorar_acentos)
+        transiciones, fallo, salidas = self._transiciones, self._fallo, self._salidas
+        bordes, limites = self._bordes, self.limites_palabra
+        longitud = len(texto)
+        nodo = 0
+        for fin, caracter in enumerate(texto, 1):
+            while nodo and caracter not in transiciones[nodo]:
+                nodo = fallo[nodo]
+            nodo = transiciones[nodo].get(caracter, 0)
+            if not salidas[nodo]:
+                continue
+            for indice, largo in salidas[nodo]:
+                inicio = fin - largo
+                if limites:
+                    izquierda, derecha = bordes[indice]
+                    if izquierda and inicio > 0 and _es_palabra(texto[inicio - 1]):
+                        continue
+                    if derecha and fin < longitud and _es_palabra(texto[fin]):
+                        continue
+                yield inicio, indice
+                if hasta_primera:
+                    return
+
+    def encontrar(self, texto: str, normalizado: bool = False) -> List[str]:
+        """Todas las palabras distintas que aparecen, en orden de aparición.
+
+        Con normalizado=True el texto ya viene pasado por normalizar() (p. ej.
+        MessageFeatures.normalizado) y no se vuelve a normalizar.
+        """
+        encontradas = {}
+        for inicio, indice in self._recorrer(texto, False, normalizado):
+            encontradas.setdefault(indice, inicio)
+        return [self.palabras[i] for i in sorted(encontradas, key=encontradas.get)]
+
+    def primera(self, texto: str, normalizado: bool = False) -> Optional[str]:
+        """La palabra que termina antes en el texto, o None"""
+        for _, indice in self._recorrer(texto, True, normalizado):
+            return self.palabras[indice]
+        return None
+
+    def contiene(self, texto: str, normalizado: bool = False) -> bool:
+        return self.primera(texto, normalizado) is not None
+
+@lru_cache(maxsize=256)
+def _buscador_cacheado(palabras: Tuple[str, ...], limites_palabra: bool, ignorar_acentos: bool) -> BuscadorPalabras:
+    return BuscadorPalabras(palabras, limites_palabra, ignorar_acentos)
+
+def obtener_buscador(palabras: Iterable[str], limites_palabra: bool = True,
+                     ignorar_acentos: bool = True) -> BuscadorPalabras:
+    """Buscador compartido: el autómata se construye una vez por conjunto de palabras"""
+    return _buscador_cacheado(tuple(palabras), limites_palabra, ignorar_acentos)
@@ -3,6 +3,8 @@ import random
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from handlers.palabras_clave import obtener_buscador
+
 # Historial simple para evitar repeticiones por usuario
 last_reaction_by_user = {}
 
@@ -56,6 +58,11 @@ def get_random_reaction(hashtag: str, user_id: int) -> str:
     last_reaction_by_user[user_id] = elegida
     return elegida
 
+# Supported hashtags (accent-insensitive: #resena also counts as #reseña)
+HASHTAGS_REACCION = obtener_buscador(
+    ["#aporte", "#recomendación", "#reseña", "#crítica", "#debate", "#pregunta", "#spoiler"]
+)
+
 # Middleware function for handling phrase reactions
 async def phrase_middleware(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -64,15 +71,10 @@ async def phrase_middleware(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return
     
-    message_text = update.message.text.lower()
     user_id = update.effective_user.id
     
-    # List of supported hashtags
-    hashtags = ["#aporte", "#recomendación", "#reseña", "#crítica", "#debate", "#pregunta", "#spoiler"]
-    
-    # Check if any hashtag is present in the message
-    for hashtag in hashtags:
-        if hashtag in message_text:
-            reaction = get_random_reaction(hashtag, user_id)
-            await update.message.reply_text(reaction)
-            break  # Only respond to the first hashtag found
+    # Only respond to the first hashtag found
+    hashtag = HASHTAGS_REACCION.primera(update.message.text)
+    if hashtag:
+        reaction = get_random_reaction(hashtag, user_id)
+        await update.message.reply_text(reaction)
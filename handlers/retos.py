@@ -2,6 +2,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime
 
+from handlers.palabras_clave import obtener_buscador
+
 # Retos predefinidos con validaciones string-based
 WEEKLY_CHALLENGES = [
     {
@@ -62,13 +64,13 @@ def clear_challenge_safe():
         print(f"[WARNING] clear_challenge no disponible: {e}")
         return False
 
-def validate_challenge_submission(challenge, message_text):
+def validate_challenge_submission(challenge, message_text, features=None):
     """Valida si un mensaje cumple con los requisitos del reto"""
-    message_text = message_text.lower()
-    if challenge.get("validation_type") == "country_keywords":
-        return any(keyword in message_text for keyword in challenge["validation_keywords"])
-    elif challenge.get("validation_type") == "genre_keywords":
-        return any(keyword in message_text for keyword in challenge["validation_keywords"])
+    if challenge.get("validation_type") in ("country_keywords", "genre_keywords"):
+        buscador = obtener_buscador(challenge["validation_keywords"])
+        if features is not None:
+            return buscador.contiene(features.normalizado, normalizado=True)
+        return buscador.contiene(message_text)
     return False
 
 async def reto_job(context: ContextTypes.DEFAULT_TYPE):
@@ -1,10 +1,18 @@
 # handlers/security.py - Sistema de seguridad y manejo de hashtags
 import time
-import re
 from functools import wraps
 from typing import Dict, List, Optional
 import logging
 from telegram import Update
+from caracteristicas_mensaje import MessageFeatures, caracteristicas
+from configuracion_chats import reglas_para_chat
+from duplicados import detector_duplicados
+from handlers.achievements import check_achievements
+from logros import EventoPuntos, TIPO_HASHTAG, TIPO_RETO_DIARIO, TIPO_RETO_SEMANAL
+from reglas_puntuacion import ReglasPuntuacion, reglas_actuales
+from tendencias import tendencias
+from handlers.palabras_clave import obtener_buscador
+from handlers.spam import SEVERIDAD_BLOQUEO, crear_spam_engine_desde_config
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -16,14 +24,8 @@ class SecurityManager:
         self.rate_limits = {}
         # Blacklist temporal para usuarios problemáticos
         self.temp_blacklist = {}
-        # Patrones de spam más sofisticados
-        self.spam_patterns = [
-            r'(?i)(descarga|download)\s+(gratis|free)',
-            r'(?i)(oferta|promocion|descuento)\s*[0-9]+%',
-            r'(?i)(gana|earn)\s+(dinero|money)',
-            r'https?://(?!t\.me|youtube\.com|imdb\.com)',  # URLs sospechosas
-            r'(?i)telegram\s*@\w+',  # Promoción de otros canales
-        ]
+        # Patrones de spam compilados en un único motor (recargables desde spam_rules.json)
+        self.spam_engine = crear_spam_engine_desde_config()
         # Límites por acción (acción: (max_count, window_seconds))
         self.action_limits = {
             'hashtag_usage': (5, 300),      # 5 hashtags por 5 min
@@ -56,24 +58,11 @@ class SecurityManager:
         user_actions.append(current_time)
         return False
     
-    def is_spam_content(self, text: str, user_id: int) -> Optional[str]:
+    def is_spam_content(self, text: str, user_id: int, features: Optional[MessageFeatures] = None) -> Optional[str]:
         """Detecta contenido spam y retorna razón si lo encuentra"""
-        # Verificar patrones de spam
-        for pattern in self.spam_patterns:
-            if re.search(pattern, text):
-                return f"Patrón spam detectado"
-        
-        # Verificar exceso de mayúsculas
-        if len(text) > 20:
-            caps_ratio = sum(1 for c in text if c.isupper()) / len(text)
-            if caps_ratio > 0.7:
-                return "Exceso de mayúsculas"
-        
-        # Verificar repetición excesiva de caracteres
-        if re.search(r'(.)\1{4,}', text):
-            return "Repetición excesiva de caracteres"
-        
-        return None
+        features = features or caracteristicas(text)
+        resultado = self.spam_engine.analizar(text, mayusculas=features.mayusculas)
+        return resultado.motivo if resultado else None
     
     def add_to_blacklist(self, user_id: int, reason: str, duration: int = 3600):
         """Añade usuario a blacklist temporal"""
@@ -95,7 +84,8 @@ class SecurityManager:
         
         return blacklist_info['reason']
     
-    def validate_hashtag_message(self, text: str, user_id: int) -> Dict[str, any]:
+    def validate_hashtag_message(self, text: str, user_id: int,
+                                 features: Optional[MessageFeatures] = None) -> Dict[str, any]:
         """Validación completa para mensajes con hashtags"""
         result = {
             'is_valid': True,
@@ -117,17 +107,18 @@ class SecurityManager:
             result['blocks'].append("Límite de hashtags excedido. Espera unos minutos.")
             return result
         
-        # Verificar spam
-        spam_reason = self.is_spam_content(text, user_id)
-        if spam_reason:
+        # Verificar spam (reutiliza el recuento de mayúsculas de las características)
+        features = features or caracteristicas(text)
+        spam = self.spam_engine.analizar(text, mayusculas=features.mayusculas)
+        if spam:
             result['spam_score'] = 10
-            result['warnings'].append(f"Contenido sospechoso: {spam_reason}")
+            result['warnings'].append(f"Contenido sospechoso: {spam.motivo}")
             
             # Si es spam severo, bloquear
-            if any(severe in spam_reason.lower() for severe in ['descarga', 'promocion', 'gana dinero']):
+            if spam.severidad == SEVERIDAD_BLOQUEO:
                 result['is_valid'] = False
                 result['blocks'].append("Contenido promocional no permitido")
-                self.add_to_blacklist(user_id, spam_reason, 1800)  # 30 min
+                self.add_to_blacklist(user_id, spam.motivo, 1800)  # 30 min
         
         return result
 
@@ -153,41 +144,14 @@ def rate_limit(action: str):
 
 # === HANDLER DE HASHTAGS MEJORADO ===
 
-POINTS = {
-    "#aporte": 3,
-    "#recomendación": 5,
-    "#reseña": 7,
-    "#crítica": 10,
-    "#debate": 4,
-    "#pregunta": 2,
-    "#spoiler": 1,
-}
-
-# Validaciones específicas por hashtag
-HASHTAG_VALIDATIONS = {
-    "#reseña": {
-        "min_words": 15,  # Reducido para pruebas
-        "bonus_patterns": [r'\b\d{4}\b', r'\b[A-Z][a-z]+\b']  # Año, Nombres propios
-    },
-    "#crítica": {
-        "min_words": 25,
-        "bonus_patterns": [r'\b(?:cinematografía|guión|banda sonora|actuación|dirección)\b']
-    },
-    "#recomendación": {
-        "min_words": 10,
-        "bonus_patterns": [r'\b\d{4}\b', r'\b(?:Netflix|Prime|Disney|HBO)\b']  # Año o plataforma
-    }
-}
+# Puntos, mínimos de palabras y patrones de bonus por hashtag: ver reglas_puntuacion.py
 
 def count_words(text):
-    """Cuenta palabras excluyendo hashtags y menciones"""
-    # Remover hashtags, menciones y URLs
-    clean_text = re.sub(r'#\w+|@\w+|https?://\S+', '', text)
-    # Remover caracteres especiales y dividir por espacios
-    words = re.findall(r'\b\w+\b', clean_text.lower())
-    return len(words)
+    """Cuenta palabras excluyendo hashtags, menciones y URLs"""
+    return caracteristicas(text).palabras
 
-def validate_hashtag_content(hashtag: str, text: str) -> Dict[str, any]:
+def validate_hashtag_content(hashtag: str, text, features: Optional[MessageFeatures] = None,
+                             reglas: Optional[ReglasPuntuacion] = None) -> Dict[str, any]:
     """Valida contenido específico por hashtag"""
     result = {
         'is_valid': True,
@@ -196,14 +160,15 @@ def validate_hashtag_content(hashtag: str, text: str) -> Dict[str, any]:
         'bonus_reason': None
     }
     
-    if hashtag not in HASHTAG_VALIDATIONS:
+    regla = (reglas or reglas_actuales()).buscar(hashtag)
+    if regla is None:
         return result
     
-    validation = HASHTAG_VALIDATIONS[hashtag]
-    word_count = count_words(text)
+    features = features or caracteristicas(text)
+    word_count = features.palabras
     
     # Verificar longitud mínima
-    min_words = validation.get('min_words', 0)
+    min_words = regla.min_palabras
     if word_count < min_words:
         # Para pruebas, solo advertencia en lugar de invalidar
         result['warnings'].append(
@@ -212,8 +177,7 @@ def validate_hashtag_content(hashtag: str, text: str) -> Dict[str, any]:
         result['points_modifier'] = 0.7  # Reducir puntos pero no invalidar
     
     # Verificar elementos bonus
-    bonus_patterns = validation.get('bonus_patterns', [])
-    bonus_found = sum(1 for pattern in bonus_patterns if re.search(pattern, text, re.IGNORECASE))
+    bonus_found = sum(1 for pattern in regla.bonus if pattern in features.bonus)
     if bonus_found > 0:
         result['points_modifier'] = min(1.5, 1.0 + (bonus_found * 0.2))  # Máximo 50% bonus
         result['bonus_reason'] = f"Bonus por información adicional (+{int((result['points_modifier']-1)*100)}%)"
@@ -245,15 +209,23 @@ async def handle_hashtags_improved(update: Update, context):
     
     logger.info(f"Processing message from {username} (ID: {user_id}): {text[:50]}...")
     
+    # Todo el análisis del texto se hace una vez y lo comparten las comprobaciones
+    features = MessageFeatures.de_update(update)
+    
     # Verificar si hay hashtags válidos
-    found_hashtags = [tag for tag in POINTS.keys() if tag in text.lower()]
+    reglas = reglas_para_chat(update.effective_chat.id)
+    found_hashtags = []
+    for tag in features.hashtags:
+        regla = reglas.buscar(tag)
+        if regla and regla not in found_hashtags:
+            found_hashtags.append(regla)
     if not found_hashtags:
         logger.debug("No hashtags found, skipping")
         return
     
     # Validación de seguridad
     try:
-        security_result = security_manager.validate_hashtag_message(text, user_id)
+        security_result = security_manager.validate_hashtag_message(text, user_id, features)
         
         if not security_result['is_valid']:
             for block_reason in security_result['blocks']:
@@ -276,13 +248,11 @@ async def handle_hashtags_improved(update: Update, context):
     warnings = []
     bonus_messages = []
     
-    for hashtag, base_points in POINTS.items():
-        if hashtag not in text.lower():
-            continue
-        
+    for regla in found_hashtags:
+        hashtag, base_points = regla.etiqueta, regla.puntos
         try:
             # Validar contenido específico del hashtag
-            validation_result = validate_hashtag_content(hashtag, text)
+            validation_result = validate_hashtag_content(hashtag, text, features, reglas)
             
             # Calcular puntos con modificadores
             final_points = max(1, int(base_points * validation_result['points_modifier']))
@@ -306,6 +276,15 @@ async def handle_hashtags_improved(update: Update, context):
             total_points += base_points
             found_tags.append(f"{hashtag} (+{base_points})")
     
+    # Casi-duplicados: copiarse a sí mismo no puntúa, copiar a otro del chat se descuenta
+    duplicado = detector_duplicados.evaluar(user_id, update.effective_chat.id, features)
+    if duplicado.factor <= 0:
+        total_points = 0
+        warnings.append(f"⚠️ {duplicado.aviso}")
+    elif duplicado.coincidencia:
+        total_points = max(1, int(total_points * duplicado.factor))
+        warnings.append(f"⚠️ {duplicado.aviso}")
+    
     # Si no hay puntos válidos
     if total_points == 0:
         if warnings:
@@ -315,18 +294,25 @@ async def handle_hashtags_improved(update: Update, context):
     # Guardar puntos en base de datos
     try:
         from db import add_points
-        add_points(
+        if not add_points(
             user_id=user_id,
-            username=username,
-            points=total_points,
-            hashtag=None,
-            message_text=text[:500],  # Limitar longitud
             chat_id=update.effective_chat.id,
-            message_id=update.message.message_id,
-            is_challenge_bonus=False,
-            context=context
-        )
+            points=total_points,
+            username=username,
+            chat_name=update.effective_chat.title or "Chat Privado",
+            reason=found_hashtags[0].etiqueta,
+            message_id=update.message.message_id
+        ):
+            # Mensaje ya puntuado (update reentregado)
+            return
         logger.info(f"Added {total_points} points for user {username}")
+        detector_duplicados.registrar(user_id, update.effective_chat.id, features)
+        evento = EventoPuntos(
+            user_id, update.effective_chat.id, TIPO_HASHTAG, tuple(r.etiqueta for r in found_hashtags),
+            puntos=total_points, username=username
+        )
+        tendencias.registrar_evento(evento)
+        await check_achievements(context, evento)
     except Exception as e:
         logger.error(f"Error adding points: {e}")
         await update.message.reply_text("❌ Error interno. Inténtalo más tarde.")
@@ -337,7 +323,7 @@ async def handle_hashtags_improved(update: Update, context):
     
     # Puntos básicos
     tags_text = ", ".join(found_tags)
-    reaction = get_simple_reaction(found_hashtags[0])
+    reaction = get_simple_reaction(found_hashtags[0].etiqueta)
     response_parts.append(f"✅ +{total_points} puntos por: {tags_text}\n{reaction}")
     
     # Mensajes bonus
@@ -350,7 +336,7 @@ async def handle_hashtags_improved(update: Update, context):
     
     # Verificar retos (con manejo de errores)
     try:
-        await check_challenges(update, context, text, user_id, username, response_parts)
+        await check_challenges(update, context, text, user_id, username, response_parts, features)
     except Exception as e:
         logger.error(f"Error checking challenges: {e}")
     
@@ -372,8 +358,10 @@ async def handle_hashtags_improved(update: Update, context):
             except:
                 pass
 
-async def check_challenges(update, context, text, user_id, username, response_parts):
+async def check_challenges(update, context, text, user_id, username, response_parts,
+                           features: Optional[MessageFeatures] = None):
     """Verifica retos con manejo de errores mejorado"""
+    features = features or caracteristicas(text)
     try:
         # Intentar importar módulos de retos
         try:
@@ -382,22 +370,28 @@ async def check_challenges(update, context, text, user_id, username, response_pa
             current_challenge = get_current_challenge()
             if current_challenge and current_challenge.get("hashtag"):
                 hashtag_challenge = current_challenge["hashtag"]
-                if hashtag_challenge in text.lower():
-                    if validate_challenge_submission(current_challenge, text):
+                if features.tiene_hashtag(hashtag_challenge):
+                    if validate_challenge_submission(current_challenge, text, features):
                         from db import add_points
                         bonus = current_challenge.get("bonus_points", 10)
-                        add_points(
+                        # False si el bonus ya se dio por este mensaje (update reentregado)
+                        if add_points(
                             user_id=user_id,
-                            username=username,
-                            points=bonus,
-                            hashtag=hashtag_challenge,
-                            message_text=text,
                             chat_id=update.effective_chat.id,
-                            message_id=update.message.message_id,
-                            is_challenge_bonus=True,
-                            context=context
-                        )
-                        response_parts.append(f"🎯 ¡Reto semanal completado! Bonus: +{bonus} puntos 🎉")
+                            points=bonus,
+                            username=username,
+                            chat_name=update.effective_chat.title or "Chat Privado",
+                            # Distinta de la razón del premio base, que puede ser el mismo hashtag
+                            reason=f"(reto_semanal) {hashtag_challenge}",
+                            message_id=update.message.message_id
+                        ):
+                            response_parts.append(f"🎯 ¡Reto semanal completado! Bonus: +{bonus} puntos 🎉")
+                            evento = EventoPuntos(
+                                user_id, update.effective_chat.id, TIPO_RETO_SEMANAL,
+                                puntos=bonus, username=username
+                            )
+                            tendencias.registrar_evento(evento)
+                            await check_achievements(context, evento)
         except ImportError:
             logger.debug("Retos module not available")
         
@@ -405,41 +399,46 @@ async def check_challenges(update, context, text, user_id, username, response_pa
         try:
             from handlers.retos_diarios import get_today_challenge
             daily = get_today_challenge()
-            if daily and check_daily_completion(daily, text):
+            if daily and check_daily_completion(daily, text, features):
                 from db import add_points
                 daily_bonus = daily.get("bonus_points", 5)
-                add_points(
+                if add_points(
                     user_id=user_id,
-                    username=username,
-                    points=daily_bonus,
-                    hashtag="(reto_diario)",
-                    message_text=text,
                     chat_id=update.effective_chat.id,
-                    message_id=update.message.message_id,
-                    is_challenge_bonus=True,
-                    context=context
-                )
-                response_parts.append(f"🎯 ¡Reto diario completado! Bonus: +{daily_bonus} puntos 🎉")
+                    points=daily_bonus,
+                    username=username,
+                    chat_name=update.effective_chat.title or "Chat Privado",
+                    reason="(reto_diario)",
+                    message_id=update.message.message_id
+                ):
+                    response_parts.append(f"🎯 ¡Reto diario completado! Bonus: +{daily_bonus} puntos 🎉")
+                    evento = EventoPuntos(
+                        user_id, update.effective_chat.id, TIPO_RETO_DIARIO,
+                        puntos=daily_bonus, username=username
+                    )
+                    tendencias.registrar_evento(evento)
+                    await check_achievements(context, evento)
         except ImportError:
             logger.debug("Daily challenges module not available")
             
     except Exception as e:
         logger.error(f"Error checking challenges: {e}")
 
-def check_daily_completion(daily_challenge, text):
+def check_daily_completion(daily_challenge, text, features: Optional[MessageFeatures] = None):
     """Verifica si se completó el reto diario"""
     try:
+        features = features or caracteristicas(text)
         # Verificar hashtag específico
-        if "hashtag" in daily_challenge and daily_challenge["hashtag"] in text.lower():
+        if "hashtag" in daily_challenge and features.tiene_hashtag(daily_challenge["hashtag"]):
             if "min_words" in daily_challenge:
-                return count_words(text) >= daily_challenge["min_words"]
+                return features.palabras >= daily_challenge["min_words"]
             return True
         
         # Verificar palabras clave
         if "keywords" in daily_challenge:
-            if any(word in text.lower() for word in daily_challenge["keywords"]):
+            if obtener_buscador(daily_challenge["keywords"]).contiene(features.normalizado, normalizado=True):
                 if "min_words" in daily_challenge:
-                    return count_words(text) >= daily_challenge["min_words"]
+                    return features.palabras >= daily_challenge["min_words"]
                 return True
         
         return False
@@ -1,5 +1,258 @@
 from telegram import Update
 
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+SEVERIDAD_AVISO = "aviso"
+SEVERIDAD_BLOQUEO = "bloqueo"
+
+class ResultadoSpam(NamedTuple):
+    regla: str
+    motivo: str
+    severidad: str
+
+_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+_FLAGS_GLOBALES = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+def _normalizar_patron(patron: str, flags: str) -> str:
+    """Convierte flags globales ((?i) al inicio o en la regla) en un grupo con flags locales"""
+    m = _FLAGS_GLOBALES.match(patron)
+    if m:
+        flags += m.group(1)
+        patron = patron[m.end():]
+    locales = "".join(sorted(set(f for f in flags if f in _FLAGS)))
+    return f"(?{locales}:{patron})" if locales else f"(?:{patron})"
+
+def _prefijos_literales(patron: str, limite: int = 32) -> Optional[Set[str]]:
+    """Literales con los que obligatoriamente empieza una coincidencia (p. ej. {'descarga', 'download'})"""
+
+    def extender(prefijos: Set[str], sufijos: Set[str]) -> Set[str]:
+        return {p + s for p in prefijos for s in sufijos}
+
+    def recorrer(items) -> Tuple[Set[str], bool]:
+        # Devuelve (prefijos, completo): completo si toda la secuencia es literal
+        prefijos = {""}
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                prefijos = extender(prefijos, {chr(av)})
+                continue
+            if op is sre_constants.SUBPATTERN:
+                sufijos, completo = recorrer(av[3])
+            elif op is sre_constants.BRANCH:
+                sufijos, completo = set(), True
+                for rama in av[1]:
+                    rama_prefijos, rama_completa = recorrer(rama)
+                    sufijos |= rama_prefijos
+                    completo = completo and rama_completa
+            else:
+                return prefijos, False
+            if len(prefijos) * len(sufijos) > limite:
+                return prefijos, False
+            prefijos = extender(prefijos, sufijos)
+            if not completo:
+                return prefijos, False
+        return prefijos, True
+
+    try:
+        prefijos, _ = recorrer(sre_parse.parse(patron))
+    except Exception:
+        return None
+    # Prefijos de menos de 3 caracteres no filtran casi nada
+    if not prefijos or min(len(p) for p in prefijos) < 3:
+        return None
+    return prefijos
+
+# Mayúsculas de Latin-1 (sin × ni ß): cubre casi todo el texto en español
+_MAYUSCULAS_LATIN1 = re.compile("[A-ZÀ-ÖØ-Þ]")
+
+def contar_mayusculas(text: str) -> int:
+    """Equivale a sum(c.isupper() for c in text)"""
+    if text.isascii() or max(text) <= "\xff":
+        # Se cuentan en C (subn) en vez de iterar carácter a carácter en Python
+        return _MAYUSCULAS_LATIN1.subn("", text)[1]
+    # Otros alfabetos o emojis: str.isupper sobre cada carácter
+    return sum(map(str.isupper, text))
+
+class _ReglasCompiladas:
+    """Conjunto inmutable de reglas compiladas; se reemplaza entero al recargar"""
+
+    MAX_COMBINACIONES = 256
+
+    def __init__(self, config: dict):
+        self.caps_ratio = float(config.get("caps_ratio", 0.7))
+        self.caps_min_length = int(config.get("caps_min_length", 20))
+        self.max_repeticion = int(config.get("max_repeticion", 5))
+        self.reglas: Dict[str, ResultadoSpam] = {}
+        self._ramas: Dict[str, str] = {}
+        # grupo -> (literales, ignora_mayusculas); las reglas sin prefijo literal siempre se evalúan
+        self._filtros: Dict[str, Tuple[Set[str], bool]] = {}
+        self._siempre: Tuple[str, ...] = ()
+
+        siempre = []
+        for i, regla in enumerate(config.get("rules", [])):
+            nombre = regla["name"]
+            grupo = f"r{i}"
+            flags = regla.get("flags", "")
+            patron = _normalizar_patron(regla["pattern"], flags)
+            re.compile(patron)  # validar cada regla por separado para dar un error claro
+            self._ramas[grupo] = f"(?P<{grupo}>{patron})"
+            self.reglas[grupo] = ResultadoSpam(
+                nombre,
+                regla.get("reason", f"Patrón spam detectado ({nombre})"),
+                regla.get("severity", SEVERIDAD_AVISO),
+            )
+
+            ignora = "i" in flags or regla["pattern"].startswith("(?i)")
+            literales = None if (not ignora and "(?i" in regla["pattern"]) else _prefijos_literales(patron)
+            if literales is None:
+                siempre.append(grupo)
+            else:
+                self._filtros[grupo] = ({l.casefold() for l in literales} if ignora else literales, ignora)
+        self._siempre = tuple(siempre)
+
+        # Alternaciones con grupos con nombre, una por combinación de reglas candidatas
+        self._combinados: Dict[Tuple[str, ...], "re.Pattern"] = {}
+        self._compilar(tuple(self._ramas))  # la alternación completa valida el conjunto al cargar
+        self.repeticion = re.compile(r"(.)\1{%d,}" % max(1, self.max_repeticion - 1))
+
+    def _compilar(self, grupos: Tuple[str, ...]):
+        if not grupos:
+            return None
+        combinado = self._combinados.get(grupos)
+        if combinado is None:
+            if len(self._combinados) >= self.MAX_COMBINACIONES:
+                self._combinados.clear()
+            combinado = re.compile("|".join(self._ramas[g] for g in grupos))
+            self._combinados[grupos] = combinado
+        return combinado
+
+    def candidatas(self, text: str):
+        """Alternación con sólo las reglas cuyos literales obligatorios aparecen en el texto"""
+        plegado = None
+        grupos = list(self._siempre)
+        for grupo, (literales, ignora) in self._filtros.items():
+            if ignora:
+                if plegado is None:
+                    plegado = text.casefold()
+                objetivo = plegado
+            else:
+                objetivo = text
+            if any(literal in objetivo for literal in literales):
+                grupos.append(grupo)
+        # Mantener el orden de definición de las reglas
+        return self._compilar(tuple(sorted(grupos, key=lambda g: int(g[1:]))))
+
+class SpamEngine:
+    """Detector de spam: todas las reglas compiladas en una sola alternación con grupos con nombre.
+
+    Las reglas se leen sólo de un JSON (ver spam_rules.json): si falta o es
+    inválido al arrancar, el motor no se crea. Se recargan sin reiniciar
+    cuando cambia la fecha de modificación del archivo, conservando las
+    anteriores si el nuevo es inválido.
+    """
+
+    def __init__(self, ruta: str, intervalo_recarga: float = 5.0):
+        self.ruta = ruta
+        self.intervalo_recarga = intervalo_recarga
+        self._lock = threading.Lock()
+        self._proxima_comprobacion = 0.0
+        self.version = 0
+        try:
+            self._mtime: Optional[float] = os.path.getmtime(ruta)
+            self._reglas = self._leer()
+        except Exception as e:
+            logger.critical(f"❌ No se pudieron cargar las reglas de spam de {ruta}: {e}")
+            raise
+        logger.info(f"🛡️ Reglas de spam cargadas desde {ruta} ({len(self._reglas.reglas)} reglas)")
+
+    def _leer(self) -> _ReglasCompiladas:
+        with open(self.ruta, encoding="utf-8") as archivo:
+            return _ReglasCompiladas(json.load(archivo))
+
+    def recargar_si_cambio(self, forzar: bool = False) -> bool:
+        """Recarga las reglas si el archivo cambió; devuelve True si se recargaron"""
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proxima_comprobacion:
+            return False
+        self._proxima_comprobacion = ahora + self.intervalo_recarga
+
+        try:
+            mtime = os.path.getmtime(self.ruta)
+        except OSError as e:
+            if self._mtime is not None:
+                logger.error(f"❌ Archivo de reglas de spam inaccesible ({e}): se mantienen las reglas v{self.version}")
+                self._mtime = None
+            return False
+        if not forzar and mtime == self._mtime:
+            return False
+
+        with self._lock:
+            try:
+                nuevas = self._leer()
+            except Exception as e:
+                # Se conservan las reglas anteriores si el archivo nuevo es inválido
+                logger.error(f"❌ Reglas de spam inválidas en {self.ruta}: {e}")
+                self._mtime = mtime
+                return False
+            self._reglas = nuevas
+            self._mtime = mtime
+            self.version += 1
+        logger.info(f"🛡️ Reglas de spam cargadas desde {self.ruta} ({len(nuevas.reglas)} reglas, v{self.version})")
+        return True
+
+    def analizar(self, text: str, mayusculas: Optional[int] = None) -> Optional[ResultadoSpam]:
+        """Devuelve la primera regla que salta (las de bloqueo tienen preferencia) o None.
+
+        `mayusculas` permite reutilizar el recuento ya hecho en MessageFeatures.
+        """
+        if not text:
+            return None
+        self.recargar_si_cambio()
+        reglas = self._reglas
+
+        encontrado = None
+        combinado = reglas.candidatas(text)
+        if combinado is not None:
+            for m in combinado.finditer(text):
+                resultado = reglas.reglas[m.lastgroup]
+                if resultado.severidad == SEVERIDAD_BLOQUEO:
+                    return resultado
+                if encontrado is None:
+                    encontrado = resultado
+        if encontrado:
+            return encontrado
+
+        if len(text) > reglas.caps_min_length:
+            if mayusculas is None:
+                mayusculas = contar_mayusculas(text)
+            if mayusculas / len(text) > reglas.caps_ratio:
+                return ResultadoSpam("mayusculas", "Exceso de mayúsculas", SEVERIDAD_AVISO)
+
+        if reglas.repeticion.search(text):
+            return ResultadoSpam("repeticion", "Repetición excesiva de caracteres", SEVERIDAD_AVISO)
+
+        return None
+
+def crear_spam_engine_desde_config() -> SpamEngine:
+    """Crea el motor con el archivo de reglas SPAM_RULES_PATH"""
+    from config import Config
+
+    return SpamEngine(Config.SPAM_RULES_PATH)
+
 async def spam_handler(update: Update, context):
     if "gratis" in update.message.text.lower():
         await update.message.reply_text("🛑 ¡Cuidado con el spam!")
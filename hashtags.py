@@ -3,10 +3,18 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from db import get_user_stats, get_top10, add_points
+from cola_salida import responder, PRIORIDAD_ACK
+from caracteristicas_mensaje import MessageFeatures
+from reglas_puntuacion import reglas_actuales
+from configuracion_chats import reglas_para_chat
+from duplicados import detector_duplicados
+from handlers.achievements import check_achievements
+from logros import EventoPuntos, TIPO_HASHTAG
+from tendencias import tendencias
 import random
 import datetime
+import json
 import logging
-import re
 import time
 import unicodedata
 
@@ -14,39 +22,8 @@ import unicodedata
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# HASHTAGS UNIFICADOS - SIN REPETICIONES Y CON DETECCIÓN FLEXIBLE
-VALID_HASHTAGS = {
-    # Alto valor
-    'critica': 10,         # Análisis profundo, mínimo 20 palabras  
-    'reseña': 7,           # Reseña detallada, mínimo 50 palabras
-    'resena': 7,           # Sin tilde
-    'recomendacion': 5,    # Formato específico requerido
-    
-    # Participación media
-    'debate': 4,
-    'aporte': 3,
-    'cinefilo': 3,
-    'pelicula': 3,
-    'cine': 3,
-    'serie': 3,
-    'director': 3,
-    'oscar': 3,
-    'festival': 3,
-    'documental': 3,
-    'animacion': 3,
-    'clasico': 3,
-    'independiente': 3,
-    
-    # Participación baja
-    'actor': 2,
-    'genero': 2,
-    'pregunta': 2,
-    'ranking': 2,
-    'rankin': 2,           # Typo común
-    
-    # Mínimo
-    'spoiler': 1
-}
+# HASHTAGS UNIFICADOS: puntos, mínimos de palabras, bonus y alias en scoring_rules.json
+# (ver reglas_puntuacion.py; se recargan sin reiniciar el bot)
 
 # Cache para control de spam
 user_hashtag_cache = {}
@@ -63,59 +40,38 @@ def normalize_text(text):
     # Convertir a minúsculas
     return normalized.lower()
 
-def find_hashtags_in_message(text):
+def find_hashtags_in_message(text, features=None, reglas=None):
     """FUNCIÓN CORREGIDA - Encuentra TODOS los hashtags válidos con detección mejorada"""
     if not text:
         return []
     
     print(f"[DEBUG] 🔍 Texto original: '{text}'")
     
-    found_hashtags = []
-    
-    # ✅ PATRONES MEJORADOS - Detecta hashtags en CUALQUIER posición
-    hashtag_patterns = [
-        # Patrón principal: # seguido de palabra (Unicode completo)
-        r'#([\w\u00C0-\u024F\u1E00-\u1EFF]+)',
-        # Patrón con espacio después del #
-        r'#\s+([\w\u00C0-\u024F\u1E00-\u1EFF]+)',
-        # Patrón al final de línea o antes de puntuación
-        r'#([\w\u00C0-\u024F\u1E00-\u1EFF]+)(?=\s|$|[.,;:!?])',
-    ]
-    
-    for i, pattern in enumerate(hashtag_patterns):
-        hashtags_found = re.findall(pattern, text, re.IGNORECASE | re.UNICODE)
-        
-        for hashtag_word in hashtags_found:
-            # Limpiar la palabra (remover espacios extra)
-            hashtag_word = hashtag_word.strip()
-            if not hashtag_word:
-                continue
-                
-            # Normalizar la palabra encontrada
-            normalized_hashtag = normalize_text(hashtag_word)
-            
-            print(f"[DEBUG] 🏷️ Hashtag encontrado (patrón {i+1}): '{hashtag_word}' -> normalizado: '{normalized_hashtag}'")
-            
-            # Verificar si está en la lista de hashtags válidos
-            if normalized_hashtag in VALID_HASHTAGS:
-                points = VALID_HASHTAGS[normalized_hashtag]
-                found_hashtags.append((f"#{hashtag_word}", points))
-                print(f"[DEBUG] ✅ VÁLIDO: #{hashtag_word} = {points} puntos")
-            else:
-                print(f"[DEBUG] ❌ NO VÁLIDO: #{hashtag_word} (normalizado: {normalized_hashtag})")
-                # DEBUG ADICIONAL: Mostrar hashtags válidos similares
-                similar = [h for h in VALID_HASHTAGS.keys() if h.startswith(normalized_hashtag[:3])]
-                if similar:
-                    print(f"[DEBUG] 💡 Hashtags similares disponibles: {similar}")
+    # Los hashtags ('#palabra' o '# palabra') ya vienen extraídos y sin repetir
+    features = features or MessageFeatures.de_texto(text)
+    reglas = reglas or reglas_actuales()
     
-    # Eliminar duplicados manteniendo el orden
     unique_hashtags = []
     seen = set()
-    for hashtag, points in found_hashtags:
-        hashtag_lower = normalize_text(hashtag)
-        if hashtag_lower not in seen:
-            unique_hashtags.append((hashtag, points))
-            seen.add(hashtag_lower)
+    for hashtag in features.hashtags:
+        regla = reglas.buscar(hashtag)
+        
+        print(f"[DEBUG] 🏷️ Hashtag encontrado: '{hashtag}' -> regla: {regla.clave if regla else None}")
+        
+        # Verificar si está en la lista de hashtags válidos (los alias cuentan como el original)
+        if regla:
+            if regla.clave in seen:
+                continue
+            seen.add(regla.clave)
+            unique_hashtags.append((hashtag, regla.puntos))
+            print(f"[DEBUG] ✅ VÁLIDO: {hashtag} = {regla.puntos} puntos")
+        else:
+            normalized_hashtag = normalize_text(hashtag[1:])
+            print(f"[DEBUG] ❌ NO VÁLIDO: {hashtag} (normalizado: {normalized_hashtag})")
+            # DEBUG ADICIONAL: Mostrar hashtags válidos similares
+            similar = [h for h in reglas.hashtags.keys() if h.startswith(normalized_hashtag[:3])]
+            if similar:
+                print(f"[DEBUG] 💡 Hashtags similares disponibles: {similar}")
     
     print(f"[DEBUG] 🎯 Hashtags únicos finales: {unique_hashtags}")
     return unique_hashtags
@@ -144,12 +100,28 @@ def is_spam(user_id, hashtag):
     user_data["last_time"] = current_time
     return False
 
+def export_spam_cache():
+    """Exporta las ventanas de spam aún vigentes como {user_id: json}"""
+    cutoff = time.time() - 300
+    return {
+        user_id: json.dumps(user_data)
+        for user_id, user_data in list(user_hashtag_cache.items())
+        if user_data.get("last_time", 0) > cutoff
+    }
+
+def import_spam_cache(entries):
+    """Restaura las ventanas de spam exportadas con export_spam_cache"""
+    for user_id, data in entries.items():
+        try:
+            user_hashtag_cache[int(user_id)] = json.loads(data)
+        except (ValueError, TypeError):
+            continue
+
 def count_words(text):
-    """Cuenta palabras sin incluir hashtags"""
+    """Cuenta palabras sin incluir hashtags, menciones ni URLs"""
     if not text:
         return 0
-    text_without_hashtags = re.sub(r'#\w+', '', text)
-    return len(text_without_hashtags.split())
+    return MessageFeatures.de_texto(text).palabras
 
 # Niveles del sistema
 LEVEL_THRESHOLDS = {
@@ -181,8 +153,13 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"[DEBUG] 📝 Mensaje: '{message_text}'")
     print(f"[DEBUG] 💬 Chat: {chat.id}")
     
+    # Características del texto calculadas una sola vez para todo el update
+    features = MessageFeatures.de_update(update)
+    # Reglas del chat (generales + sus ajustes), las mismas para todo el mensaje
+    reglas = reglas_para_chat(chat.id)
+    
     # 🎯 DETECCIÓN MEJORADA DE HASHTAGS
-    found_hashtags = find_hashtags_in_message(message_text)
+    found_hashtags = find_hashtags_in_message(message_text, features, reglas)
     
     if not found_hashtags:
         print(f"[DEBUG] ❌ No se encontraron hashtags válidos")
@@ -190,13 +167,21 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     print(f"[DEBUG] ✅ Hashtags detectados: {found_hashtags}")
     
+    # Anti copia-pega: casi-duplicado de un mensaje reciente del usuario o del chat
+    duplicado = detector_duplicados.evaluar(user.id, chat.id, features)
+    if duplicado.factor <= 0:
+        logger.debug(f"🚫 Casi-duplicado rechazado: {duplicado.coincidencia}")
+        await responder(update, f"⚠️ {duplicado.aviso}", prioridad=PRIORIDAD_ACK, agrupable=True)
+        return
+    
     # Verificar spam y calcular puntos
     valid_hashtags = []
     total_points = 0
     warnings = []
+    word_count = features.palabras
     
     for hashtag, points in found_hashtags:
-        hashtag_word = hashtag[1:].lower()  # Remover # y convertir a minúsculas
+        regla = reglas.buscar(hashtag)
         
         print(f"[DEBUG] 🔄 Procesando: {hashtag} ({points} pts)")
         
@@ -207,14 +192,10 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
             continue
         
         # Validaciones especiales
-        word_count = count_words(message_text)
         original_points = points
         
-        if hashtag_word == "critica" and word_count < 25:
-            warnings.append(f"❌ {hashtag}: Necesitas análisis más profundo (mín. 100 palabras). Tienes ~{word_count*4} palabras.")
-            points = max(1, points // 2)
-        elif hashtag_word in ["reseña", "resena"] and word_count < 15:
-            warnings.append(f"❌ {hashtag}: Necesitas reseña más detallada (mín. 50 palabras). Tienes ~{word_count*4} palabras.")
+        if regla.min_palabras and word_count < regla.min_palabras:
+            warnings.append(f"❌ {hashtag}: Necesitas un mensaje más detallado (mín. {regla.min_palabras} palabras). Tienes {word_count} palabras.")
             points = max(1, points // 2)
         
         valid_hashtags.append((hashtag, points))
@@ -228,10 +209,15 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Bonus por mensaje detallado
     bonus_text = ""
-    if len(message_text) > 150:
-        total_points += 2
-        bonus_text = " (+2 bonus detalle)"
-        print(f"[DEBUG] 💎 Bonus por detalle: +2 puntos")
+    if reglas.bonus_detalle_puntos and len(message_text) > reglas.bonus_detalle_longitud:
+        total_points += reglas.bonus_detalle_puntos
+        bonus_text = f" (+{reglas.bonus_detalle_puntos} bonus detalle)"
+        print(f"[DEBUG] 💎 Bonus por detalle: +{reglas.bonus_detalle_puntos} puntos")
+    
+    if duplicado.coincidencia:
+        total_points = max(1, int(total_points * duplicado.factor))
+        warnings.append(f"⚠️ {duplicado.aviso}")
+        logger.debug(f"✂️ Casi-duplicado: puntos x{duplicado.factor}")
     
     print(f"[DEBUG] 💰 Total final: {total_points} puntos")
     
@@ -240,18 +226,27 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         primary_hashtag = valid_hashtags[0][0] if valid_hashtags else "#aporte"
         
         print(f"[DEBUG] 💾 Guardando en BD...")
-        add_points(
+        nuevo = add_points(
             user_id=user.id,
-            username=user.username or user.first_name,
-            points=total_points,
-            hashtag=primary_hashtag,
-            message_text=message_text[:200],
             chat_id=chat.id,
-            message_id=update.message.message_id,
-            context=context
+            points=total_points,
+            username=user.username or user.first_name,
+            chat_name=chat.title or "Chat Privado",
+            reason=primary_hashtag,
+            message_id=update.message.message_id
         )
+        if not nuevo:
+            # Mensaje ya puntuado (update reentregado): ni logros ni respuesta otra vez
+            return
         
         print(f"[DEBUG] ✅ Datos guardados exitosamente")
+        detector_duplicados.registrar(user.id, chat.id, features)
+        evento = EventoPuntos(
+            user.id, chat.id, TIPO_HASHTAG, tuple(h for h, _ in valid_hashtags),
+            puntos=total_points, username=user.username or user.first_name
+        )
+        tendencias.registrar_evento(evento)
+        await check_achievements(context, evento)
         
         # Crear respuesta - FORMATEO CORREGIDO
         hashtags_list = ", ".join([h[0] for h, p in valid_hashtags])
@@ -280,11 +275,8 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if warnings:
             response += f"\n\n⚠️ <b>Notas:</b>\n" + "\n".join(warnings)
         
-        await update.message.reply_text(
-            response, 
-            parse_mode='HTML',
-            reply_to_message_id=update.message.message_id
-        )
+        # Confirmación de baja prioridad: la cola de salida puede agruparla con otras del chat
+        await responder(update, response, prioridad=PRIORIDAD_ACK, agrupable=True, parse_mode='HTML')
         
         print(f"[DEBUG] ✅ Respuesta enviada correctamente")
         logger.info(f"Usuario {user.id} ganó {total_points} puntos con: {hashtags_list}")
@@ -296,7 +288,7 @@ async def handle_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Respuesta de emergencia - TAMBIÉN CORREGIDA
         try:
-            await update.message.reply_text(f"✅ ¡Puntos ganados! +{total_points} pts 🎬")
+            await responder(update, f"✅ ¡Puntos ganados! +{total_points} pts 🎬", prioridad=PRIORIDAD_ACK)
             print(f"[DEBUG] 🆘 Respuesta de emergencia enviada")
         except Exception as e2:
             print(f"[DEBUG] ❌ Error crítico: No se pudo enviar respuesta: {e2}")
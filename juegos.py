@@ -2,12 +2,10 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, Application
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, Set
 import random
-import time
 import asyncio
 import json
-from datetime import datetime
 import telegram # Asegúrate de importar telegram para usar telegram.error.BadRequest
 
 # Importar funciones corregidas de db.py
@@ -23,9 +21,18 @@ from db import (
     delete_active_trivia,
     get_all_active_games,
     get_all_active_trivias,
-    cleanup_expired_games
+    cleanup_expired_games,
+    epoch_ms
 )
-from generador_trivia import generar_pregunta
+from cola_salida import responder, PRIORIDAD_JUEGO, PRIORIDAD_NORMAL
+
+from caracteristicas_mensaje import MessageFeatures
+from configuracion_chats import reglas_para_chat
+from pipeline_mensajes import PipelineMensajes
+from sistema_autorizacion import verificar_autorizacion
+from handlers.achievements import check_achievements
+from logros import EventoPuntos, TIPO_JUEGO
+from tendencias import tendencias
 
 # Importar handle_hashtags correctamente
 try:
@@ -42,17 +49,25 @@ logger = logging.getLogger(__name__)
 active_games: Dict[int, Dict[str, Any]] = {}
 active_trivias: Dict[int, Dict[str, Any]] = {}
 
-def initialize_games_system():
+# Precargas de trivia en curso: se guarda la referencia para poder ver sus errores
+_precargas: Set[asyncio.Future] = set()
+
+def _fin_precarga(futuro: asyncio.Future) -> None:
+    _precargas.discard(futuro)
+    if not futuro.cancelled() and futuro.exception() is not None:
+        logger.error(f"❌ Error precargando preguntas de trivia: {futuro.exception()}")
+
+def initialize_games_system(filtro_chats: Optional[Callable[[int], bool]] = None):
     """Inicializar el sistema de juegos cargando datos de la base de datos"""
     logger.info("🎮 Inicializando sistema de juegos...")
     try:
-        load_active_games_from_db()
+        load_active_games_from_db(filtro_chats)
         logger.info("✅ Sistema de juegos inicializado correctamente")
     except Exception as e:
         logger.error(f"❌ Error inicializando sistema de juegos: {e}")
 
-def load_active_games_from_db():
-    """Cargar juegos activos desde la base de datos"""
+def load_active_games_from_db(filtro_chats: Optional[Callable[[int], bool]] = None):
+    """Cargar juegos activos desde la base de datos (solo los chats que acepte filtro_chats)"""
     global active_games, active_trivias
     
     try:
@@ -64,6 +79,8 @@ def load_active_games_from_db():
         games_from_db = get_all_active_games()
         for game in games_from_db:
             chat_id = game['chat_id']
+            if filtro_chats and not filtro_chats(chat_id):
+                continue
             active_games[chat_id] = {
                 'juego': game['juego'],
                 'respuesta': game['respuesta'],
@@ -77,6 +94,8 @@ def load_active_games_from_db():
         trivias_from_db = get_all_active_trivias()
         for trivia in trivias_from_db:
             chat_id = trivia['chat_id']
+            if filtro_chats and not filtro_chats(chat_id):
+                continue
             active_trivias[chat_id] = {
                 'pregunta': trivia['pregunta'],
                 'respuesta': trivia['respuesta'],
@@ -128,23 +147,13 @@ async def check_active_games():
     """Función para revisar juegos activos y limpiar los inactivos."""
     while True:
         try:
-            current_time = time.time()
+            current_time = epoch_ms()  # last_activity y start_time también van en milisegundos
             games_to_remove = []
             
             # Revisar juegos activos
             for chat_id, game_data in active_games.items():
                 try:
-                    # Convertir last_activity a timestamp si es necesario
-                    if isinstance(game_data['last_activity'], datetime):
-                        last_activity_timestamp = game_data['last_activity'].timestamp()
-                    elif isinstance(game_data['last_activity'], str):
-                        # Para SQLite que puede devolver strings
-                        dt = datetime.fromisoformat(game_data['last_activity'])
-                        last_activity_timestamp = dt.timestamp()
-                    else:
-                        last_activity_timestamp = game_data['last_activity']
-                    
-                    if current_time - last_activity_timestamp > 3600:  # 1 hora de inactividad
+                    if current_time - game_data['last_activity'] > 3_600_000:  # 1 hora de inactividad
                         games_to_remove.append(chat_id)
                         
                 except Exception as e:
@@ -165,7 +174,7 @@ async def check_active_games():
             trivias_to_remove = []
             for chat_id, trivia_data in active_trivias.items():
                 try:
-                    if current_time - trivia_data['start_time'] > 600:  # 10 minutos para trivias
+                    if current_time - trivia_data['start_time'] > 600_000:  # 10 minutos para trivias
                         trivias_to_remove.append(chat_id)
                 except Exception as e:
                     logger.error(f"❌ Error procesando trivia {chat_id}: {e}")
@@ -211,7 +220,13 @@ async def cmd_cinematrivia(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     logger.info(f"🎬 Generando pregunta de cinematrivia para chat {chat_id}")
     
     try:
-        pregunta, respuesta = generar_pregunta()
+        # Import diferido: generador_trivia arrastra requests y sólo lo usa este comando
+        import generador_trivia
+        from config import Config
+        pregunta, respuesta = await asyncio.to_thread(generador_trivia.sacar_pregunta)
+        precarga = asyncio.get_running_loop().run_in_executor(None, generador_trivia.precargar, Config.TRIVIA_POOL_SIZE)
+        _precargas.add(precarga)
+        precarga.add_done_callback(_fin_precarga)
     except Exception as e:
         logger.error(f"❌ Error generando pregunta: {e}")
         await update.message.reply_text(
@@ -235,7 +250,7 @@ async def cmd_cinematrivia(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         'pistas': [],
         'intentos': 0,
         'started_by': user_id,
-        'last_activity': datetime.now()
+        'last_activity': epoch_ms()
     }
     
     # Sincronizar con base de datos
@@ -315,7 +330,7 @@ async def cmd_pista(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     nuevo_caracter = random.choice(caracteres_no_revelados)
     pistas.append(nuevo_caracter)
     active_games[chat_id]['pistas'] = pistas
-    active_games[chat_id]['last_activity'] = datetime.now()
+    active_games[chat_id]['last_activity'] = epoch_ms()
     
     # Sincronizar con base de datos
     sync_game_to_db(chat_id)
@@ -371,24 +386,51 @@ async def cmd_rendirse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             reply_to_message_id=update.message.message_id
         )
 
-async def route_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Ruta los mensajes de texto a los manejadores de juego o hashtags."""
-    chat_id = update.effective_chat.id
-    user_id = update.effective_user.id
-    text = update.message.text
+# Pipeline de mensajes de texto: cada etapa sólo corre si la anterior deja pasar el mensaje
+pipeline_texto = PipelineMensajes("texto")
+
+@pipeline_texto.etapa("prefiltro")
+def _puede_puntuar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Sin '#' y sin juego activo en el chat el mensaje no puede puntuar (sin BD ni regex).
+
+    Los retos por palabras clave también exigen hashtag (se comprueban al puntuar).
+    """
+    return "#" in update.message.text or update.effective_chat.id in active_games
+
+@pipeline_texto.etapa("autorizacion")
+async def _chat_autorizado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    return await verificar_autorizacion(update)
 
+@pipeline_texto.etapa("juego")
+async def _respuesta_de_juego(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     # Verificar si hay un juego activo y si es una respuesta
-    if chat_id in active_games and user_id != context.bot.id:
-        game_data = active_games[chat_id]
-        if game_data['juego'] == 'cinematrivia':
+    chat_id = update.effective_chat.id
+    if chat_id in active_games and update.effective_user.id != context.bot.id:
+        if active_games[chat_id]['juego'] == 'cinematrivia':
             await handle_game_message(update, context)
-            return
-    
-    # Si no es una respuesta de juego, procesar hashtags
+            return False
+    return True
+
+@pipeline_texto.etapa("hashtags")
+def _tiene_hashtag_valido(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    features = MessageFeatures.de_update(update)
+    return bool(features and features.hashtags_normalizados & reglas_para_chat(update.effective_chat.id).hashtags.keys())
+
+@pipeline_texto.etapa("puntuacion")
+async def _puntuar_hashtags(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     try:
         await handle_hashtags(update, context)
     except Exception as e:
         logger.error(f"❌ Error procesando hashtags: {e}")
+    return False
+
+async def route_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ruta los mensajes de texto a los manejadores de juego o hashtags.
+
+    Incluye la comprobación de autorización (después del prefiltro), así que
+    no debe envolverse en auth_required.
+    """
+    await pipeline_texto.procesar(update, context)
 
 async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Manejar respuestas de juegos activos"""
@@ -400,7 +442,7 @@ async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         return  # No hay juego activo para este chat
 
     game_data = active_games[chat_id]
-    game_data['last_activity'] = datetime.now()
+    game_data['last_activity'] = epoch_ms()
     
     if game_data['juego'] == 'cinematrivia':
         correct_answer = game_data['respuesta'].lower().strip()
@@ -408,8 +450,9 @@ async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Verificar si la respuesta es correcta
         if user_answer == correct_answer:
             # Respuesta correcta
+            nuevo = True
             try:
-                add_points(
+                nuevo = add_points(
                     user_id=user_id,
                     chat_id=chat_id,
                     points=15,  # Puntos por ganar cinematrivia
@@ -418,6 +461,13 @@ async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                     reason="Cinematrivia ganada",
                     message_id=update.message.message_id
                 )
+                if nuevo:
+                    evento = EventoPuntos(
+                        user_id, chat_id, TIPO_JUEGO, puntos=15,
+                        username=update.effective_user.username or update.effective_user.first_name
+                    )
+                    tendencias.registrar_evento(evento)
+                    await check_achievements(context, evento)
             except Exception as e:
                 logger.error(f"❌ Error agregando puntos: {e}")
             
@@ -428,13 +478,18 @@ async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             except Exception as e:
                 logger.error(f"❌ Error eliminando juego de DB: {e}")
             
-            await update.message.reply_text(
+            if not nuevo:
+                # Victoria ya premiada (update reentregado tras una caída): no se anuncia otra vez
+                return
+            
+            await responder(
+                update,
                 f"🎉 **¡CORRECTO!** 🎉\n\n"
                 f"¡Felicidades, {update.effective_user.mention_html()}!\n"
                 f"🎯 La respuesta era: **{correct_answer.title()}**\n"
                 f"⭐ Has ganado **15 puntos**",
-                parse_mode='HTML',
-                reply_to_message_id=update.message.message_id
+                prioridad=PRIORIDAD_JUEGO,
+                parse_mode='HTML'
             )
         else:
             # Respuesta incorrecta
@@ -450,23 +505,25 @@ async def handle_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                 except Exception as e:
                     logger.error(f"❌ Error eliminando juego de DB: {e}")
                 
-                await update.message.reply_text(
+                await responder(
+                    update,
                     f"❌ **¡Se acabaron los intentos!**\n\n"
                     f"🎯 La respuesta correcta era: **{respuesta_real.title()}**\n"
                     f"🍀 ¡Mejor suerte la próxima vez!",
-                    parse_mode='Markdown',
-                    reply_to_message_id=update.message.message_id
+                    prioridad=PRIORIDAD_JUEGO,
+                    parse_mode='Markdown'
                 )
             else:
                 # Sincronizar con base de datos
                 sync_game_to_db(chat_id)
                 
-                await update.message.reply_text(
+                await responder(
+                    update,
                     f"❌ **Respuesta incorrecta**\n"
                     f"🔢 Te quedan **{intentos_restantes}** intentos\n"
                     f"💡 Usa /pista si necesitas ayuda",
-                    parse_mode='Markdown',
-                    reply_to_message_id=update.message.message_id
+                    prioridad=PRIORIDAD_NORMAL,
+                    parse_mode='Markdown'
                 )
 
 async def handle_trivia_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -0,0 +1,325 @@
+# liderazgo.py
+"""
+Elección de líder para que sólo una instancia haga polling.
+
+- PostgreSQL: pg_try_advisory_lock en una conexión dedicada. Si el líder
+  muere, el servidor cierra su sesión y libera el lock; los keepalives TCP
+  acotan el caso de una máquina que desaparece sin cerrar el socket.
+- SQLite: un lease con caducidad en la tabla leader_lease que el líder
+  renueva cada LEASE_TTL / 3 segundos.
+
+Las instancias en espera reintentan cada pocos segundos y toman el relevo
+en cuanto el lock/lease queda libre.
+
+Si la base de datos no responde al renovar, el líder no se retira: sigue
+haciendo polling (los puntos van al spool, ver spool_puntos.py) y vuelve
+a tomar el lock/lease cuando la base de datos vuelve. Sólo deja el
+liderazgo si, al volver, otra instancia lo tiene.
+
+Retomar el backlog: PTB confirma a Telegram cada lote de getUpdates en la
+siguiente llamada (offset = último recibido + 1), aunque sus updates sigan
+esperando en las colas del planificador; si el líder cae, esos updates ya
+no se pueden recuperar. UpdaterConMarca sólo confirma hasta la marca de
+agua (el mayor update_id tal que todos los anteriores terminaron), también
+en el getUpdates final de la parada. La marca se guarda en bot_state y el
+nuevo líder (o la misma instancia al reiniciar) recibe de Telegram todo lo
+que quedó sin terminar; los updates por debajo de la marca guardada se
+descartan por si Telegram reenvía alguno ya atendido. Lo que se procesó
+por encima de la marca puede repetirse (los puntos son idempotentes).
+Como getUpdates devuelve como mucho 100 updates a partir del offset, no
+puede haber más de 100 updates recibidos por delante de la marca.
+"""
+
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from telegram.ext import Updater
+
+import db
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_LEASE = "polling"
+# Clave del advisory lock de PostgreSQL (constante arbitraria para este bot)
+CLAVE_ADVISORY_LOCK = 7_486_580_911
+CLAVE_ULTIMO_UPDATE = "last_update_id"
+
+class MarcaAguaUpdates:
+    """Mayor update_id tal que todos los anteriores ya terminaron de procesarse"""
+
+    def __init__(self, inicial: int = 0):
+        self.inicial = inicial
+        self._lock = threading.Lock()
+        self._heap: list = []
+        self._en_curso: set = set()
+        self._max_visto = inicial
+
+    def ya_procesado(self, update_id: int) -> bool:
+        """True si el update es anterior a la marca con la que arrancó esta instancia"""
+        return update_id <= self.inicial
+
+    def iniciar(self, update_id: int) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, update_id)
+            self._en_curso.add(update_id)
+            if update_id > self._max_visto:
+                self._max_visto = update_id
+
+    def terminar(self, update_id: int) -> None:
+        with self._lock:
+            self._en_curso.discard(update_id)
+            while self._heap and self._heap[0] not in self._en_curso:
+                heapq.heappop(self._heap)
+
+    def marca(self) -> int:
+        with self._lock:
+            if self._heap:
+                return max(self.inicial, self._heap[0] - 1)
+            return self._max_visto
+
+    @classmethod
+    def desde_db(cls) -> "MarcaAguaUpdates":
+        valor = db.get_bot_state(CLAVE_ULTIMO_UPDATE)
+        try:
+            return cls(int(valor)) if valor is not None else cls()
+        except ValueError:
+            logger.warning(f"⚠️ {CLAVE_ULTIMO_UPDATE} inválido en bot_state: {valor!r}")
+            return cls()
+
+class _ColaSinRepetidos:
+    """Cola de entrada del Updater: descarta los updates que Telegram reenvía mientras siguen en curso"""
+
+    def __init__(self, cola):
+        self._cola = cola
+        self.ultimo = 0
+        self.repetidos = 0
+
+    async def put(self, update) -> None:
+        update_id = getattr(update, "update_id", None)
+        if update_id is not None:
+            if update_id <= self.ultimo:
+                self.repetidos += 1
+                return
+            self.ultimo = update_id
+        await self._cola.put(update)
+
+class UpdaterConMarca(Updater):
+    """Updater que sólo confirma a Telegram los updates ya procesados (hasta la marca de agua)"""
+
+    def __init__(self, bot, update_queue, marca: MarcaAguaUpdates):
+        self._marca = marca
+        super().__init__(bot=bot, update_queue=_ColaSinRepetidos(update_queue))
+
+    # PTB usa _last_update_id como offset de getUpdates y lo fija al último
+    # update recibido + 1, lo que confirmaría los que aún no se procesaron
+
+    @property
+    def _last_update_id(self) -> int:
+        return self._marca.marca() + 1
+
+    @_last_update_id.setter
+    def _last_update_id(self, valor: int) -> None:
+        pass
+
+    def metricas(self) -> dict:
+        return {"offset": self._last_update_id, "reentregados_descartados": self.update_queue.repetidos}
+
+class EleccionLider:
+    """Lock de líder sobre la base de datos (advisory lock o lease)"""
+
+    def __init__(self, instancia: Optional[str] = None, ttl: float = 15.0, reintento: float = 2.0):
+        self.instancia = instancia or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self.reintento = reintento
+        self.es_lider = False
+        self.lider_desde: Optional[float] = None
+        self.intentos = 0
+        self._conexion_pg = None
+        # Si la conexión dedicada tiene el advisory lock, y el pid de la sesión que lo tomó
+        self._lock_pg = False
+        self._pid_lock_pg: Optional[int] = None
+        self._sin_confirmar = False
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._marca: Optional[MarcaAguaUpdates] = None
+        self._marca_guardada: Optional[int] = None
+
+    # ---- backends ----
+
+    def _intentar_pg(self) -> bool:
+        import psycopg2
+
+        if self._conexion_pg is None:
+            self._conexion_pg = psycopg2.connect(
+                db.DATABASE_URL, connect_timeout=db.DB_CONNECT_TIMEOUT,
+                keepalives=1, keepalives_idle=5, keepalives_interval=2, keepalives_count=3,
+            )
+            self._conexion_pg.autocommit = True
+        cursor = self._conexion_pg.cursor()
+        try:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (CLAVE_ADVISORY_LOCK,))
+            self._lock_pg = bool(cursor.fetchone()[0])
+            if self._lock_pg:
+                self._pid_lock_pg = self._conexion_pg.get_backend_pid()
+            return self._lock_pg
+        finally:
+            cursor.close()
+
+    def _sigue_pg(self) -> bool:
+        # El lock vive mientras viva la sesión: basta con comprobar que sigue abierta
+        cursor = self._conexion_pg.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            return True
+        finally:
+            cursor.close()
+
+    def _titular_pg(self) -> Optional[int]:
+        """pid de la sesión que tiene el advisory lock (None si nadie)"""
+        cursor = self._conexion_pg.cursor()
+        try:
+            cursor.execute(
+                """SELECT pid FROM pg_locks
+                   WHERE locktype = 'advisory' AND granted AND objsubid = 1
+                     AND ((classid::bigint << 32) | objid::bigint) = %s""",
+                (CLAVE_ADVISORY_LOCK,)
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila else None
+        finally:
+            cursor.close()
+
+    def _renovar_pg(self) -> bool:
+        if self._lock_pg:
+            try:
+                return self._sigue_pg()
+            except Exception as e:
+                # Con la sesión se fue el lock: hay que volver a tomarlo
+                logger.warning(f"⚠️ Conexión del liderazgo perdida: {e}")
+                self._cerrar_pg()
+        if self._intentar_pg():
+            return True
+        # Si lo tiene la sesión vieja de esta instancia (el servidor aún no la ha
+        # cerrado) o nadie, se reintenta en la siguiente renovación
+        return self._titular_pg() in (None, self._pid_lock_pg)
+
+    def _cerrar_pg(self) -> None:
+        self._lock_pg = False
+        if self._conexion_pg is not None:
+            try:
+                self._conexion_pg.close()
+            except Exception:
+                pass
+            self._conexion_pg = None
+
+    def _intentar(self) -> bool:
+        self.intentos += 1
+        try:
+            if db.is_postgresql():
+                return self._intentar_pg()
+            return db.try_acquire_lease(NOMBRE_LEASE, self.instancia, time.time(), self.ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Error intentando obtener el liderazgo: {e}")
+            self._cerrar_pg()
+            return False
+
+    def _renovar(self) -> bool:
+        """False sólo si otra instancia tiene el lock/lease; con la base de datos caída sigue siendo líder"""
+        try:
+            if db.is_postgresql():
+                sigue = self._renovar_pg()
+            else:
+                sigue = db.try_acquire_lease(NOMBRE_LEASE, self.instancia, time.time(), self.ttl)
+        except Exception as e:
+            if db.is_postgresql():
+                self._cerrar_pg()
+            if not self._sin_confirmar:
+                logger.warning(f"⚠️ No se pudo renovar el liderazgo ({e}): se mantiene mientras nadie más lo tenga")
+                self._sin_confirmar = True
+            return True
+        if sigue and self._sin_confirmar:
+            logger.info("🟢 Liderazgo confirmado de nuevo tras el corte de la base de datos")
+            self._sin_confirmar = False
+        return sigue
+
+    # ---- API ----
+
+    def esperar_liderazgo(self) -> None:
+        """Bloquea hasta ser líder; mientras tanto la instancia queda en espera"""
+        avisado = False
+        while not self._intentar():
+            if not avisado:
+                logger.info(f"🕐 Instancia {self.instancia} en espera: otra instancia está haciendo polling")
+                avisado = True
+            time.sleep(self.reintento)
+        self.es_lider = True
+        self.lider_desde = time.time()
+        logger.info(f"👑 Instancia {self.instancia} elegida líder de polling")
+
+    def guardar_marca(self) -> None:
+        """Persiste la marca de agua si ha avanzado desde la última vez"""
+        if self._marca is None:
+            return
+        valor = self._marca.marca()
+        if valor and valor != self._marca_guardada:
+            db.set_bot_state(CLAVE_ULTIMO_UPDATE, str(valor))
+            self._marca_guardada = valor
+
+    def mantener(self, marca: Optional[MarcaAguaUpdates], al_perder: Callable[[], None]) -> None:
+        """Renueva el liderazgo y guarda la marca de agua en un hilo en segundo plano"""
+        self._marca = marca
+
+        def _bucle():
+            intervalo = max(1.0, self.ttl / 3)
+            while not self._parar.wait(intervalo):
+                if not self._renovar():
+                    self.es_lider = False
+                    logger.error("💔 Otra instancia tiene el liderazgo, deteniendo el polling")
+                    al_perder()
+                    return
+                try:
+                    self.guardar_marca()
+                except Exception as e:
+                    logger.error(f"❌ Error guardando el último update_id: {e}")
+
+        self._hilo = threading.Thread(target=_bucle, name="liderazgo", daemon=True)
+        self._hilo.start()
+
+    def liberar(self) -> None:
+        """Guarda la marca final y suelta el lock para que otra instancia tome el relevo"""
+        self._parar.set()
+        if not self.es_lider:
+            return
+        try:
+            self.guardar_marca()
+        except Exception as e:
+            logger.error(f"❌ Error guardando el último update_id: {e}")
+        if db.is_postgresql():
+            self._cerrar_pg()
+        else:
+            db.release_lease(NOMBRE_LEASE, self.instancia)
+        self.es_lider = False
+        logger.info(f"👋 Instancia {self.instancia} liberó el liderazgo")
+
+    def metricas(self) -> dict:
+        return {
+            "instancia": self.instancia,
+            "es_lider": self.es_lider,
+            "lider_desde": self.lider_desde,
+            "intentos": self.intentos,
+            "sin_confirmar": self._sin_confirmar,
+            "backend": "advisory_lock" if db.is_postgresql() else "lease",
+            "ultimo_update_guardado": self._marca_guardada,
+            "marca_actual": self._marca.marca() if self._marca else None,
+        }
+
+def crear_eleccion_desde_config() -> EleccionLider:
+    """Crea la elección de líder con INSTANCE_ID y LEADER_LEASE_TTL"""
+    from config import Config
+
+    return EleccionLider(instancia=Config.INSTANCE_ID or None, ttl=Config.LEADER_LEASE_TTL)
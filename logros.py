@@ -0,0 +1,164 @@
+# logros.py
+"""
+Motor de logros dirigido por eventos de puntos.
+
+Cada vez que se otorgan puntos se emite un EventoPuntos. El motor lo
+traduce a incrementos de contadores por usuario (una fila pequeña por
+contador en achievement_counters, actualizada con un upsert atómico),
+y sólo evalúa los logros que dependen de algún contador que el evento
+ha tocado. Nunca se relee el historial de user_points.
+
+Tipos de contador:
+  total     - suma siempre (mensajes por hashtag)
+  distinct  - suma una vez por periodo (días distintos con actividad)
+  periodic  - se reinicia en cada periodo (retos completados esta semana)
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import db
+from handlers.palabras_clave import normalizar
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+DIAS_ACTIVOS = "dias_activos"
+RETOS_DIARIOS_SEMANA = "retos_diarios_semana"
+RETOS_SEMANALES_SEMANA = "retos_semanales_semana"
+
+# Tipos de EventoPuntos
+TIPO_HASHTAG = "hashtag"
+TIPO_RETO_DIARIO = "reto_diario"
+TIPO_RETO_SEMANAL = "reto_semanal"
+TIPO_JUEGO = "juego"
+
+def contador_hashtag(hashtag: str) -> str:
+    """Nombre del contador de un hashtag ('#Crítica' -> 'hashtag:critica')"""
+    return f"hashtag:{normalizar(hashtag.lstrip('#'))}"
+
+def _modo(contador: str) -> str:
+    if contador == DIAS_ACTIVOS:
+        return "distinct"
+    if contador in (RETOS_DIARIOS_SEMANA, RETOS_SEMANALES_SEMANA):
+        return "periodic"
+    return "total"
+
+def _periodo(contador: str, instante: datetime) -> int:
+    if contador == DIAS_ACTIVOS:
+        return instante.date().toordinal()
+    if contador in (RETOS_DIARIOS_SEMANA, RETOS_SEMANALES_SEMANA):
+        año, semana, _ = instante.isocalendar()
+        return año * 100 + semana
+    return 0
+
+class EventoPuntos(NamedTuple):
+    user_id: int
+    chat_id: int
+    tipo: str                          # TIPO_HASHTAG, TIPO_RETO_DIARIO, ...
+    hashtags: Tuple[str, ...] = ()
+    instante: Optional[datetime] = None
+    puntos: int = 0
+    username: Optional[str] = None
+
+    def contadores(self) -> List[str]:
+        """Contadores que este evento incrementa"""
+        nombres = [DIAS_ACTIVOS]
+        nombres.extend(dict.fromkeys(contador_hashtag(h) for h in self.hashtags))
+        if self.tipo == TIPO_RETO_DIARIO:
+            nombres.append(RETOS_DIARIOS_SEMANA)
+        elif self.tipo == TIPO_RETO_SEMANAL:
+            nombres.append(RETOS_SEMANALES_SEMANA)
+        return nombres
+
+class MotorLogros:
+    """Evalúa los logros afectados por cada evento y guarda los desbloqueados"""
+
+    def __init__(self, logros: Iterable[dict], usuarios_en_cache: int = 10_000):
+        self.logros = list(logros)
+        # contador -> logros que lo leen: un evento sólo evalúa los de sus contadores
+        self._por_contador: Dict[str, List[dict]] = {}
+        for logro in self.logros:
+            for contador in logro["contadores"]:
+                self._por_contador.setdefault(contador, []).append(logro)
+        self.usuarios_en_cache = usuarios_en_cache
+        # user_id -> ids de logros ya desbloqueados (una consulta la primera vez)
+        self._desbloqueados: "OrderedDict[int, Set[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.estadisticas = {"eventos": 0, "evaluaciones": 0, "desbloqueos": 0, "errores": 0}
+
+    def _ya_desbloqueados(self, user_id: int) -> Set[int]:
+        with self._lock:
+            ids = self._desbloqueados.get(user_id)
+            if ids is not None:
+                self._desbloqueados.move_to_end(user_id)
+                return ids
+        ids = db.get_user_achievements(user_id)
+        with self._lock:
+            self._desbloqueados[user_id] = ids
+            while len(self._desbloqueados) > self.usuarios_en_cache:
+                self._desbloqueados.popitem(last=False)
+        return ids
+
+    def procesar(self, evento: EventoPuntos) -> List[dict]:
+        """Actualiza los contadores del evento y devuelve los logros recién desbloqueados"""
+        self.estadisticas["eventos"] += 1
+        instante = evento.instante or datetime.now()
+        try:
+            contadores = evento.contadores()
+            valores = db.bump_achievement_counters(
+                evento.user_id, [(c, _modo(c), _periodo(c, instante)) for c in contadores]
+            )
+
+            ya = self._ya_desbloqueados(evento.user_id)
+            candidatos = {
+                logro["id"]: logro
+                for contador in contadores
+                for logro in self._por_contador.get(contador, ())
+                if logro["id"] not in ya
+            }
+            if not candidatos:
+                return []
+
+            # Otros contadores que leen los candidatos (p. ej. reto semanal + diarios)
+            faltan = {c for logro in candidatos.values() for c in logro["contadores"]} - valores.keys()
+            for contador, (valor, periodo) in db.get_achievement_counters(evento.user_id, faltan).items():
+                vigente = _modo(contador) != "periodic" or periodo == _periodo(contador, instante)
+                valores[contador] = valor if vigente else 0
+
+            nuevos = []
+            for logro in candidatos.values():
+                self.estadisticas["evaluaciones"] += 1
+                if logro["trigger"](_Contadores(valores)):
+                    # La clave única decide: si otro proceso ya lo guardó no se anuncia dos veces
+                    if db.add_achievement(evento.user_id, logro["id"], evento.chat_id):
+                        nuevos.append(logro)
+                    ya.add(logro["id"])
+            self.estadisticas["desbloqueos"] += len(nuevos)
+            return nuevos
+        except Exception as e:
+            self.estadisticas["errores"] += 1
+            logger.error(f"❌ Error procesando logros del usuario {evento.user_id}: {e}")
+            return []
+
+    def metricas(self) -> dict:
+        return {
+            "logros": len(self.logros),
+            "contadores_indexados": len(self._por_contador),
+            "usuarios_en_cache": len(self._desbloqueados),
+            **self.estadisticas,
+        }
+
+class _Contadores(dict):
+    """Valores de contadores para los triggers; los que no existen valen 0"""
+
+    def __missing__(self, clave):
+        return 0
+
+def crear_motor_logros(logros: Iterable[dict]) -> MotorLogros:
+    motor = MotorLogros(logros)
+    registrar_fuente("logros", motor.metricas)
+    return motor
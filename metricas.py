@@ -0,0 +1,29 @@
+# metricas.py
+"""
+Registro central de métricas del bot.
+
+Cada subsistema registra una función sin argumentos que devuelve un dict
+con su estado actual. El servidor de health check las expone en /metrics.
+"""
+
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_fuentes: Dict[str, Callable[[], dict]] = {}
+
+def registrar_fuente(nombre: str, funcion: Callable[[], dict]) -> None:
+    """Registra (o reemplaza) una fuente de métricas"""
+    _fuentes[nombre] = funcion
+
+def obtener_metricas() -> Dict[str, dict]:
+    """Recoge las métricas de todas las fuentes registradas"""
+    resultado = {}
+    for nombre, funcion in list(_fuentes.items()):
+        try:
+            resultado[nombre] = funcion()
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo métricas de {nombre}: {e}")
+            resultado[nombre] = {"error": str(e)}
+    return resultado
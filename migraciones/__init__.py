@@ -0,0 +1,214 @@
+# migraciones/__init__.py
+"""
+Migraciones versionadas del esquema.
+
+Cada archivo mNNNN_descripcion.py de este paquete es una migración con:
+  POSTGRESQL / SQLITE  lista de sentencias para cada dialecto
+  TRANSACCIONAL        False si no puede ir en una transacción (p. ej.
+                       CREATE INDEX CONCURRENTLY); por defecto True
+  aplicar(cursor, postgresql)  opcional, para migraciones de datos
+
+La tabla schema_version guarda las migraciones aplicadas. Al arrancar,
+migrar() hace una sola consulta (MAX(version)) y, si el esquema está al
+día, no ejecuta nada más. Las sentencias deben ser idempotentes (IF NOT
+EXISTS): si dos procesos migran a la vez, o una migración no
+transaccional se corta a medias, volver a aplicarla es seguro.
+
+Uso:
+    python3 -m migraciones            # aplica las pendientes
+    python3 -m migraciones --plan     # muestra lo que haría, sin ejecutar
+    python3 -m migraciones --sql      # esquema completo en SQL (PostgreSQL)
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+import textwrap
+import time
+from typing import List, NamedTuple, Optional
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa las migraciones en PostgreSQL
+CLAVE_LOCK_MIGRACIONES = 7_236_201
+
+_PATRON_ARCHIVO = re.compile(r"^m(\d{4})_(\w+)$")
+_PATRON_TABLA = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+# Por dialecto (clave: es PostgreSQL)
+_DDL_VERSION = {
+    True: """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    False: """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+}
+
+class Migracion(NamedTuple):
+    version: int
+    nombre: str
+    modulo: object
+
+    def sentencias(self, postgresql: bool) -> List[str]:
+        return list(getattr(self.modulo, "POSTGRESQL" if postgresql else "SQLITE", []))
+
+    @property
+    def transaccional(self) -> bool:
+        return getattr(self.modulo, "TRANSACCIONAL", True)
+
+    @property
+    def descripcion(self) -> str:
+        return (self.modulo.__doc__ or self.nombre).strip().splitlines()[0]
+
+def descubrir() -> List[Migracion]:
+    """Migraciones del paquete ordenadas por versión"""
+    migraciones = []
+    for info in pkgutil.iter_modules(__path__):
+        coincidencia = _PATRON_ARCHIVO.match(info.name)
+        if coincidencia:
+            modulo = importlib.import_module(f"{__name__}.{info.name}")
+            migraciones.append(Migracion(int(coincidencia.group(1)), coincidencia.group(2), modulo))
+    migraciones.sort(key=lambda m: m.version)
+    versiones = [m.version for m in migraciones]
+    if len(set(versiones)) != len(versiones):
+        raise RuntimeError(f"Versiones de migración duplicadas: {versiones}")
+    return migraciones
+
+def ultima_version() -> int:
+    migraciones = descubrir()
+    return migraciones[-1].version if migraciones else 0
+
+def version_actual() -> Optional[int]:
+    """Versión del esquema en la base de datos (None si nunca se migró)"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        fila = cursor.fetchone()
+        return fila[0] or 0
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+def pendientes(version: Optional[int] = None) -> List[Migracion]:
+    version = version_actual() if version is None else version
+    return [m for m in descubrir() if m.version > (version or 0)]
+
+def _registrar(cursor, migracion: Migracion, postgresql: bool) -> None:
+    if postgresql:
+        cursor.execute(
+            "INSERT INTO schema_version (version, name) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING",
+            (migracion.version, migracion.nombre)
+        )
+    else:
+        cursor.execute(
+            "INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)",
+            (migracion.version, migracion.nombre)
+        )
+
+def _aplicar(conn, migracion: Migracion, postgresql: bool) -> None:
+    cursor = conn.cursor()
+    try:
+        if not migracion.transaccional:
+            # Cada sentencia se confirma por separado (CONCURRENTLY lo exige)
+            conn.commit()
+            if postgresql:
+                conn.autocommit = True
+        for sentencia in migracion.sentencias(postgresql):
+            cursor.execute(sentencia)
+        if hasattr(migracion.modulo, "aplicar"):
+            migracion.modulo.aplicar(cursor, postgresql)
+        if postgresql:
+            conn.autocommit = False
+        _registrar(cursor, migracion, postgresql)
+        conn.commit()
+    except Exception:
+        if postgresql:
+            conn.autocommit = False
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def migrar(plan: bool = False, hasta: Optional[int] = None) -> List[Migracion]:
+    """Aplica (o con plan=True sólo lista) las migraciones pendientes"""
+    version = version_actual()
+    ultima = ultima_version()
+    objetivo = ultima if hasta is None else min(hasta, ultima)
+    if version is not None and version >= objetivo:
+        logger.debug(f"✅ Esquema al día (versión {version})")
+        return []
+
+    a_aplicar = [m for m in pendientes(version) if m.version <= objetivo]
+    if plan:
+        return a_aplicar
+
+    postgresql = db.is_postgresql()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        if postgresql:
+            # Otro proceso puede estar migrando: se espera y se recalcula lo pendiente
+            cursor.execute("SELECT pg_advisory_lock(%s)", (CLAVE_LOCK_MIGRACIONES,))
+        cursor.execute(_DDL_VERSION[postgresql])
+        conn.commit()
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        version = cursor.fetchone()[0] or 0
+        a_aplicar = [m for m in descubrir() if version < m.version <= objetivo]
+
+        for migracion in a_aplicar:
+            inicio = time.perf_counter()
+            logger.info(f"🔄 Migración {migracion.version:04d} {migracion.nombre}: {migracion.descripcion}")
+            _aplicar(conn, migracion, postgresql)
+            logger.info(f"✅ Migración {migracion.version:04d} aplicada en {time.perf_counter() - inicio:.2f}s")
+        return a_aplicar
+    except Exception as e:
+        logger.error(f"❌ Error aplicando migraciones: {e}")
+        raise
+    finally:
+        if postgresql:
+            try:
+                conn.autocommit = True
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_LOCK_MIGRACIONES,))
+            except Exception:
+                pass
+        cursor.close()
+        conn.close()
+
+def tablas() -> List[str]:
+    """Tablas que crean las migraciones (incluida schema_version)"""
+    nombres = []
+    for migracion in descubrir():
+        for sentencia in migracion.sentencias(True) + migracion.sentencias(False):
+            for nombre in _PATRON_TABLA.findall(sentencia):
+                if nombre not in nombres:
+                    nombres.append(nombre)
+    return nombres + ["schema_version"]
+
+def generar_sql(postgresql: bool = True) -> str:
+    """Esquema completo como script SQL, con el registro de versiones incluido"""
+    partes = [textwrap.dedent(_DDL_VERSION[postgresql]).strip() + ";"]
+    for migracion in descubrir():
+        partes.append(f"\n-- {migracion.version:04d} {migracion.nombre}: {migracion.descripcion}")
+        partes.extend(textwrap.dedent(s).strip() + ";" for s in migracion.sentencias(postgresql))
+        if hasattr(migracion.modulo, "aplicar"):
+            partes.append(f"-- (esta migración incluye pasos en Python: aplícala con python3 -m migraciones)")
+        partes.append(
+            f"INSERT INTO schema_version (version, name) VALUES ({migracion.version}, '{migracion.nombre}')"
+            + (" ON CONFLICT (version) DO NOTHING;" if postgresql else ";")
+        )
+    return "\n".join(partes) + "\n"
@@ -0,0 +1,45 @@
+# migraciones/__main__.py
+"""python3 -m migraciones [--plan] [--hasta N] [--sql] [--sqlite]"""
+
+import argparse
+import logging
+
+import db
+from migraciones import generar_sql, migrar, ultima_version, version_actual
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la base de datos")
+    parser.add_argument("--plan", action="store_true", help="Muestra las migraciones pendientes sin aplicarlas")
+    parser.add_argument("--hasta", type=int, help="Aplica sólo hasta esta versión")
+    parser.add_argument("--sql", action="store_true", help="Imprime el esquema completo en SQL")
+    parser.add_argument("--sqlite", action="store_true", help="Con --sql: dialecto SQLite")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    if args.sql:
+        print(generar_sql(postgresql=not args.sqlite), end="")
+        return
+
+    version = version_actual()
+    print(f"📦 Base de datos: {'PostgreSQL' if db.is_postgresql() else 'SQLite'}")
+    print(f"🔢 Versión actual: {'sin migrar' if version is None else version} / última: {ultima_version()}")
+
+    migraciones = migrar(plan=args.plan, hasta=args.hasta)
+    if not migraciones:
+        print("✅ Nada que aplicar")
+        return
+    if args.plan:
+        postgresql = db.is_postgresql()
+        for migracion in migraciones:
+            modo = "" if migracion.transaccional else " (sin transacción)"
+            print(f"\n➡️  {migracion.version:04d} {migracion.nombre}{modo}: {migracion.descripcion}")
+            for sentencia in migracion.sentencias(postgresql):
+                print("   " + " ".join(sentencia.split()))
+            if hasattr(migracion.modulo, "aplicar"):
+                print("   + pasos de datos en Python (aplicar)")
+    else:
+        print(f"✅ Aplicadas {len(migraciones)} migraciones")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# migraciones/m0001_esquema_inicial.py
+"""Esquema inicial: todas las tablas que creaba db.create_all_tables()"""
+
+# Con IF NOT EXISTS, una base de datos creada antes de las migraciones
+# queda simplemente marcada en la versión 1.
+
+POSTGRESQL = [
+    """
+    CREATE TABLE IF NOT EXISTS active_games (
+        chat_id BIGINT PRIMARY KEY,
+        juego TEXT,
+        respuesta TEXT,
+        pistas TEXT,
+        intentos INTEGER,
+        started_by BIGINT,
+        last_activity TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS active_trivias (
+        chat_id BIGINT PRIMARY KEY,
+        pregunta TEXT,
+        respuesta TEXT,
+        start_time DOUBLE PRECISION,
+        opciones TEXT,
+        message_id BIGINT,
+        inline_keyboard_message_id BIGINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS authorized_chats (
+        chat_id BIGINT PRIMARY KEY,
+        chat_title TEXT,
+        authorized_by BIGINT,
+        authorized_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'active'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS auth_requests (
+        id SERIAL PRIMARY KEY,
+        chat_id BIGINT,
+        chat_title TEXT,
+        requested_by BIGINT,
+        requester_username TEXT,
+        requested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'pending'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_points (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        username TEXT,
+        chat_name TEXT,
+        points_gained INTEGER NOT NULL,
+        reason TEXT,
+        message_id BIGINT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_ranking (
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        username TEXT,
+        chat_name TEXT,
+        total_points INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_config (
+        chat_id BIGINT PRIMARY KEY,
+        chat_name TEXT,
+        rankings_enabled BOOLEAN DEFAULT TRUE,
+        challenges_enabled BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS challenges (
+        id SERIAL PRIMARY KEY,
+        challenger_id BIGINT NOT NULL,
+        challengee_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        message_id BIGINT,
+        status TEXT DEFAULT 'pending',
+        type TEXT,
+        data TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rate_limit_state (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (scope, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_scoring (
+        chat_id BIGINT PRIMARY KEY,
+        overrides TEXT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS achievement_counters (
+        user_id BIGINT NOT NULL,
+        counter TEXT NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        period INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, counter)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_bitmaps (
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        base_day INTEGER NOT NULL,
+        bits BYTEA NOT NULL,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_achievements (
+        user_id BIGINT NOT NULL,
+        achievement_id INTEGER NOT NULL,
+        chat_id BIGINT,
+        unlocked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, achievement_id)
+    )
+    """,
+]
+
+SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS active_games (
+        chat_id INTEGER PRIMARY KEY,
+        juego TEXT,
+        respuesta TEXT,
+        pistas TEXT,
+        intentos INTEGER,
+        started_by INTEGER,
+        last_activity TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS active_trivias (
+        chat_id INTEGER PRIMARY KEY,
+        pregunta TEXT,
+        respuesta TEXT,
+        start_time REAL,
+        opciones TEXT,
+        message_id INTEGER,
+        inline_keyboard_message_id INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS authorized_chats (
+        chat_id INTEGER PRIMARY KEY,
+        chat_title TEXT,
+        authorized_by INTEGER,
+        authorized_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'active'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS auth_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        chat_title TEXT,
+        requested_by INTEGER,
+        requester_username TEXT,
+        requested_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'pending'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_points (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        username TEXT,
+        chat_name TEXT,
+        points_gained INTEGER NOT NULL,
+        reason TEXT,
+        message_id INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_ranking (
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        username TEXT,
+        chat_name TEXT,
+        total_points INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_config (
+        chat_id INTEGER PRIMARY KEY,
+        chat_name TEXT,
+        rankings_enabled INTEGER DEFAULT 1,
+        challenges_enabled INTEGER DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS challenges (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        challenger_id INTEGER NOT NULL,
+        challengee_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER,
+        status TEXT DEFAULT 'pending',
+        type TEXT,
+        data TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rate_limit_state (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (scope, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_scoring (
+        chat_id INTEGER PRIMARY KEY,
+        overrides TEXT NOT NULL,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS achievement_counters (
+        user_id INTEGER NOT NULL,
+        counter TEXT NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        period INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, counter)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_bitmaps (
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        base_day INTEGER NOT NULL,
+        bits BLOB NOT NULL,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_achievements (
+        user_id INTEGER NOT NULL,
+        achievement_id INTEGER NOT NULL,
+        chat_id INTEGER,
+        unlocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, achievement_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leader_lease (
+        name TEXT PRIMARY KEY,
+        holder TEXT,
+        expires_at REAL NOT NULL DEFAULT 0
+    )
+    """,
+]
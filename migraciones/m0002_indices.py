@@ -0,0 +1,22 @@
+# migraciones/m0002_indices.py
+"""Índices que sólo tenían las copias del esquema de los scripts de reset"""
+
+# CREATE INDEX CONCURRENTLY no bloquea las escrituras en la tabla, pero no
+# puede ir dentro de una transacción: cada sentencia se ejecuta por separado.
+TRANSACCIONAL = False
+
+POSTGRESQL = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_created_at ON user_points(created_at)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_ranking_total_points ON user_ranking(chat_id, total_points DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_requests_status ON auth_requests(status)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_challenges_status ON challenges(status)",
+]
+
+SQLITE = [
+    "CREATE INDEX IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_points_created_at ON user_points(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_user_ranking_total_points ON user_ranking(chat_id, total_points DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_auth_requests_status ON auth_requests(status)",
+    "CREATE INDEX IF NOT EXISTS idx_challenges_status ON challenges(status)",
+]
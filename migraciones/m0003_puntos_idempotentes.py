@@ -0,0 +1,54 @@
+# migraciones/m0003_puntos_idempotentes.py
+"""Un solo premio por (chat_id, message_id, reason) en user_points"""
+
+# Antes del índice único se eliminan los premios repetidos que ya haya
+# (updates reentregados, reintentos), conservando el primero, y se restan
+# sus puntos de user_ranking para que los totales sigan cuadrando. En una
+# base de datos nueva estas sentencias no hacen nada. Las filas sin
+# message_id o sin reason no se deduplican: NULL nunca choca en el índice.
+
+POSTGRESQL = [
+    """
+    WITH repetidos AS (
+        DELETE FROM user_points p
+        USING user_points q
+        WHERE p.chat_id = q.chat_id AND p.message_id = q.message_id
+          AND p.reason = q.reason AND p.id > q.id
+        RETURNING p.user_id, p.chat_id, p.points_gained
+    ), por_usuario AS (
+        SELECT user_id, chat_id, SUM(points_gained) AS puntos FROM repetidos GROUP BY user_id, chat_id
+    )
+    UPDATE user_ranking r SET total_points = r.total_points - d.puntos
+    FROM por_usuario d
+    WHERE r.user_id = d.user_id AND r.chat_id = d.chat_id
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_user_points_award
+    ON user_points(chat_id, message_id, reason)
+    """,
+]
+
+SQLITE = [
+    """
+    UPDATE user_ranking SET total_points = total_points - (
+        SELECT COALESCE(SUM(p.points_gained), 0) FROM user_points p
+        WHERE p.user_id = user_ranking.user_id AND p.chat_id = user_ranking.chat_id
+          AND EXISTS (
+            SELECT 1 FROM user_points q
+            WHERE q.chat_id = p.chat_id AND q.message_id = p.message_id
+              AND q.reason = p.reason AND q.id < p.id
+          )
+    )
+    """,
+    """
+    DELETE FROM user_points WHERE EXISTS (
+        SELECT 1 FROM user_points q
+        WHERE q.chat_id = user_points.chat_id AND q.message_id = user_points.message_id
+          AND q.reason = user_points.reason AND q.id < user_points.id
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_user_points_award
+    ON user_points(chat_id, message_id, reason)
+    """,
+]
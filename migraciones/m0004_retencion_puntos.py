@@ -0,0 +1,113 @@
+# migraciones/m0004_retencion_puntos.py
+"""Resumen mensual de user_points y, en PostgreSQL, user_points particionada por mes"""
+
+# user_points_summary guarda lo que queda de los eventos compactados
+# (retencion.py): puntos y número de eventos por usuario, chat, mes y
+# razón. Para cada (user_id, chat_id), user_points + user_points_summary
+# sigue sumando lo mismo que user_ranking.
+#
+# En PostgreSQL, aplicar() convierte user_points en una tabla particionada
+# por mes de created_at (copiándola una vez), para que la compactación
+# despache un mes entero soltando su partición en vez de borrar fila a
+# fila. Un índice único en una tabla particionada tiene que incluir
+# created_at, así que la idempotencia de los premios (m0003) pasa a
+# point_awards: (chat_id, message_id, reason) de cada premio reciente.
+# En SQLite no hay particiones y el índice único de m0003 se queda.
+
+from datetime import datetime
+
+import db
+
+POSTGRESQL = [
+    """
+    CREATE TABLE IF NOT EXISTS user_points_summary (
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        period DATE NOT NULL,
+        reason TEXT NOT NULL DEFAULT '',
+        points BIGINT NOT NULL,
+        entries INTEGER NOT NULL,
+        PRIMARY KEY (user_id, chat_id, period, reason)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_points_summary_chat ON user_points_summary(chat_id)",
+    """
+    CREATE TABLE IF NOT EXISTS point_awards (
+        chat_id BIGINT NOT NULL,
+        message_id BIGINT,
+        reason TEXT,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (chat_id, message_id, reason)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_point_awards_created_at ON point_awards(created_at)",
+    """
+    INSERT INTO point_awards (chat_id, message_id, reason, created_at)
+    SELECT chat_id, message_id, reason, COALESCE(created_at, CURRENT_TIMESTAMP) FROM user_points
+    ON CONFLICT (chat_id, message_id, reason) DO NOTHING
+    """,
+    "DROP INDEX IF EXISTS uq_user_points_award",
+]
+
+SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS user_points_summary (
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        reason TEXT NOT NULL DEFAULT '',
+        points INTEGER NOT NULL,
+        entries INTEGER NOT NULL,
+        PRIMARY KEY (user_id, chat_id, period, reason)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_points_summary_chat ON user_points_summary(chat_id)",
+]
+
+def aplicar(cursor, postgresql: bool) -> None:
+    """Convierte user_points en tabla particionada por mes (sólo PostgreSQL)"""
+    if not postgresql or db._points_partitioned(cursor):
+        return
+
+    cursor.execute("ALTER TABLE user_points RENAME TO user_points_sin_particionar")
+    # Los nombres de índice son únicos en el esquema: la nueva tabla necesita user_points_pkey
+    cursor.execute("ALTER TABLE user_points_sin_particionar RENAME CONSTRAINT user_points_pkey TO user_points_sin_particionar_pkey")
+    # La secuencia de id sigue: si perteneciera a la tabla vieja, se borraría con ella
+    cursor.execute("ALTER SEQUENCE user_points_id_seq OWNED BY NONE")
+    cursor.execute(
+        """CREATE TABLE user_points (
+               id BIGINT NOT NULL DEFAULT nextval('user_points_id_seq'),
+               user_id BIGINT NOT NULL,
+               chat_id BIGINT NOT NULL,
+               username TEXT,
+               chat_name TEXT,
+               points_gained INTEGER NOT NULL,
+               reason TEXT,
+               message_id BIGINT,
+               created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY (id, created_at)
+           ) PARTITION BY RANGE (created_at)"""
+    )
+    cursor.execute("ALTER SEQUENCE user_points_id_seq OWNED BY user_points.id")
+    cursor.execute("CREATE TABLE user_points_default PARTITION OF user_points DEFAULT")
+
+    # Particiones antes de copiar: con filas del mes en la DEFAULT ya no se podrían crear
+    # (con límites de fecha: m0007 pasa created_at a milisegundos y rehace las particiones)
+    cursor.execute("SELECT MIN(created_at) FROM user_points_sin_particionar")
+    mes = db._month_start(cursor.fetchone()[0] or datetime.now())
+    while mes <= db._month_start(datetime.now(), 2):
+        cursor.execute(
+            f"CREATE TABLE user_points_p{mes:%Y%m} PARTITION OF user_points FOR VALUES FROM (%s) TO (%s)",
+            (f"{mes:%Y-%m-%d}", f"{db._month_start(mes, 1):%Y-%m-%d}")
+        )
+        mes = db._month_start(mes, 1)
+
+    cursor.execute(
+        """INSERT INTO user_points (id, user_id, chat_id, username, chat_name, points_gained, reason, message_id, created_at)
+           SELECT id, user_id, chat_id, username, chat_name, points_gained, reason, message_id,
+                  COALESCE(created_at, CURRENT_TIMESTAMP)
+           FROM user_points_sin_particionar"""
+    )
+    cursor.execute("DROP TABLE user_points_sin_particionar")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_points_created_at ON user_points(created_at)")
@@ -0,0 +1,156 @@
+# migraciones/m0005_dimensiones.py
+"""Tablas users, chats y reason_codes, y reason_id en los eventos de puntos"""
+
+# Primera mitad de la normalización (la segunda, m0006, quita las columnas
+# de texto): crea las dimensiones, las rellena desde user_ranking y los
+# eventos, y reescribe reason_id en user_points por lotes de id. No es
+# transaccional para que cada lote se confirme por separado; todos los
+# pasos se pueden repetir si la migración se corta a medias (sólo se
+# reescriben las filas con reason_id NULL).
+
+import logging
+
+from dimensiones import categoria_razon
+
+logger = logging.getLogger(__name__)
+
+TRANSACCIONAL = False
+
+# Filas de user_points reescritas por lote
+LOTE = 5000
+
+POSTGRESQL = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id BIGINT PRIMARY KEY,
+        chat_name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reason_codes (
+        id SERIAL PRIMARY KEY,
+        reason TEXT NOT NULL UNIQUE,
+        category SMALLINT NOT NULL DEFAULT 0
+    )
+    """,
+    "ALTER TABLE user_points ADD COLUMN IF NOT EXISTS reason_id INTEGER",
+    "ALTER TABLE user_points_summary ADD COLUMN IF NOT EXISTS reason_id INTEGER",
+    "ALTER TABLE point_awards ADD COLUMN IF NOT EXISTS reason_id INTEGER",
+]
+
+SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id INTEGER PRIMARY KEY,
+        chat_name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reason_codes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reason TEXT NOT NULL UNIQUE,
+        category INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+def _columnas(cursor, tabla: str) -> set:
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    return {fila[1] for fila in cursor.fetchall()}
+
+def aplicar(cursor, postgresql: bool) -> None:
+    """Rellena las dimensiones y reason_id por lotes"""
+    conn = cursor.connection
+    p = "%s" if postgresql else "?"
+
+    if not postgresql:
+        # SQLite no tiene ADD COLUMN IF NOT EXISTS
+        for tabla in ("user_points", "user_points_summary"):
+            if "reason_id" not in _columnas(cursor, tabla):
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN reason_id INTEGER")
+        conn.commit()
+
+    # Códigos de razón: los textos distintos que ya existen
+    consultas = [
+        "SELECT DISTINCT COALESCE(reason, '') FROM user_points WHERE reason_id IS NULL",
+        "SELECT DISTINCT reason FROM user_points_summary WHERE reason_id IS NULL",
+    ]
+    if postgresql:
+        consultas.append("SELECT DISTINCT COALESCE(reason, '') FROM point_awards WHERE reason_id IS NULL")
+    razones = set()
+    for consulta in consultas:
+        cursor.execute(consulta)
+        razones.update(fila[0] for fila in cursor.fetchall())
+    conflicto = " ON CONFLICT (reason) DO NOTHING" if postgresql else ""
+    cursor.executemany(
+        f"INSERT {'' if postgresql else 'OR IGNORE '}INTO reason_codes (reason, category) VALUES ({p}, {p}){conflicto}",
+        [(razon, categoria_razon(razon)) for razon in sorted(razones)]
+    )
+
+    # Usuarios y chats: el nombre que tenga user_ranking
+    if postgresql:
+        cursor.execute(
+            """INSERT INTO users (user_id, username)
+               SELECT DISTINCT ON (user_id) user_id, username FROM user_ranking
+               ORDER BY user_id, total_points DESC
+               ON CONFLICT (user_id) DO NOTHING"""
+        )
+        cursor.execute(
+            """INSERT INTO chats (chat_id, chat_name)
+               SELECT DISTINCT ON (chat_id) chat_id, chat_name FROM user_ranking
+               ORDER BY chat_id, total_points DESC
+               ON CONFLICT (chat_id) DO NOTHING"""
+        )
+    else:
+        cursor.execute("INSERT OR IGNORE INTO users (user_id, username) SELECT user_id, username FROM user_ranking GROUP BY user_id")
+        cursor.execute("INSERT OR IGNORE INTO chats (chat_id, chat_name) SELECT chat_id, chat_name FROM user_ranking GROUP BY chat_id")
+    conn.commit()
+
+    # reason_id de los eventos, por lotes de id
+    cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM user_points WHERE reason_id IS NULL")
+    minimo, maximo, pendientes = cursor.fetchone()
+    if pendientes:
+        logger.info(f"🔄 Reescribiendo reason_id de {pendientes} eventos en lotes de {LOTE}")
+        hechos = 0
+        for desde in range(minimo, maximo + 1, LOTE):
+            if postgresql:
+                cursor.execute(
+                    """UPDATE user_points p SET reason_id = rc.id FROM reason_codes rc
+                       WHERE rc.reason = COALESCE(p.reason, '') AND p.id >= %s AND p.id < %s AND p.reason_id IS NULL""",
+                    (desde, desde + LOTE)
+                )
+            else:
+                cursor.execute(
+                    """UPDATE user_points SET reason_id = (
+                           SELECT id FROM reason_codes WHERE reason = COALESCE(user_points.reason, '')
+                       )
+                       WHERE id >= ? AND id < ? AND reason_id IS NULL""",
+                    (desde, desde + LOTE)
+                )
+            hechos += cursor.rowcount
+            conn.commit()
+            logger.info(f"🔄 reason_id: {hechos}/{pendientes} eventos ({100 * hechos // pendientes}%)")
+
+    cursor.execute(
+        """UPDATE user_points_summary SET reason_id = (
+                SELECT id FROM reason_codes WHERE reason = user_points_summary.reason
+            ) WHERE reason_id IS NULL"""
+    )
+    if postgresql:
+        cursor.execute(
+            """UPDATE point_awards a SET reason_id = rc.id FROM reason_codes rc
+               WHERE rc.reason = COALESCE(a.reason, '') AND a.reason_id IS NULL"""
+        )
+    conn.commit()
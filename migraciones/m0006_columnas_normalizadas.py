@@ -0,0 +1,48 @@
+# migraciones/m0006_columnas_normalizadas.py
+"""Quita username, chat_name y reason de los eventos y del ranking (ya están en las dimensiones)"""
+
+# Segunda mitad de m0005: con reason_id ya relleno, la unicidad de los
+# premios pasa a (chat_id, message_id, reason_id) y se borran las columnas
+# de texto. En SQLite user_points_summary se reconstruye porque no se puede
+# cambiar su clave primaria; desde el INSERT (el primer DML) todo va en la
+# misma transacción, y si se corta antes la tabla nueva se vuelve a crear.
+
+POSTGRESQL = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_point_awards_code ON point_awards(chat_id, message_id, reason_id)",
+    "ALTER TABLE point_awards DROP COLUMN IF EXISTS reason",
+    "ALTER TABLE user_points_summary DROP CONSTRAINT IF EXISTS user_points_summary_pkey",
+    "ALTER TABLE user_points_summary DROP COLUMN IF EXISTS reason",
+    "ALTER TABLE user_points_summary ALTER COLUMN reason_id SET NOT NULL",
+    "ALTER TABLE user_points_summary ADD PRIMARY KEY (user_id, chat_id, period, reason_id)",
+    "ALTER TABLE user_points DROP COLUMN IF EXISTS username, DROP COLUMN IF EXISTS chat_name, DROP COLUMN IF EXISTS reason",
+    "ALTER TABLE user_ranking DROP COLUMN IF EXISTS username, DROP COLUMN IF EXISTS chat_name",
+]
+
+SQLITE = [
+    "DROP TABLE IF EXISTS user_points_summary_nueva",
+    """
+    CREATE TABLE user_points_summary_nueva (
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        reason_id INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        entries INTEGER NOT NULL,
+        PRIMARY KEY (user_id, chat_id, period, reason_id)
+    )
+    """,
+    """
+    INSERT INTO user_points_summary_nueva (user_id, chat_id, period, reason_id, points, entries)
+    SELECT user_id, chat_id, period, reason_id, points, entries FROM user_points_summary
+    """,
+    "DROP TABLE user_points_summary",
+    "ALTER TABLE user_points_summary_nueva RENAME TO user_points_summary",
+    "CREATE INDEX IF NOT EXISTS idx_user_points_summary_chat ON user_points_summary(chat_id)",
+    "DROP INDEX IF EXISTS uq_user_points_award",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_points_award ON user_points(chat_id, message_id, reason_id)",
+    "ALTER TABLE user_points DROP COLUMN username",
+    "ALTER TABLE user_points DROP COLUMN chat_name",
+    "ALTER TABLE user_points DROP COLUMN reason",
+    "ALTER TABLE user_ranking DROP COLUMN username",
+    "ALTER TABLE user_ranking DROP COLUMN chat_name",
+]
@@ -0,0 +1,201 @@
+# migraciones/m0007_tiempos_epoch_ms.py
+"""Todas las columnas de tiempo pasan a milisegundos desde epoch (BIGINT)"""
+
+# Hasta ahora cada tabla guardaba el tiempo a su manera: TIMESTAMPTZ en
+# PostgreSQL, y en SQLite texto ISO (hora local desde Python, UTC desde
+# CURRENT_TIMESTAMP) o segundos REAL. Las expiraciones y los cortes de la
+# retención comparaban texto, o parseaban fechas en Python. Ahora todas
+# son enteros (db.epoch_ms) en los dos dialectos, con el mismo valor por
+# defecto, y las que se filtran por rango tienen índice.
+#
+# PostgreSQL cambia el tipo en su sitio (ALTER ... TYPE BIGINT USING). La
+# user_points particionada de m0004 no puede cambiar el tipo de su clave
+# de partición: aplicar() la rehace con particiones en milisegundos,
+# copiándola una vez. SQLite no cambia tipos de columna: cada tabla se
+# reconstruye (como user_points_summary en m0006), convirtiendo el texto
+# ISO que tiene "T" como hora local y el resto como UTC.
+
+import db
+
+AHORA_MS_PG = "(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP) * 1000)::BIGINT"
+AHORA_MS_SQLITE = "(CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))"
+
+def _a_ms_pg(tabla: str, columna: str, defecto: bool = True) -> str:
+    sentencia = (
+        f"ALTER TABLE {tabla} ALTER COLUMN {columna} DROP DEFAULT, "
+        f"ALTER COLUMN {columna} TYPE BIGINT USING (EXTRACT(EPOCH FROM {columna}) * 1000)::BIGINT"
+    )
+    return sentencia + (f", ALTER COLUMN {columna} SET DEFAULT {AHORA_MS_PG}" if defecto else "")
+
+def _texto_a_ms(columna: str) -> str:
+    return (f"CAST(ROUND((CASE WHEN instr({columna}, 'T') > 0 THEN julianday({columna}, 'utc') "
+            f"ELSE julianday({columna}) END - 2440587.5) * 86400000) AS INTEGER)")
+
+def _segundos_a_ms(columna: str) -> str:
+    return f"CAST(ROUND({columna} * 1000) AS INTEGER)"
+
+def _reconstruir(tabla: str, columnas: str, copia: str, indices=()) -> list:
+    """Sentencias SQLite que rehacen `tabla` con `columnas` copiando sus filas con `copia`"""
+    return [
+        f"DROP TABLE IF EXISTS {tabla}_nueva",
+        f"CREATE TABLE {tabla}_nueva ({columnas})",
+        f"INSERT INTO {tabla}_nueva SELECT {copia} FROM {tabla}",
+        f"DROP TABLE {tabla}",
+        f"ALTER TABLE {tabla}_nueva RENAME TO {tabla}",
+        *indices,
+    ]
+
+POSTGRESQL = [
+    _a_ms_pg("active_games", "last_activity"),
+    "ALTER TABLE active_trivias ALTER COLUMN start_time TYPE BIGINT USING (start_time * 1000)::BIGINT",
+    _a_ms_pg("authorized_chats", "authorized_at"),
+    _a_ms_pg("auth_requests", "requested_at"),
+    _a_ms_pg("challenges", "created_at"),
+    _a_ms_pg("rate_limit_state", "updated_at"),
+    _a_ms_pg("bot_state", "updated_at"),
+    _a_ms_pg("chat_scoring", "updated_at"),
+    _a_ms_pg("user_achievements", "unlocked_at"),
+    _a_ms_pg("point_awards", "created_at"),
+    # Sin particionar (esquema creado con el script SQL); la particionada la rehace aplicar()
+    f"""
+    DO $$
+    BEGIN
+        IF (SELECT relkind FROM pg_class WHERE oid = 'user_points'::regclass) = 'r' THEN
+            {_a_ms_pg("user_points", "created_at")};
+        END IF;
+    END
+    $$
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_active_games_last_activity ON active_games(last_activity)",
+    "CREATE INDEX IF NOT EXISTS idx_active_trivias_start_time ON active_trivias(start_time)",
+    "CREATE INDEX IF NOT EXISTS idx_auth_requests_requested_at ON auth_requests(requested_at)",
+]
+
+SQLITE = [
+    *_reconstruir(
+        "active_games",
+        """chat_id INTEGER PRIMARY KEY, juego TEXT, respuesta TEXT, pistas TEXT,
+           intentos INTEGER, started_by INTEGER, last_activity INTEGER""",
+        f"chat_id, juego, respuesta, pistas, intentos, started_by, {_texto_a_ms('last_activity')}",
+        ["CREATE INDEX IF NOT EXISTS idx_active_games_last_activity ON active_games(last_activity)"],
+    ),
+    *_reconstruir(
+        "active_trivias",
+        """chat_id INTEGER PRIMARY KEY, pregunta TEXT, respuesta TEXT, start_time INTEGER,
+           opciones TEXT, message_id INTEGER, inline_keyboard_message_id INTEGER""",
+        f"chat_id, pregunta, respuesta, {_segundos_a_ms('start_time')}, opciones, message_id, inline_keyboard_message_id",
+        ["CREATE INDEX IF NOT EXISTS idx_active_trivias_start_time ON active_trivias(start_time)"],
+    ),
+    *_reconstruir(
+        "authorized_chats",
+        f"""chat_id INTEGER PRIMARY KEY, chat_title TEXT, authorized_by INTEGER,
+            authorized_at INTEGER DEFAULT {AHORA_MS_SQLITE}, status TEXT DEFAULT 'active'""",
+        f"chat_id, chat_title, authorized_by, {_texto_a_ms('authorized_at')}, status",
+    ),
+    *_reconstruir(
+        "auth_requests",
+        f"""id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, chat_title TEXT, requested_by INTEGER,
+            requester_username TEXT, requested_at INTEGER DEFAULT {AHORA_MS_SQLITE}, status TEXT DEFAULT 'pending'""",
+        f"id, chat_id, chat_title, requested_by, requester_username, {_texto_a_ms('requested_at')}, status",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_auth_requests_status ON auth_requests(status)",
+            "CREATE INDEX IF NOT EXISTS idx_auth_requests_requested_at ON auth_requests(requested_at)",
+        ],
+    ),
+    *_reconstruir(
+        "user_points",
+        f"""id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL,
+            points_gained INTEGER NOT NULL, reason_id INTEGER, message_id INTEGER,
+            created_at INTEGER DEFAULT {AHORA_MS_SQLITE}""",
+        f"id, user_id, chat_id, points_gained, reason_id, message_id, {_texto_a_ms('created_at')}",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_points_created_at ON user_points(created_at)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_points_award ON user_points(chat_id, message_id, reason_id)",
+        ],
+    ),
+    *_reconstruir(
+        "challenges",
+        f"""id INTEGER PRIMARY KEY AUTOINCREMENT, challenger_id INTEGER NOT NULL, challengee_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL, message_id INTEGER, status TEXT DEFAULT 'pending', type TEXT, data TEXT,
+            created_at INTEGER DEFAULT {AHORA_MS_SQLITE}""",
+        f"id, challenger_id, challengee_id, chat_id, message_id, status, type, data, {_texto_a_ms('created_at')}",
+        ["CREATE INDEX IF NOT EXISTS idx_challenges_status ON challenges(status)"],
+    ),
+    *_reconstruir(
+        "rate_limit_state",
+        f"""scope TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL,
+            updated_at INTEGER DEFAULT {AHORA_MS_SQLITE}, PRIMARY KEY (scope, key)""",
+        f"scope, key, data, {_texto_a_ms('updated_at')}",
+    ),
+    *_reconstruir(
+        "bot_state",
+        f"key TEXT PRIMARY KEY, value TEXT, updated_at INTEGER DEFAULT {AHORA_MS_SQLITE}",
+        f"key, value, {_texto_a_ms('updated_at')}",
+    ),
+    *_reconstruir(
+        "chat_scoring",
+        f"chat_id INTEGER PRIMARY KEY, overrides TEXT NOT NULL, updated_at INTEGER DEFAULT {AHORA_MS_SQLITE}",
+        f"chat_id, overrides, {_texto_a_ms('updated_at')}",
+    ),
+    *_reconstruir(
+        "user_achievements",
+        f"""user_id INTEGER NOT NULL, achievement_id INTEGER NOT NULL, chat_id INTEGER,
+            unlocked_at INTEGER DEFAULT {AHORA_MS_SQLITE}, PRIMARY KEY (user_id, achievement_id)""",
+        f"user_id, achievement_id, chat_id, {_texto_a_ms('unlocked_at')}",
+    ),
+    *_reconstruir(
+        "leader_lease",
+        "name TEXT PRIMARY KEY, holder TEXT, expires_at INTEGER NOT NULL DEFAULT 0",
+        f"name, holder, {_segundos_a_ms('expires_at')}",
+    ),
+]
+
+def aplicar(cursor, postgresql: bool) -> None:
+    """Rehace la user_points particionada con created_at en milisegundos (sólo PostgreSQL)"""
+    if not postgresql or not db._points_partitioned(cursor):
+        return
+    cursor.execute(
+        """SELECT data_type FROM information_schema.columns
+           WHERE table_name = 'user_points' AND column_name = 'created_at'"""
+    )
+    if cursor.fetchone()[0] == "bigint":
+        return
+
+    # Las particiones viejas dejan libres sus nombres para las nuevas
+    cursor.execute(
+        """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'user_points'::regclass"""
+    )
+    for (nombre,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {nombre} RENAME TO {nombre}_anterior")
+    cursor.execute("ALTER TABLE user_points RENAME TO user_points_anterior")
+    cursor.execute("ALTER TABLE user_points_anterior RENAME CONSTRAINT user_points_pkey TO user_points_anterior_pkey")
+    cursor.execute("ALTER SEQUENCE user_points_id_seq OWNED BY NONE")
+    cursor.execute(
+        f"""CREATE TABLE user_points (
+                id BIGINT NOT NULL DEFAULT nextval('user_points_id_seq'),
+                user_id BIGINT NOT NULL,
+                chat_id BIGINT NOT NULL,
+                points_gained INTEGER NOT NULL,
+                reason_id INTEGER,
+                message_id BIGINT,
+                created_at BIGINT NOT NULL DEFAULT {AHORA_MS_PG},
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)"""
+    )
+    cursor.execute("ALTER SEQUENCE user_points_id_seq OWNED BY user_points.id")
+    cursor.execute("CREATE TABLE user_points_default PARTITION OF user_points DEFAULT")
+
+    cursor.execute("SELECT MIN(created_at) FROM user_points_anterior")
+    db.ensure_point_partitions(cursor, desde=cursor.fetchone()[0])
+
+    cursor.execute(
+        """INSERT INTO user_points (id, user_id, chat_id, points_gained, reason_id, message_id, created_at)
+           SELECT id, user_id, chat_id, points_gained, reason_id, message_id,
+                  (EXTRACT(EPOCH FROM created_at) * 1000)::BIGINT
+           FROM user_points_anterior"""
+    )
+    cursor.execute("DROP TABLE user_points_anterior")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_points_user_chat ON user_points(user_id, chat_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_points_created_at ON user_points(created_at)")
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# multiproceso.py
+"""
+Modo multiproceso: escalado horizontal del bot en una sola máquina.
+
+Un proceso receptor recibe el webhook de Telegram y reparte cada update
+entre N workers según un hash del chat_id (colas de multiprocessing).
+Cada worker es una Application completa que sólo ve sus chats, así que
+el estado en memoria (active_games, active_trivias, cachés de spam, cola
+de salida) sigue siendo local y sin locks.
+
+Recuperación tras reiniciar un worker:
+- Juegos y trivias: ya se persisten en la DB; el worker carga sólo los de su shard.
+- Ventanas de spam de hashtags: se guardan en rate_limit_state cada
+  INTERVALO_SNAPSHOT segundos y al parar, por shard.
+- Updates: los que siguen en la cola del worker los procesa el relanzado.
+  Los que el worker ya había sacado de la cola y no había terminado se
+  pierden si muere (Telegram ya recibió el 200 y no los reenvía). Para
+  acotar esa ventana cada worker saca como mucho MAX_EN_CURSO updates a
+  la vez; el resto espera en la cola.
+
+Uso:
+    BOT_WORKERS=4 python3 multiproceso.py
+    python3 multiproceso.py --workers 4 --puerto 8443
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tipos de update que traen un chat y tipos que sólo traen un usuario
+CLAVES_CON_CHAT = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "my_chat_member", "chat_member", "chat_join_request",
+)
+CLAVES_CON_USUARIO = (
+    "inline_query", "chosen_inline_result", "shipping_query",
+    "pre_checkout_query", "poll_answer",
+)
+
+INTERVALO_SNAPSHOT = 30  # segundos entre copias del estado de rate limiting
+INTERVALO_METRICAS = 15  # segundos entre informes de métricas de cada worker
+MAX_EN_CURSO = 64  # updates sacados de la cola y sin terminar por worker
+FIN = None  # marca de fin en la cola de un worker
+
+def shard_de_chat(chat_id: int, total: int) -> int:
+    """Worker al que pertenece un chat (estable entre reinicios)"""
+    return zlib.crc32(str(chat_id).encode()) % total
+
+def chat_de_update(datos: dict) -> Optional[int]:
+    """Extrae el chat_id (o, si no hay chat, el user_id) del JSON de un update"""
+    for clave in CLAVES_CON_CHAT:
+        if clave in datos:
+            return datos[clave].get("chat", {}).get("id")
+    if "callback_query" in datos:
+        consulta = datos["callback_query"]
+        mensaje = consulta.get("message")
+        if mensaje and "chat" in mensaje:
+            return mensaje["chat"]["id"]
+        return consulta.get("from", {}).get("id")
+    for clave in CLAVES_CON_USUARIO:
+        if clave in datos:
+            objeto = datos[clave]
+            return (objeto.get("from") or objeto.get("user") or {}).get("id")
+    return None
+
+def shard_de_update(datos: dict, total: int) -> int:
+    """Worker que debe procesar un update"""
+    clave = chat_de_update(datos)
+    if clave is None:
+        clave = datos.get("update_id", 0)
+    return shard_de_chat(clave, total)
+
+# ================= WORKER =================
+
+def _ambito_limites(indice: int, total: int) -> str:
+    # Incluye el total: si cambia el número de workers los shards ya no coinciden
+    return f"hashtags:{total}:{indice}"
+
+def _guardar_estado_limites(indice: int, total: int) -> None:
+    from db import save_rate_limit_state
+    from hashtags import export_spam_cache
+
+    save_rate_limit_state(_ambito_limites(indice, total), export_spam_cache())
+
+def _restaurar_estado_limites(indice: int, total: int) -> None:
+    from db import load_rate_limit_state
+    from hashtags import import_spam_cache
+
+    entradas = load_rate_limit_state(_ambito_limites(indice, total))
+    import_spam_cache(entradas)
+    logger.info(f"♻️ Worker {indice}: restaurado el estado de spam de {len(entradas)} usuarios")
+
+def _obtener(cola: mp.Queue, sin_datos: object):
+    try:
+        return cola.get(timeout=0.5)
+    except queue.Empty:
+        return sin_datos
+
+async def _ejecutar_worker(indice: int, total: int, cola: mp.Queue, procesados,
+                           cola_metricas: mp.Queue, simulado: bool) -> None:
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder
+
+    from bot import BOT_TOKEN, registrar_manejadores
+    from cola_salida import despachador
+    from config import Config
+    from configuracion_chats import configuracion_chats
+    from db import create_all_tables, replay_point_spool
+    from juegos import check_active_games, initialize_games_system
+    from metricas import obtener_metricas
+    from planificador_updates import crear_procesador_desde_config
+    from recuperacion import LimitadorRecuperacion, recuperacion
+    from retencion import compactar_periodicamente
+    from tendencias import tendencias
+
+    builder = ApplicationBuilder().token(BOT_TOKEN).updater(None)
+    if simulado:
+        from reproducir_trafico import PeticionSimulada
+        builder = builder.request(PeticionSimulada()).get_updates_request(PeticionSimulada())
+    if simulado:
+        # La reproducción usa updates grabados (todos "atrasados"): sin recuperación
+        application = builder.concurrent_updates(crear_procesador_desde_config()).build()
+    else:
+        application = (
+            builder.concurrent_updates(crear_procesador_desde_config(recuperacion=recuperacion))
+            .rate_limiter(LimitadorRecuperacion(recuperacion))
+            .build()
+        )
+    registrar_manejadores(application)
+
+    loop = asyncio.get_running_loop()
+    parar = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, parar.set)
+
+    create_all_tables()
+    initialize_games_system(lambda chat_id: shard_de_chat(chat_id, total) == indice)
+    configuracion_chats.cargar()
+    _restaurar_estado_limites(indice, total)
+    tendencias.cargar(lambda chat_id: shard_de_chat(chat_id, total) == indice)
+
+    # Todos los workers comparten el token: el límite global se reparte
+    despachador.limitar_global(30 / total)
+
+    sin_datos = object()
+    tareas: set = set()
+
+    async def procesar(update: Update) -> None:
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception as e:
+            logger.error(f"❌ Worker {indice}: error procesando update {update.update_id}: {e}")
+        finally:
+            with procesados.get_lock():
+                procesados[indice] += 1
+
+    async def tareas_periodicas() -> None:
+        ultimo_snapshot = ultimo_informe = time.monotonic()
+        while True:
+            await asyncio.sleep(1)
+            ahora = time.monotonic()
+            if ahora - ultimo_snapshot >= INTERVALO_SNAPSHOT:
+                ultimo_snapshot = ahora
+                try:
+                    await loop.run_in_executor(None, _guardar_estado_limites, indice, total)
+                except Exception as e:
+                    logger.error(f"❌ Worker {indice}: error guardando estado de rate limiting: {e}")
+                try:
+                    await loop.run_in_executor(None, tendencias.guardar)
+                except Exception as e:
+                    logger.error(f"❌ Worker {indice}: error guardando tendencias: {e}")
+                try:
+                    await loop.run_in_executor(None, replay_point_spool)
+                except Exception as e:
+                    logger.warning(f"⚠️ Worker {indice}: no se pudo reaplicar el spool de puntos: {e}")
+            if ahora - ultimo_informe >= INTERVALO_METRICAS:
+                ultimo_informe = ahora
+                try:
+                    cola_metricas.put_nowait((indice, obtener_metricas()))
+                except Exception:
+                    pass
+
+    async with application:
+        await application.start()
+        despachador.iniciar(application.bot)
+        auxiliares = [
+            asyncio.create_task(check_active_games()),
+            asyncio.create_task(tareas_periodicas()),
+        ]
+        if indice == 0 and not simulado:
+            # Una sola compactación de user_points para todos los workers
+            auxiliares.append(asyncio.create_task(compactar_periodicamente(Config.POINTS_COMPACTION_INTERVAL)))
+        logger.info(f"👷 Worker {indice}/{total} listo (PID {os.getpid()})")
+
+        while not parar.is_set():
+            if len(tareas) >= MAX_EN_CURSO:
+                # Lo que no se ha sacado de la cola sobrevive a una caída del worker
+                await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            datos = await loop.run_in_executor(None, _obtener, cola, sin_datos)
+            if datos is sin_datos:
+                continue
+            if datos is FIN:
+                break
+            try:
+                update = Update.de_json(datos, application.bot)
+            except Exception as e:
+                logger.error(f"❌ Worker {indice}: update inválido: {e}")
+                continue
+            tarea = asyncio.create_task(procesar(update))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+
+        await asyncio.gather(*tareas, return_exceptions=True)
+        for tarea in auxiliares:
+            tarea.cancel()
+        await asyncio.gather(*auxiliares, return_exceptions=True)
+        await despachador.detener(timeout=10.0)
+        await application.stop()
+
+    try:
+        _guardar_estado_limites(indice, total)
+        tendencias.guardar()
+    except Exception as e:
+        logger.error(f"❌ Worker {indice}: error guardando estado final: {e}")
+    logger.info(f"👷 Worker {indice} detenido")
+
+def ejecutar_worker(indice: int, total: int, cola: mp.Queue, procesados,
+                    cola_metricas: mp.Queue, simulado: bool = False) -> None:
+    """Punto de entrada del proceso worker"""
+    # Ctrl+C lo gestiona el receptor, que ordena la parada a cada worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        format=f"%(asctime)s - worker{indice} - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    asyncio.run(_ejecutar_worker(indice, total, cola, procesados, cola_metricas, simulado))
+
+# ================= RECEPTOR =================
+
+class ReceptorWebhook:
+    """Recibe el webhook, reparte los updates por chat y supervisa los workers"""
+
+    def __init__(self, workers: int, puerto: int, ruta: str = "/webhook",
+                 secreto: str = "", simulado: bool = False):
+        self.total = workers
+        self.puerto = puerto
+        self.ruta = ruta
+        self.secreto = secreto
+        self.simulado = simulado
+
+        self._ctx = mp.get_context("spawn")
+        self.colas: List[mp.Queue] = [self._ctx.Queue() for _ in range(workers)]
+        self.procesados = self._ctx.Array("Q", workers)
+        self.cola_metricas: mp.Queue = self._ctx.Queue()
+        self.procesos: List[Optional[mp.Process]] = [None] * workers
+        self.recibidos = [0] * workers
+        self.reinicios = [0] * workers
+        self.metricas_workers: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._parando = threading.Event()
+        self._servidor: Optional[ThreadingHTTPServer] = None
+
+    def _lanzar(self, indice: int) -> None:
+        proceso = self._ctx.Process(
+            target=ejecutar_worker,
+            args=(indice, self.total, self.colas[indice], self.procesados,
+                  self.cola_metricas, self.simulado),
+            name=f"puntum-worker-{indice}",
+            daemon=False,
+        )
+        proceso.start()
+        self.procesos[indice] = proceso
+
+    def repartir(self, datos: dict) -> int:
+        """Encola un update en la cola de su worker"""
+        indice = shard_de_update(datos, self.total)
+        self.colas[indice].put(datos)
+        with self._lock:
+            self.recibidos[indice] += 1
+        return indice
+
+    def metricas(self) -> dict:
+        """Estado de cada worker visto desde el receptor"""
+        while True:
+            try:
+                indice, datos = self.cola_metricas.get_nowait()
+                self.metricas_workers[indice] = datos
+            except queue.Empty:
+                break
+
+        workers = {}
+        for indice in range(self.total):
+            try:
+                profundidad = self.colas[indice].qsize()
+            except NotImplementedError:
+                profundidad = None
+            proceso = self.procesos[indice]
+            workers[indice] = {
+                "vivo": bool(proceso and proceso.is_alive()),
+                "pid": proceso.pid if proceso else None,
+                "recibidos": self.recibidos[indice],
+                "procesados": self.procesados[indice],
+                "cola": profundidad,
+                "reinicios": self.reinicios[indice],
+                "metricas": self.metricas_workers.get(indice, {}),
+            }
+        return {"workers": self.total, "detalle": workers}
+
+    def _supervisar(self) -> None:
+        """Relanza los workers que mueran; su cola conserva los updates que no llegaron a sacar"""
+        while not self._parando.wait(2.0):
+            for indice, proceso in enumerate(self.procesos):
+                if proceso is not None and not proceso.is_alive():
+                    logger.error(f"💥 Worker {indice} terminó (código {proceso.exitcode}), relanzando...")
+                    self.reinicios[indice] += 1
+                    self._lanzar(indice)
+
+    def _crear_manejador(self):
+        receptor = self
+
+        class ManejadorWebhook(BaseHTTPRequestHandler):
+            # Telegram reutiliza la conexión entre updates
+            protocol_version = "HTTP/1.1"
+
+            def _responder(self, codigo: int, cuerpo: bytes = b"", tipo: str = "text/plain; charset=utf-8"):
+                self.send_response(codigo)
+                self.send_header("Content-type", tipo)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                if cuerpo:
+                    self.wfile.write(cuerpo)
+
+            def do_POST(self):
+                longitud = int(self.headers.get("Content-Length", 0))
+                cuerpo = self.rfile.read(longitud)
+                if self.path != receptor.ruta:
+                    self._responder(404)
+                    return
+                if receptor.secreto and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != receptor.secreto:
+                    self._responder(403)
+                    return
+                try:
+                    receptor.repartir(json.loads(cuerpo))
+                except Exception as e:
+                    logger.error(f"❌ Update recibido inválido: {e}")
+                    self._responder(400)
+                    return
+                self._responder(200)
+
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    cuerpo = json.dumps(receptor.metricas(), ensure_ascii=False, default=str).encode()
+                    self._responder(200, cuerpo, "application/json; charset=utf-8")
+                    return
+                vivos = sum(1 for p in receptor.procesos if p and p.is_alive())
+                self._responder(200 if vivos == receptor.total else 503,
+                                f"workers vivos: {vivos}/{receptor.total}\n".encode())
+
+            def log_message(self, format, *args):
+                pass
+
+        return ManejadorWebhook
+
+    def iniciar(self) -> None:
+        """Lanza los workers y el servidor HTTP (en hilos, no bloquea)"""
+        for indice in range(self.total):
+            self._lanzar(indice)
+        threading.Thread(target=self._supervisar, daemon=True).start()
+
+        self._servidor = ThreadingHTTPServer(("", self.puerto), self._crear_manejador())
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        logger.info(f"🌐 Receptor de webhook en el puerto {self.puerto}{self.ruta} con {self.total} workers")
+
+    def detener(self, timeout: float = 20.0) -> None:
+        """Deja de aceptar updates, pide a los workers que terminen su cola y los espera"""
+        self._parando.set()
+        if self._servidor:
+            self._servidor.shutdown()
+        for cola in self.colas:
+            cola.put(FIN)
+        limite = time.monotonic() + timeout
+        for indice, proceso in enumerate(self.procesos):
+            if proceso is None:
+                continue
+            proceso.join(max(0.0, limite - time.monotonic()))
+            if proceso.is_alive():
+                logger.warning(f"⚠️ Worker {indice} no terminó a tiempo, forzando parada")
+                proceso.terminate()
+                proceso.join(5)
+        logger.info("🛑 Receptor detenido")
+
+def registrar_webhook(url: str, secreto: str) -> None:
+    """Apunta el webhook de Telegram al receptor sin descartar updates pendientes"""
+    from telegram import Bot, Update
+
+    from bot import BOT_TOKEN
+
+    async def _registrar():
+        async with Bot(BOT_TOKEN) as bot:
+            await bot.set_webhook(url=url, secret_token=secreto or None,
+                                  allowed_updates=Update.ALL_TYPES)
+
+    asyncio.run(_registrar())
+    logger.info(f"🔗 Webhook registrado en {url}")
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Ejecuta el bot repartido en varios procesos por chat")
+    parser.add_argument("--workers", type=int, default=Config.BOT_WORKERS)
+    parser.add_argument("--puerto", type=int, default=Config.PORT)
+    parser.add_argument("--sin-registrar", action="store_true",
+                        help="No llamar a setWebhook (el webhook ya apunta aquí)")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - receptor - %(name)s - %(levelname)s - %(message)s",
+                        level=logging.INFO)
+
+    receptor = ReceptorWebhook(args.workers, args.puerto, Config.WEBHOOK_PATH, Config.WEBHOOK_SECRET)
+    receptor.iniciar()
+
+    if not args.sin_registrar:
+        if Config.WEBHOOK_URL:
+            registrar_webhook(Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH, Config.WEBHOOK_SECRET)
+        else:
+            logger.warning("⚠️ RENDER_EXTERNAL_URL no configurado: el webhook no se registra")
+
+    parada = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: parada.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: parada.set())
+    parada.wait()
+
+    logger.info("🛑 Señal recibida, deteniendo workers...")
+    receptor.detener()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# pipeline_mensajes.py
+"""
+Pipeline por etapas para los mensajes de texto.
+
+La mayoría del tráfico de un grupo es conversación sin hashtags que no
+puede puntuar. Cada etapa decide si el mensaje sigue adelante; las
+primeras son casi gratuitas (sin base de datos ni expresiones regulares)
+y las caras sólo se ejecutan para lo que sobrevive. Los contadores por
+etapa (en /metrics) muestran cuánto tráfico descarta cada una.
+"""
+
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+# Una etapa devuelve True para pasar el mensaje a la siguiente y False para terminar
+Etapa = Callable[[Any, Any], Union[bool, Awaitable[bool]]]
+
+class PipelineMensajes:
+    """Secuencia de etapas con contadores de entradas, paradas y tiempo por etapa"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.etapas: List[Tuple[str, Etapa]] = []
+        self.contadores: Dict[str, Dict[str, float]] = {}
+        self.recibidos = 0
+        registrar_fuente(f"pipeline_{nombre}", self.metricas)
+
+    def etapa(self, nombre: str) -> Callable[[Etapa], Etapa]:
+        """Decorador que añade una etapa al final del pipeline"""
+        def decorador(funcion: Etapa) -> Etapa:
+            self.etapas.append((nombre, funcion))
+            self.contadores[nombre] = {"entradas": 0, "detenidos": 0, "errores": 0, "segundos": 0.0}
+            return funcion
+        return decorador
+
+    async def procesar(self, update, context) -> None:
+        self.recibidos += 1
+        for nombre, funcion in self.etapas:
+            contador = self.contadores[nombre]
+            contador["entradas"] += 1
+            inicio = time.perf_counter()
+            try:
+                continuar = funcion(update, context)
+                if inspect.isawaitable(continuar):
+                    continuar = await continuar
+            except Exception as e:
+                contador["errores"] += 1
+                logger.error(f"❌ Error en la etapa {nombre} del pipeline {self.nombre}: {e}")
+                continuar = False
+            finally:
+                contador["segundos"] += time.perf_counter() - inicio
+            if not continuar:
+                contador["detenidos"] += 1
+                return
+
+    def metricas(self) -> dict:
+        etapas = {}
+        for nombre, _ in self.etapas:
+            contador = self.contadores[nombre]
+            entradas = contador["entradas"]
+            etapas[nombre] = {
+                "entradas": entradas,
+                "detenidos": contador["detenidos"],
+                "errores": contador["errores"],
+                "detenidos_pct": round(contador["detenidos"] / entradas * 100, 1) if entradas else 0.0,
+                "media_ms": round(contador["segundos"] / entradas * 1000, 3) if entradas else 0.0,
+            }
+        return {"recibidos": self.recibidos, "etapas": etapas}
@@ -0,0 +1,242 @@
+# planificador_updates.py
+"""
+Planificador de updates: orden estricto dentro de cada chat, paralelismo
+entre chats distintos.
+
+Con concurrent_updates(True) dos mensajes del mismo chat pueden ejecutar
+handle_game_message a la vez y pisarse el estado de active_games[chat_id].
+Este procesador pone cada update en la cola FIFO de su chat; un número
+fijo de workers toma chats de una cola circular de chats listos, procesa
+como máximo `quantum` updates seguidos de ese chat y lo devuelve al final
+de la cola si le quedan pendientes. Así un chat muy activo no acapara
+los workers y nunca hay dos updates del mismo chat en curso.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Awaitable, Deque, Dict, Hashable, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """Procesador de updates serializado por chat y paralelo entre chats"""
+
+    def __init__(self, workers: int = 8, quantum: int = 2, marca_agua=None, recuperacion=None):
+        super().__init__(max_concurrent_updates=workers)
+        self.quantum = max(1, quantum)
+        # Opcional (ver liderazgo.py): registra qué update_id terminaron y
+        # descarta los ya procesados por un líder anterior
+        self.marca_agua = marca_agua
+        # Opcional (ver recuperacion.py): suprime las respuestas a updates atrasados
+        self.recuperacion = recuperacion
+        # chat -> cola FIFO de (corrutina, futuro, encolado_en, atrasado)
+        self._colas: Dict[Hashable, Deque[Tuple[Awaitable[Any], asyncio.Future, float, bool]]] = {}
+        # Chats con updates pendientes que no están siendo procesados por ningún worker
+        self._listos: Deque[Hashable] = deque()
+        self._en_curso: set = set()
+        self._hay_trabajo: Optional[asyncio.Condition] = None
+        self._workers: list = []
+        self._sin_chat = itertools.count()
+        self.estadisticas = {
+            "procesados": 0,
+            "errores": 0,
+            "profundidad_maxima_chat": 0,
+            "espera_maxima_ms": 0.0,
+            "duplicados_descartados": 0,
+        }
+        self._espera_total = 0.0
+
+    @staticmethod
+    def _clave(update: object) -> Optional[Hashable]:
+        """Clave de serialización: el chat del update, o None si no tiene"""
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    @property
+    def activo(self) -> bool:
+        return bool(self._workers)
+
+    def pendientes(self) -> int:
+        """Updates encolados o en proceso (para el drenaje al apagar)"""
+        return sum(len(cola) for cola in self._colas.values()) + len(self._en_curso)
+
+    async def initialize(self) -> None:
+        if self._workers:
+            return
+        self._hay_trabajo = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"planificador_worker_{i}")
+            for i in range(self.max_concurrent_updates)
+        ]
+        registrar_fuente("planificador", self.metricas)
+        logger.info(f"🧵 Planificador por chat iniciado ({self.max_concurrent_updates} workers, quantum {self.quantum})")
+
+    async def shutdown(self) -> None:
+        for tarea in self._workers:
+            tarea.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Lo que quede sin procesar se cancela limpiamente
+        descartados = 0
+        for cola in self._colas.values():
+            while cola:
+                corrutina, futuro, _, _ = cola.popleft()
+                if hasattr(corrutina, "close"):
+                    corrutina.close()
+                if not futuro.done():
+                    futuro.cancel()
+                descartados += 1
+        self._colas.clear()
+        self._listos.clear()
+        if descartados:
+            logger.warning(f"⚠️ Planificador detenido con {descartados} updates sin procesar")
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Encola el update en la cola de su chat y espera a que un worker lo procese.
+
+        Sustituye a la implementación base: el semáforo de la clase base se
+        ocuparía mientras el update espera su turno en el chat, bloqueando
+        a los demás chats. Aquí el límite lo pone el número de workers.
+        """
+        update_id = update.update_id if isinstance(update, Update) else None
+        if self.marca_agua is not None and update_id is not None:
+            if self.marca_agua.ya_procesado(update_id):
+                coroutine.close()
+                self.estadisticas["duplicados_descartados"] += 1
+                return
+            self.marca_agua.iniciar(update_id)
+            try:
+                await self._encolar_y_esperar(update, coroutine)
+            except asyncio.CancelledError:
+                # Cancelado en la parada sin llegar a procesarse: la marca no debe superarlo
+                raise
+            except Exception:
+                self.marca_agua.terminar(update_id)
+                raise
+            self.marca_agua.terminar(update_id)
+        else:
+            await self._encolar_y_esperar(update, coroutine)
+
+    def _contexto(self, atrasado: bool):
+        return self.recuperacion.procesando(atrasado) if self.recuperacion else nullcontext()
+
+    async def _encolar_y_esperar(self, update: object, coroutine: Awaitable[Any]) -> None:
+        atrasado = self.recuperacion.es_atrasado(update) if self.recuperacion else False
+        if atrasado and self.recuperacion.descartar(update):
+            # Comando atrasado: ni respuesta ni efectos (ver recuperacion.py)
+            coroutine.close()
+            return
+        if not self._workers:
+            with self._contexto(atrasado):
+                await coroutine
+            return
+
+        clave = self._clave(update)
+        if clave is None:
+            # Sin chat no hay nada que serializar: cada update va en su propio carril
+            clave = ("sin_chat", next(self._sin_chat))
+
+        futuro = asyncio.get_running_loop().create_future()
+        cola = self._colas.setdefault(clave, deque())
+        cola.append((coroutine, futuro, time.monotonic(), atrasado))
+        if len(cola) > self.estadisticas["profundidad_maxima_chat"]:
+            self.estadisticas["profundidad_maxima_chat"] = len(cola)
+
+        # Si el chat ya está en la cola de listos o un worker lo está procesando,
+        # el update nuevo se atenderá en su turno
+        if len(cola) == 1 and clave not in self._en_curso:
+            async with self._hay_trabajo:
+                self._listos.append(clave)
+                self._hay_trabajo.notify()
+
+        await futuro
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # No se usa: process_update gestiona directamente la ejecución
+        await coroutine
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._hay_trabajo:
+                await self._hay_trabajo.wait_for(lambda: bool(self._listos))
+                clave = self._listos.popleft()
+                self._en_curso.add(clave)
+
+            try:
+                await self._procesar_turno(clave)
+            finally:
+                self._en_curso.discard(clave)
+                cola = self._colas.get(clave)
+                if cola:
+                    # Quedan updates: el chat vuelve al final de la cola circular
+                    async with self._hay_trabajo:
+                        self._listos.append(clave)
+                        self._hay_trabajo.notify()
+                else:
+                    self._colas.pop(clave, None)
+
+    async def _procesar_turno(self, clave: Hashable) -> None:
+        """Procesa hasta `quantum` updates consecutivos de un chat"""
+        cola = self._colas.get(clave)
+        for _ in range(self.quantum):
+            if not cola:
+                return
+            corrutina, futuro, encolado_en, atrasado = cola.popleft()
+
+            espera = time.monotonic() - encolado_en
+            self._espera_total += espera
+            if espera * 1000 > self.estadisticas["espera_maxima_ms"]:
+                self.estadisticas["espera_maxima_ms"] = round(espera * 1000, 1)
+
+            try:
+                with self._contexto(atrasado):
+                    await corrutina
+                if not futuro.done():
+                    futuro.set_result(None)
+            except asyncio.CancelledError:
+                if not futuro.done():
+                    futuro.cancel()
+                raise
+            except Exception as e:
+                self.estadisticas["errores"] += 1
+                logger.error(f"❌ Error procesando update del chat {clave}: {e}")
+                if not futuro.done():
+                    futuro.set_exception(e)
+            finally:
+                self.estadisticas["procesados"] += 1
+
+    def metricas(self) -> dict:
+        """Profundidad de colas por chat y contadores del planificador"""
+        profundidades = {str(clave): len(cola) for clave, cola in self._colas.items() if cola}
+        mas_cargados = sorted(profundidades.items(), key=lambda item: item[1], reverse=True)[:10]
+        procesados = self.estadisticas["procesados"]
+        return {
+            "activo": self.activo,
+            "workers": self.max_concurrent_updates,
+            "quantum": self.quantum,
+            "pendientes": sum(profundidades.values()),
+            "chats_con_pendientes": len(profundidades),
+            "chats_listos": len(self._listos),
+            "chats_en_curso": len(self._en_curso),
+            "chats_mas_cargados": dict(mas_cargados),
+            "espera_media_ms": round(self._espera_total / procesados * 1000, 1) if procesados else 0.0,
+            **self.estadisticas,
+        }
+
+def crear_procesador_desde_config(marca_agua=None, recuperacion=None) -> ProcesadorPorChat:
+    """Crea el planificador con los valores de UPDATE_WORKERS y UPDATE_QUANTUM"""
+    from config import Config
+
+    return ProcesadorPorChat(workers=Config.UPDATE_WORKERS, quantum=Config.UPDATE_QUANTUM,
+                             marca_agua=marca_agua, recuperacion=recuperacion)
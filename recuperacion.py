@@ -0,0 +1,174 @@
+# recuperacion.py
+"""
+Modo recuperación: procesar el backlog acumulado durante una caída.
+
+El bot no descarta los updates pendientes al arrancar (drop_pending_updates
+=False) y sólo confirma a Telegram los ya procesados (la marca de agua de
+liderazgo.py), así que tras un reinicio llegan de golpe los mensajes del
+tiempo caído, en lotes de hasta 100 por getUpdates. Esos updates pasan por
+los manejadores normales (los puntos, logros y respuestas de juegos se
+registran), pero contestar ahora a mensajes de hace media hora sólo llena
+el chat de ruido:
+
+- Un update es atrasado si su mensaje tiene más de CATCHUP_STALE_SECONDS.
+- El planificador marca el contexto del manejador (contextvar) mientras
+  procesa uno atrasado.
+- LimitadorRecuperacion, instalado como rate_limiter del bot, descarta los
+  envíos (sendMessage, sendPhoto...) hechos en ese contexto; enviar_mensaje
+  hace lo mismo antes de encolar en la cola de salida.
+- Los comandos atrasados (/cinematrivia, /reto...) se descartan enteros: su
+  respuesta no se enviaría, y el estado que crean (una partida activa que
+  nadie ve y que bloquea la siguiente) tampoco debe quedar.
+
+Cuando termina el primer update al día se da la recuperación por terminada y se
+informa del ritmo (updates/s), de lo atrasado que iba y de las respuestas
+suprimidas.
+"""
+
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from telegram import MessageEntity, Update
+from telegram.ext import BaseRateLimiter
+
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+# True mientras un manejador procesa un update atrasado
+_atrasado: contextvars.ContextVar[bool] = contextvars.ContextVar("update_atrasado", default=False)
+
+class RecuperacionBacklog:
+    """Detecta updates atrasados y mide el ritmo al ponerse al día"""
+
+    def __init__(self, antiguedad_maxima: float = 120.0):
+        self.antiguedad_maxima = antiguedad_maxima
+        self.en_curso = False
+        self._inicio = 0.0
+        self._ultimo = 0.0
+        self.estadisticas = {
+            "recuperaciones": 0,
+            "atrasados": 0,
+            "respuestas_suprimidas": 0,
+            "comandos_descartados": 0,
+            "retraso_maximo_s": 0.0,
+            "ultima_duracion_s": 0.0,
+            "ultimo_ritmo_por_s": 0.0,
+        }
+        self._atrasados_ronda = 0
+        self._suprimidas_ronda = 0
+
+    def antiguedad(self, update: object) -> Optional[float]:
+        """Segundos desde que se envió el mensaje del update (None si no tiene fecha)"""
+        if not isinstance(update, Update):
+            return None
+        mensaje = update.effective_message
+        fecha = getattr(mensaje, "edit_date", None) or getattr(mensaje, "date", None)
+        if update.callback_query or fecha is None:
+            return None
+        return (datetime.now(timezone.utc) - fecha).total_seconds()
+
+    def es_atrasado(self, update: object) -> bool:
+        """Clasifica el update al recibirlo; el primero atrasado abre una recuperación"""
+        antiguedad = self.antiguedad(update)
+        if antiguedad is None or antiguedad <= self.antiguedad_maxima:
+            return False
+
+        if not self.en_curso:
+            self.en_curso = True
+            self._inicio = self._ultimo = time.monotonic()
+            self._atrasados_ronda = self._suprimidas_ronda = 0
+            self.estadisticas["recuperaciones"] += 1
+            logger.info(f"📬 Recuperando backlog: el primer update atrasado es de hace {antiguedad:.0f}s")
+        if antiguedad > self.estadisticas["retraso_maximo_s"]:
+            self.estadisticas["retraso_maximo_s"] = round(antiguedad, 1)
+        return True
+
+    def descartar(self, update: object) -> bool:
+        """True (y lo cuenta) si el update atrasado es un comando y no se debe procesar"""
+        mensaje = update.effective_message if isinstance(update, Update) else None
+        if mensaje is None or not any(
+            entidad.type == MessageEntity.BOT_COMMAND and entidad.offset == 0
+            for entidad in mensaje.entities
+        ):
+            return False
+        self.estadisticas["comandos_descartados"] += 1
+        return True
+
+    def _terminar(self) -> None:
+        self.en_curso = False
+        duracion = max(self._ultimo - self._inicio, 1e-3)
+        ritmo = self._atrasados_ronda / duracion
+        self.estadisticas["ultima_duracion_s"] = round(duracion, 2)
+        self.estadisticas["ultimo_ritmo_por_s"] = round(ritmo, 1)
+        logger.info(
+            f"✅ Backlog recuperado: {self._atrasados_ronda} updates en {duracion:.1f}s "
+            f"({ritmo:.1f}/s), {self._suprimidas_ronda} respuestas suprimidas"
+        )
+
+    @contextmanager
+    def procesando(self, atrasado: bool):
+        """Marca el contexto del manejador mientras procesa el update.
+
+        El ritmo se mide con los updates atrasados ya procesados; el primer
+        update al día que termina cierra la recuperación.
+        """
+        token = _atrasado.set(atrasado)
+        try:
+            yield
+        finally:
+            _atrasado.reset(token)
+            if atrasado:
+                self._ultimo = time.monotonic()
+                self._atrasados_ronda += 1
+                self.estadisticas["atrasados"] += 1
+            elif self.en_curso:
+                self._terminar()
+
+    def suprimir_respuesta(self) -> bool:
+        """True (y lo cuenta) si la respuesta en curso es a un update atrasado"""
+        if not _atrasado.get():
+            return False
+        self.estadisticas["respuestas_suprimidas"] += 1
+        self._suprimidas_ronda += 1
+        return True
+
+    def metricas(self) -> dict:
+        return {
+            "en_curso": self.en_curso,
+            "antiguedad_maxima_s": self.antiguedad_maxima,
+            **self.estadisticas,
+        }
+
+class LimitadorRecuperacion(BaseRateLimiter):
+    """rate_limiter del bot que no envía respuestas a updates atrasados"""
+
+    def __init__(self, recuperacion: RecuperacionBacklog):
+        self.recuperacion = recuperacion
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(self, callback, args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Optional[Any]):
+        if endpoint.startswith("send") and self.recuperacion.suprimir_respuesta():
+            # Message.de_json(None) es None: el manejador sigue como si se hubiera enviado
+            return None
+        return await callback(*args, **kwargs)
+
+def crear_recuperacion_desde_config() -> RecuperacionBacklog:
+    """Crea el detector con CATCHUP_STALE_SECONDS"""
+    from config import Config
+
+    return RecuperacionBacklog(antiguedad_maxima=Config.CATCHUP_STALE_SECONDS)
+
+# Instancia global: la usan el planificador, el bot y la cola de salida
+recuperacion = crear_recuperacion_desde_config()
+registrar_fuente("recuperacion", recuperacion.metricas)
@@ -0,0 +1,190 @@
+# reglas_puntuacion.py
+"""
+Reglas de puntuación de hashtags en un único sitio.
+
+Los puntos por hashtag, el mínimo de palabras, los patrones de bonus y
+los alias se leen de scoring_rules.json (SCORING_RULES_PATH) y se
+compilan en un diccionario indexado por hashtag normalizado más las
+expresiones regulares ya compiladas. El archivo es la única fuente: si
+falta o es inválido al arrancar, el bot no arranca. Al cambiar el archivo
+(o con /recargarreglas) se compila un conjunto nuevo y se sustituye de
+golpe; si el nuevo es inválido se conservan las reglas anteriores. Cada
+conjunto lleva un número de versión para invalidar lo que se haya
+calculado con el anterior (p. ej. las MessageFeatures cacheadas).
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from handlers.palabras_clave import normalizar
+
+logger = logging.getLogger(__name__)
+
+_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+
+class ReglaHashtag(NamedTuple):
+    clave: str            # normalizada: 'resena'
+    etiqueta: str         # como se muestra: '#reseña'
+    puntos: int
+    min_palabras: int
+    bonus: Tuple[str, ...]
+
+class ReglasPuntuacion:
+    """Conjunto inmutable de reglas compiladas; se reemplaza entero al recargar"""
+
+    def __init__(self, config: dict, version: int = 0):
+        self.version = version
+        self.config = config
+        detalle = config.get("detail_bonus", {})
+        self.bonus_detalle_longitud = int(detalle.get("min_length", 150))
+        self.bonus_detalle_puntos = int(detalle.get("points", 0))
+
+        self.patrones_bonus: Dict[str, "re.Pattern"] = {}
+        for nombre, patron in config.get("bonus_patterns", {}).items():
+            flags = 0
+            for f in patron.get("flags", ""):
+                flags |= _FLAGS.get(f, 0)
+            self.patrones_bonus[nombre] = re.compile(patron["pattern"], flags)
+
+        # Hashtag normalizado (y cada alias) -> regla
+        self.hashtags: Dict[str, ReglaHashtag] = {}
+        for nombre, datos in config.get("hashtags", {}).items():
+            nombre = nombre.lstrip("#")
+            bonus = tuple(datos.get("bonus_patterns", ()))
+            desconocidos = [b for b in bonus if b not in self.patrones_bonus]
+            if desconocidos:
+                raise ValueError(f"#{nombre}: patrones de bonus no definidos {desconocidos}")
+            regla = ReglaHashtag(
+                clave=normalizar(nombre),
+                etiqueta=f"#{nombre}",
+                puntos=int(datos["points"]),
+                min_palabras=int(datos.get("min_words", 0)),
+                bonus=bonus,
+            )
+            for alias in (nombre, *datos.get("aliases", ())):
+                clave = normalizar(alias.lstrip("#"))
+                if clave in self.hashtags and self.hashtags[clave] != regla:
+                    raise ValueError(f"El hashtag #{alias} está definido dos veces")
+                self.hashtags[clave] = regla
+
+    def buscar(self, hashtag: str) -> Optional[ReglaHashtag]:
+        """Regla de un hashtag en cualquier forma ('#Reseña', 'resena', '#rankin')"""
+        return self.hashtags.get(normalizar(hashtag.lstrip("#")))
+
+    def con_ajustes(self, ajustes: dict) -> "ReglasPuntuacion":
+        """Estas reglas con los ajustes de un chat encima (ver configuracion_chats.py).
+
+        Los ajustes pueden cambiar o añadir hashtags y el bonus por detalle; los
+        patrones de bonus son globales porque MessageFeatures los evalúa una vez.
+        """
+        hashtags = dict(self.config.get("hashtags", {}))
+        por_clave = {normalizar(nombre.lstrip("#")): nombre for nombre in hashtags}
+        for nombre, datos in ajustes.get("hashtags", {}).items():
+            existente = por_clave.get(normalizar(nombre.lstrip("#")))
+            if existente is not None:
+                hashtags[existente] = {**hashtags[existente], **datos}
+            elif "points" not in datos:
+                raise ValueError(f"#{nombre.lstrip('#')} no existe en las reglas generales: indica sus puntos")
+            else:
+                hashtags[nombre.lstrip("#")] = datos
+        config = {
+            **self.config,
+            "hashtags": hashtags,
+            "detail_bonus": {**self.config.get("detail_bonus", {}), **ajustes.get("detail_bonus", {})},
+        }
+        return ReglasPuntuacion(config, self.version)
+
+    def bonus_encontrados(self, texto: str) -> frozenset:
+        """Nombres de los patrones de bonus que aparecen en el texto"""
+        return frozenset(nombre for nombre, patron in self.patrones_bonus.items() if patron.search(texto))
+
+class MotorReglasPuntuacion:
+    """Mantiene las reglas vigentes y las recarga cuando cambia el archivo"""
+
+    def __init__(self, ruta: str, intervalo_recarga: float = 5.0):
+        self.ruta = ruta
+        self.intervalo_recarga = intervalo_recarga
+        self._lock = threading.Lock()
+        self._proxima_comprobacion = 0.0
+        try:
+            self._mtime: Optional[float] = os.path.getmtime(ruta)
+            self._reglas = self._leer(version=0)
+        except Exception as e:
+            # Sin reglas no se puede puntuar nada: mejor no arrancar que puntuar mal
+            logger.critical(f"❌ No se pudieron cargar las reglas de puntuación de {ruta}: {e}")
+            raise
+        logger.info(f"🎯 Reglas de puntuación cargadas desde {ruta} ({len(self._reglas.hashtags)} hashtags)")
+
+    def _leer(self, version: int) -> ReglasPuntuacion:
+        with open(self.ruta, encoding="utf-8") as archivo:
+            return ReglasPuntuacion(json.load(archivo), version)
+
+    @property
+    def version(self) -> int:
+        return self._reglas.version
+
+    def recargar_si_cambio(self, forzar: bool = False) -> bool:
+        """Recarga las reglas si el archivo cambió; devuelve True si se recargaron"""
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proxima_comprobacion:
+            return False
+        self._proxima_comprobacion = ahora + self.intervalo_recarga
+
+        try:
+            mtime = os.path.getmtime(self.ruta)
+        except OSError as e:
+            if self._mtime is not None:
+                logger.error(f"❌ Archivo de reglas de puntuación inaccesible ({e}): se mantienen las reglas v{self.version}")
+                self._mtime = None
+            return False
+        if not forzar and mtime == self._mtime:
+            return False
+
+        with self._lock:
+            try:
+                nuevas = self._leer(self._reglas.version + 1)
+            except Exception as e:
+                # Se conservan las reglas anteriores si el archivo nuevo es inválido
+                logger.error(f"❌ Reglas de puntuación inválidas en {self.ruta}: {e}")
+                self._mtime = mtime
+                return False
+            self._reglas = nuevas
+            self._mtime = mtime
+        logger.info(f"🎯 Reglas de puntuación cargadas desde {self.ruta} "
+                    f"({len(nuevas.hashtags)} hashtags, v{nuevas.version})")
+        return True
+
+    def actuales(self) -> ReglasPuntuacion:
+        """Reglas vigentes (comprueba antes si hay que recargarlas)"""
+        self.recargar_si_cambio()
+        return self._reglas
+
+    def metricas(self) -> dict:
+        reglas = self._reglas
+        return {
+            "ruta": self.ruta,
+            "version": reglas.version,
+            "hashtags": len({r.clave for r in reglas.hashtags.values()}),
+            "alias": len(reglas.hashtags),
+            "patrones_bonus": len(reglas.patrones_bonus),
+        }
+
+def crear_motor_desde_config() -> MotorReglasPuntuacion:
+    """Crea el motor con el archivo de reglas SCORING_RULES_PATH"""
+    from config import Config
+    from metricas import registrar_fuente
+
+    motor = MotorReglasPuntuacion(Config.SCORING_RULES_PATH)
+    registrar_fuente("reglas_puntuacion", motor.metricas)
+    return motor
+
+# Instancia global compartida por hashtags, seguridad y el pipeline de mensajes
+motor_reglas = crear_motor_desde_config()
+
+def reglas_actuales() -> ReglasPuntuacion:
+    return motor_reglas.actuales()
@@ -0,0 +1,104 @@
+# replicas.py
+"""
+Enrutado de lecturas a una réplica.
+
+Con DATABASE_REPLICA_URL configurada, las lecturas pesadas (/ranking,
+/miperfil, estadísticas de chat, listados de administración) usan
+db.get_read_connection en lugar de la primaria. Cada lectura indica
+cuánto retraso tolera (max_retraso); la réplica sólo se usa si:
+
+- el usuario no ha escrito en los últimos `ventana_escritura` segundos
+  (read-your-writes: /miperfil justo después de puntuar lee la primaria),
+- el retraso medido de la réplica no supera lo tolerado (se mide como
+  mucho cada `intervalo_retraso` segundos), y
+- la réplica no ha fallado hace poco (tras un fallo se deja de usar
+  `espera_fallo` segundos y todo va a la primaria).
+
+Este módulo no sabe nada de SQL: db.py le pasa cómo conectar a la réplica
+y cómo medir su retraso.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class EnrutadorLecturas:
+    """Decide si una lectura puede ir a la réplica"""
+
+    def __init__(self, conectar: Callable[[], object], medir_retraso: Optional[Callable[[object], float]] = None,
+                 ventana_escritura: float = 15.0, intervalo_retraso: float = 10.0,
+                 espera_fallo: float = 30.0, max_usuarios: int = 10_000):
+        self._conectar = conectar
+        self._medir_retraso = medir_retraso
+        self.ventana_escritura = ventana_escritura
+        self.intervalo_retraso = intervalo_retraso
+        self.espera_fallo = espera_fallo
+        self.max_usuarios = max_usuarios
+        # user_id -> instante (monotonic) de su última escritura
+        self._escrituras: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.retraso: float = 0.0
+        self._retraso_medido_en = float("-inf")
+        self._caida_hasta = 0.0
+        self.estadisticas = {
+            "replica": 0,
+            "primaria_lee_sus_escrituras": 0,
+            "primaria_por_retraso": 0,
+            "primaria_por_fallo": 0,
+        }
+
+    def registrar_escritura(self, user_id: int) -> None:
+        """Las próximas lecturas de este usuario irán a la primaria durante la ventana"""
+        with self._lock:
+            self._escrituras[user_id] = time.monotonic()
+            self._escrituras.move_to_end(user_id)
+            while len(self._escrituras) > self.max_usuarios:
+                self._escrituras.popitem(last=False)
+
+    def _escribio_hace_poco(self, user_id: Optional[int], ahora: float) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            instante = self._escrituras.get(user_id)
+        return instante is not None and ahora - instante < self.ventana_escritura
+
+    def conectar(self, user_id: Optional[int] = None, max_retraso: float = 30.0):
+        """Conexión a la réplica, o None si la lectura debe ir a la primaria"""
+        ahora = time.monotonic()
+        if ahora < self._caida_hasta:
+            self.estadisticas["primaria_por_fallo"] += 1
+            return None
+        if self._escribio_hace_poco(user_id, ahora):
+            self.estadisticas["primaria_lee_sus_escrituras"] += 1
+            return None
+
+        try:
+            conn = self._conectar()
+            if self._medir_retraso and ahora - self._retraso_medido_en >= self.intervalo_retraso:
+                self.retraso = self._medir_retraso(conn)
+                self._retraso_medido_en = ahora
+        except Exception as e:
+            logger.warning(f"⚠️ Réplica no disponible, leyendo de la primaria durante {self.espera_fallo:.0f}s: {e}")
+            self._caida_hasta = ahora + self.espera_fallo
+            self.estadisticas["primaria_por_fallo"] += 1
+            return None
+
+        if self.retraso > max_retraso:
+            conn.close()
+            self.estadisticas["primaria_por_retraso"] += 1
+            return None
+        self.estadisticas["replica"] += 1
+        return conn
+
+    def metricas(self) -> dict:
+        return {
+            "retraso_s": round(self.retraso, 2),
+            "ventana_escritura_s": self.ventana_escritura,
+            "usuarios_en_ventana": len(self._escrituras),
+            "caida": time.monotonic() < self._caida_hasta,
+            **self.estadisticas,
+        }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Reproduce una grabación de updates (ver grabador_trafico.py) a través de la
+pila real de manejadores del bot, contra un Bot simulado que no habla con
+Telegram. Sirve para perfilar con la forma real del tráfico.
+
+Uso:
+    python3 reproducir_trafico.py trafico.jsonl.gz                  # velocidad original
+    python3 reproducir_trafico.py trafico.jsonl.gz --velocidad 10   # 10x
+    python3 reproducir_trafico.py trafico.jsonl.gz --velocidad 0    # lo más rápido posible
+    python3 reproducir_trafico.py trafico.jsonl.gz --perfil cprofile
+    python3 reproducir_trafico.py trafico.jsonl.gz --perfil tracemalloc
+
+Los manejadores reales escriben puntos, logros y juegos: la reproducción
+usa siempre un SQLite nuevo en un directorio temporal, nunca DATABASE_URL
+ni el puntum.db del bot.
+
+Al terminar imprime el desglose de tiempo por manejador y, si se pidió,
+el informe de cProfile o de asignaciones de memoria.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# El bot exige un token con formato válido aunque aquí nunca se use la red
+os.environ.setdefault("BOT_TOKEN", "123456789:REPLAY-REPLAY-REPLAY-REPLAY-REPLAY")
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest, RequestData
+
+from grabador_trafico import leer_grabacion
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOT_SIMULADO = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Puntum Replay",
+    "username": "puntum_replay_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": True,
+    "supports_inline_queries": False,
+}
+
+class PeticionSimulada(BaseRequest):
+    """Implementación de red que responde a la Bot API sin salir del proceso"""
+
+    def __init__(self):
+        self.llamadas: Dict[str, int] = defaultdict(int)
+        self._siguiente_message_id = 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _mensaje(self, parametros: dict) -> dict:
+        self._siguiente_message_id += 1
+        return {
+            "message_id": self._siguiente_message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(parametros.get("chat_id", 0) or 0), "type": "group"},
+            "from": BOT_SIMULADO,
+            "text": parametros.get("text", ""),
+        }
+
+    async def do_request(self, url, method, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        metodo = url.rsplit("/", 1)[-1]
+        self.llamadas[metodo] += 1
+        parametros = request_data.parameters if request_data else {}
+
+        if metodo == "getMe":
+            resultado = BOT_SIMULADO
+        elif metodo in ("sendMessage", "editMessageText", "sendPhoto"):
+            resultado = self._mensaje(parametros)
+        elif metodo == "getUpdates":
+            resultado = []
+        else:
+            resultado = True
+
+        return 200, json.dumps({"ok": True, "result": resultado}).encode()
+
+class MedidorManejadores:
+    """Envuelve los callbacks de la aplicación para medir tiempo y memoria por manejador"""
+
+    def __init__(self, medir_memoria: bool = False):
+        self.medir_memoria = medir_memoria
+        self.tiempos: Dict[str, List[float]] = defaultdict(list)
+        self.memoria: Dict[str, int] = defaultdict(int)
+
+    def instrumentar(self, application) -> None:
+        for grupo, manejadores in application.handlers.items():
+            for manejador in manejadores:
+                callback = manejador.callback
+                nombre = f"{type(manejador).__name__}:{getattr(callback, '__name__', repr(callback))}"
+                manejador.callback = self._envolver(callback, nombre)
+
+    def _envolver(self, callback, nombre: str):
+        async def medido(update, context):
+            memoria_inicio = tracemalloc.get_traced_memory()[0] if self.medir_memoria else 0
+            inicio = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                self.tiempos[nombre].append(time.perf_counter() - inicio)
+                if self.medir_memoria:
+                    self.memoria[nombre] += tracemalloc.get_traced_memory()[0] - memoria_inicio
+        return medido
+
+    def informe(self) -> str:
+        lineas = [f"{'Manejador':<55} {'llamadas':>9} {'total ms':>10} {'media ms':>9} {'p95 ms':>8} {'máx ms':>8}"]
+        filas = sorted(self.tiempos.items(), key=lambda item: sum(item[1]), reverse=True)
+        for nombre, tiempos in filas:
+            ordenados = sorted(tiempos)
+            p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+            lineas.append(
+                f"{nombre:<55} {len(tiempos):>9} {sum(tiempos) * 1000:>10.1f} "
+                f"{sum(tiempos) / len(tiempos) * 1000:>9.2f} {p95 * 1000:>8.2f} {ordenados[-1] * 1000:>8.2f}"
+            )
+            if self.medir_memoria:
+                lineas.append(f"{'':<55} memoria neta retenida: {self.memoria[nombre] / 1024:.1f} KiB")
+        return "\n".join(lineas)
+
+async def reproducir(ruta: str, velocidad: float, medidor: MedidorManejadores,
+                     limite: Optional[int] = None, cargar_juegos: bool = True) -> dict:
+    """Reproduce la grabación y devuelve un resumen de la ejecución"""
+    from bot import BOT_TOKEN, registrar_manejadores
+
+    peticion = PeticionSimulada()
+    application = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(peticion)
+        .get_updates_request(PeticionSimulada())
+        .updater(None)
+        .build()
+    )
+    registrar_manejadores(application)
+    medidor.instrumentar(application)
+
+    from db import create_all_tables
+    create_all_tables()
+    if cargar_juegos:
+        from juegos import initialize_games_system
+        initialize_games_system()
+
+    await application.initialize()
+
+    procesados = 0
+    errores = 0
+    ts_base = None
+    reloj_base = time.perf_counter()
+    try:
+        for ts, datos in leer_grabacion(ruta):
+            if limite is not None and procesados >= limite:
+                break
+
+            # Respetar el espaciado original entre updates (escalado por la velocidad)
+            if velocidad > 0:
+                if ts_base is None:
+                    ts_base = ts
+                objetivo = (ts - ts_base) / velocidad
+                espera = objetivo - (time.perf_counter() - reloj_base)
+                if espera > 0:
+                    await asyncio.sleep(espera)
+
+            try:
+                update = Update.de_json(datos, application.bot)
+                await application.process_update(update)
+            except Exception as e:
+                errores += 1
+                logger.error(f"❌ Error reproduciendo update: {e}")
+            procesados += 1
+    finally:
+        await application.shutdown()
+
+    duracion = time.perf_counter() - reloj_base
+    return {
+        "procesados": procesados,
+        "errores": errores,
+        "duracion": duracion,
+        "llamadas_api": dict(peticion.llamadas),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce tráfico grabado contra un Bot simulado")
+    parser.add_argument("archivo", help="Archivo .jsonl.gz generado por el grabador")
+    parser.add_argument("--velocidad", type=float, default=1.0,
+                        help="1 = velocidad original, N = N veces más rápido, 0 = sin esperas")
+    parser.add_argument("--perfil", choices=["ninguno", "cprofile", "tracemalloc"], default="ninguno")
+    parser.add_argument("--top", type=int, default=25, help="Líneas a mostrar en los informes")
+    parser.add_argument("--limite", type=int, default=None, help="Máximo de updates a reproducir")
+    parser.add_argument("--salida-perfil", default=None, help="Guardar las estadísticas de cProfile en este archivo")
+    parser.add_argument("--sin-juegos", action="store_true", help="No cargar juegos activos desde la DB")
+    args = parser.parse_args()
+
+    # Rutas del usuario antes de cambiar de directorio
+    archivo = os.path.abspath(args.archivo)
+    salida_perfil = os.path.abspath(args.salida_perfil) if args.salida_perfil else None
+    # Base de datos desechable: db usa ./puntum.db si DATABASE_URL está vacía. Se dejan
+    # vacías (no borradas) para que load_dotenv no las rellene desde un .env
+    os.environ["DATABASE_URL"] = ""
+    os.environ["DATABASE_REPLICA_URL"] = ""
+    os.environ["POINTS_SPOOL_PATH"] = "spool_puntos.db"
+    directorio = tempfile.mkdtemp(prefix="puntum_replay_")
+    os.chdir(directorio)
+    print(f"📂 Base de datos temporal en {directorio}")
+
+    medidor = MedidorManejadores(medir_memoria=args.perfil == "tracemalloc")
+    perfilador = None
+
+    if args.perfil == "tracemalloc":
+        tracemalloc.start(10)
+    elif args.perfil == "cprofile":
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+
+    resumen = asyncio.run(reproducir(
+        archivo, args.velocidad, medidor,
+        limite=args.limite, cargar_juegos=not args.sin_juegos
+    ))
+
+    if perfilador:
+        perfilador.disable()
+
+    print("\n" + "=" * 60)
+    print("🎬 RESUMEN DE REPRODUCCIÓN")
+    print("=" * 60)
+    print(f"Updates procesados: {resumen['procesados']} (errores: {resumen['errores']})")
+    print(f"Duración: {resumen['duracion']:.2f}s "
+          f"({resumen['procesados'] / max(resumen['duracion'], 1e-9):.1f} updates/s)")
+    print(f"Llamadas a la API simulada: {resumen['llamadas_api']}")
+
+    print("\n⏱️ TIEMPO POR MANEJADOR")
+    print(medidor.informe())
+
+    if perfilador:
+        print("\n🔬 CPROFILE (ordenado por tiempo acumulado)")
+        salida = io.StringIO()
+        pstats.Stats(perfilador, stream=salida).sort_stats("cumulative").print_stats(args.top)
+        print(salida.getvalue())
+        if salida_perfil:
+            perfilador.dump_stats(salida_perfil)
+            print(f"💾 Estadísticas guardadas en {salida_perfil}")
+
+    if args.perfil == "tracemalloc":
+        snapshot = tracemalloc.take_snapshot()
+        actual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"\n🧠 ASIGNACIONES (actual: {actual / 1024:.1f} KiB, pico: {pico / 1024:.1f} KiB)")
+        for estadistica in snapshot.statistics("lineno")[:args.top]:
+            print(f"  {estadistica}")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import os
 import psycopg2
 import logging
 
+import migraciones
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,17 +30,8 @@ def drop_all_tables():
     try:
         logger.info("🗑️  Eliminando todas las tablas existentes...")
         
-        # Lista de todas las tablas que queremos eliminar
-        tables_to_drop = [
-            'active_games',
-            'active_trivias', 
-            'authorized_chats',
-            'auth_requests',
-            'user_points',
-            'user_ranking',
-            'chat_config',
-            'challenges'
-        ]
+        # Todas las tablas del esquema (las que crean las migraciones)
+        tables_to_drop = migraciones.tablas()
         
         for table in tables_to_drop:
             try:
@@ -59,142 +52,10 @@ def drop_all_tables():
         conn.close()
 
 def create_fresh_tables():
-    """Crea todas las tablas con la estructura correcta"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        logger.info("🔨 Creando tablas con estructura actualizada...")
-        
-        # === TABLA DE JUEGOS ACTIVOS ===
-        cursor.execute("""
-            CREATE TABLE active_games (
-                chat_id BIGINT PRIMARY KEY,
-                juego TEXT NOT NULL,
-                respuesta TEXT NOT NULL,
-                pistas TEXT,
-                intentos INTEGER DEFAULT 0,
-                started_by BIGINT NOT NULL,
-                last_activity TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        logger.info("✅ Tabla 'active_games' creada")
-        
-        # === TABLA DE TRIVIAS ACTIVAS ===
-        cursor.execute("""
-            CREATE TABLE active_trivias (
-                chat_id BIGINT PRIMARY KEY,
-                pregunta TEXT NOT NULL,
-                respuesta TEXT NOT NULL,
-                start_time DOUBLE PRECISION NOT NULL,
-                opciones TEXT,
-                message_id BIGINT,
-                inline_keyboard_message_id BIGINT
-            )
-        """)
-        logger.info("✅ Tabla 'active_trivias' creada")
-        
-        # === TABLAS DE AUTORIZACIÓN ===
-        cursor.execute("""
-            CREATE TABLE authorized_chats (
-                chat_id BIGINT PRIMARY KEY,
-                chat_title TEXT,
-                authorized_by BIGINT,
-                authorized_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'active'
-            )
-        """)
-        logger.info("✅ Tabla 'authorized_chats' creada")
-        
-        cursor.execute("""
-            CREATE TABLE auth_requests (
-                id SERIAL PRIMARY KEY,
-                chat_id BIGINT NOT NULL,
-                chat_title TEXT,
-                requested_by BIGINT NOT NULL,
-                requester_username TEXT,
-                requested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending'
-            )
-        """)
-        logger.info("✅ Tabla 'auth_requests' creada")
-        
-        # === TABLAS DE USUARIOS Y PUNTOS ===
-        cursor.execute("""
-            CREATE TABLE user_points (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                chat_id BIGINT NOT NULL,
-                username TEXT,
-                chat_name TEXT,
-                points_gained INTEGER NOT NULL,
-                reason TEXT,
-                message_id BIGINT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        logger.info("✅ Tabla 'user_points' creada")
-        
-        cursor.execute("""
-            CREATE TABLE user_ranking (
-                user_id BIGINT NOT NULL,
-                chat_id BIGINT NOT NULL,
-                username TEXT,
-                chat_name TEXT,
-                total_points INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, chat_id)
-            )
-        """)
-        logger.info("✅ Tabla 'user_ranking' creada")
-        
-        # === TABLA DE CONFIGURACIÓN DE CHATS ===
-        cursor.execute("""
-            CREATE TABLE chat_config (
-                chat_id BIGINT PRIMARY KEY,
-                chat_name TEXT,
-                rankings_enabled BOOLEAN DEFAULT TRUE,
-                challenges_enabled BOOLEAN DEFAULT TRUE
-            )
-        """)
-        logger.info("✅ Tabla 'chat_config' creada")
-        
-        # === TABLA DE DESAFÍOS ===
-        cursor.execute("""
-            CREATE TABLE challenges (
-                id SERIAL PRIMARY KEY,
-                challenger_id BIGINT NOT NULL,
-                challengee_id BIGINT NOT NULL,
-                chat_id BIGINT NOT NULL,
-                message_id BIGINT,
-                status TEXT DEFAULT 'pending',
-                type TEXT,
-                data TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        logger.info("✅ Tabla 'challenges' creada")
-        
-        # === ÍNDICES PARA MEJORAR RENDIMIENTO ===
-        logger.info("🔧 Creando índices...")
-        
-        cursor.execute("CREATE INDEX idx_user_points_user_chat ON user_points(user_id, chat_id)")
-        cursor.execute("CREATE INDEX idx_user_points_created_at ON user_points(created_at)")
-        cursor.execute("CREATE INDEX idx_user_ranking_total_points ON user_ranking(total_points DESC)")
-        cursor.execute("CREATE INDEX idx_auth_requests_status ON auth_requests(status)")
-        cursor.execute("CREATE INDEX idx_challenges_status ON challenges(status)")
-        
-        logger.info("✅ Índices creados")
-        
-        conn.commit()
-        logger.info("🎉 ¡Base de datos recreada exitosamente!")
-        
-    except Exception as e:
-        logger.error(f"❌ Error creando tablas: {e}")
-        conn.rollback()
-        raise
-    finally:
-        cursor.close()
-        conn.close()
+    """Crea todas las tablas aplicando las migraciones desde cero"""
+    logger.info("🔨 Creando tablas con las migraciones...")
+    aplicadas = migraciones.migrar()
+    logger.info(f"🎉 ¡Base de datos recreada exitosamente! ({len(aplicadas)} migraciones)")
 
 def add_sample_data():
     """Añade datos de ejemplo para probar (opcional)"""
@@ -247,11 +108,7 @@ def verify_tables():
         tables = cursor.fetchall()
         table_names = [table[0] for table in tables]
         
-        expected_tables = [
-            'active_games', 'active_trivias', 'authorized_chats', 
-            'auth_requests', 'user_points', 'user_ranking', 
-            'chat_config', 'challenges'
-        ]
+        expected_tables = migraciones.tablas()
         
         for table in expected_tables:
             if table in table_names:
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Script para resolver conflictos de bot de Telegram
-Ejecutar antes de iniciar el bot principal
+Uso manual: descarta los updates pendientes. Ya no hace falta antes de
+cada arranque; bot.py elige un único líder de polling (ver liderazgo.py)
 """
 
 import asyncio
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Retención de user_points: compactación de los eventos antiguos.
+
+user_points guarda cada premio y get_user_stats / get_chat_stats la
+recorren. Los eventos con más de POINTS_RETENTION_DAYS días se compactan
+en user_points_summary (puntos y número de eventos por usuario, chat, mes
+y razón) y se borran; las estadísticas suman las dos tablas, así que no
+cambian, y user_ranking no se toca.
+
+La compactación corre en segundo plano en el líder y va despacio a
+propósito: lotes de POINTS_COMPACTION_BATCH eventos, cada uno en su propia
+transacción, con POINTS_COMPACTION_PAUSE segundos entre lotes. En
+PostgreSQL los meses enteros anteriores al corte se despachan soltando su
+partición (ver migraciones/m0004_retencion_puntos.py) y sólo el mes del
+corte se borra fila a fila. El progreso se registra en el log y en la
+fuente de métricas "retencion".
+
+Uso (una ronda a mano, con el bot en marcha o parado):
+    python3 retencion.py
+    python3 retencion.py --dias 90 --lote 5000 --pausa 0
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import db
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se informa del progreso de una ronda
+INTERVALO_INFORME = 10.0
+
+class CompactadorPuntos:
+    """Compacta por lotes los eventos anteriores al corte de retención"""
+
+    def __init__(self, retencion_dias: int = 180, lote: int = 1000, pausa: float = 0.5):
+        self.retencion_dias = retencion_dias
+        self.lote = lote
+        self.pausa = pausa
+        self.en_curso = False
+        self.progreso = {"pendientes": 0, "compactados": 0}
+        self.estadisticas = {
+            "rondas": 0,
+            "compactados": 0,
+            "particiones_eliminadas": 0,
+            "premios_purgados": 0,
+            "ultima_ronda_s": 0.0,
+            "ultimo_ritmo_por_s": 0.0,
+        }
+
+    def corte(self) -> datetime:
+        return datetime.now().astimezone() - timedelta(days=self.retencion_dias)
+
+    async def ronda(self) -> int:
+        """Compacta todo lo anterior al corte; devuelve cuántos eventos compactó"""
+        corte = self.corte()
+        pendientes = await asyncio.to_thread(db.count_points_before, corte)
+        self.en_curso = True
+        self.progreso = {"pendientes": pendientes, "compactados": 0}
+        if pendientes:
+            logger.info(f"🗜️ Compactando {pendientes} eventos de puntos anteriores al {corte:%Y-%m-%d}")
+        inicio = ultimo_informe = time.monotonic()
+        try:
+            while True:
+                compactados = await asyncio.to_thread(db.compact_point_partition, corte)
+                if compactados:
+                    self.estadisticas["particiones_eliminadas"] += 1
+                else:
+                    compactados = await asyncio.to_thread(db.compact_points_batch, corte, self.lote)
+                if not compactados:
+                    break
+                self.progreso["compactados"] += compactados
+                self.estadisticas["compactados"] += compactados
+                if time.monotonic() - ultimo_informe >= INTERVALO_INFORME:
+                    ultimo_informe = time.monotonic()
+                    self._informar(inicio)
+                await asyncio.sleep(self.pausa)
+
+            while True:
+                purgados = await asyncio.to_thread(db.prune_point_awards, corte, self.lote)
+                self.estadisticas["premios_purgados"] += purgados
+                if purgados < self.lote:
+                    break
+                await asyncio.sleep(self.pausa)
+        finally:
+            self.en_curso = False
+
+        duracion = time.monotonic() - inicio
+        hechos = self.progreso["compactados"]
+        self.estadisticas["rondas"] += 1
+        self.estadisticas["ultima_ronda_s"] = round(duracion, 1)
+        if hechos:
+            self.estadisticas["ultimo_ritmo_por_s"] = round(hechos / max(duracion, 1e-3), 1)
+            logger.info(f"✅ Compactación terminada: {hechos} eventos en {duracion:.1f}s")
+        return hechos
+
+    def _informar(self, inicio: float) -> None:
+        hechos, pendientes = self.progreso["compactados"], self.progreso["pendientes"]
+        porcentaje = 100 * hechos / pendientes if pendientes else 100
+        ritmo = hechos / max(time.monotonic() - inicio, 1e-3)
+        logger.info(f"🗜️ Compactación: {hechos}/{pendientes} eventos ({porcentaje:.0f}%), {ritmo:.0f}/s")
+
+    def metricas(self) -> dict:
+        return {
+            "retencion_dias": self.retencion_dias,
+            "en_curso": self.en_curso,
+            **self.progreso,
+            **self.estadisticas,
+        }
+
+async def compactar_periodicamente(intervalo: float) -> None:
+    """Mantiene las particiones y compacta una ronda cada `intervalo` segundos"""
+    if compactador.retencion_dias <= 0:
+        return
+    while True:
+        try:
+            await asyncio.to_thread(db.maintain_point_partitions)
+            await compactador.ronda()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo compactar user_points: {e}")
+        await asyncio.sleep(intervalo)
+
+def crear_compactador_desde_config() -> CompactadorPuntos:
+    """Crea el compactador con POINTS_RETENTION_DAYS, POINTS_COMPACTION_BATCH y POINTS_COMPACTION_PAUSE"""
+    from config import Config
+
+    return CompactadorPuntos(
+        retencion_dias=Config.POINTS_RETENTION_DAYS,
+        lote=Config.POINTS_COMPACTION_BATCH,
+        pausa=Config.POINTS_COMPACTION_PAUSE,
+    )
+
+compactador = crear_compactador_desde_config()
+registrar_fuente("retencion", compactador.metricas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta los eventos antiguos de user_points")
+    parser.add_argument("--dias", type=int, default=compactador.retencion_dias, help="Días de eventos que se conservan")
+    parser.add_argument("--lote", type=int, default=compactador.lote, help="Eventos por transacción")
+    parser.add_argument("--pausa", type=float, default=compactador.pausa, help="Segundos entre lotes")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    db.create_all_tables()
+    db.maintain_point_partitions()
+    compactador.retencion_dias, compactador.lote, compactador.pausa = args.dias, args.lote, args.pausa
+    asyncio.run(compactador.ronda())
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ import logging
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
-from db import get_connection, is_postgresql
+from db import epoch_ms, from_epoch_ms, get_connection, get_read_connection, is_postgresql
+from cola_salida import enviar_mensaje, responder
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -52,13 +53,13 @@ def authorize_chat(chat_id: int, chat_title: str, authorized_by: int):
             cursor.execute("""
                 INSERT INTO authorized_chats 
                 (chat_id, chat_title, authorized_by, authorized_at, status)
-                VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'active')
+                VALUES (%s, %s, %s, %s, 'active')
                 ON CONFLICT (chat_id) DO UPDATE SET
                     chat_title = EXCLUDED.chat_title,
                     authorized_by = EXCLUDED.authorized_by,
-                    authorized_at = CURRENT_TIMESTAMP,
+                    authorized_at = EXCLUDED.authorized_at,
                     status = 'active'
-            """, (chat_id, chat_title, authorized_by))
+            """, (chat_id, chat_title, authorized_by, epoch_ms()))
             
             # Marcar solicitud como aprobada
             cursor.execute("""
@@ -70,8 +71,8 @@ def authorize_chat(chat_id: int, chat_title: str, authorized_by: int):
             cursor.execute("""
                 INSERT OR REPLACE INTO authorized_chats 
                 (chat_id, chat_title, authorized_by, authorized_at, status)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP, 'active')
-            """, (chat_id, chat_title, authorized_by))
+                VALUES (?, ?, ?, ?, 'active')
+            """, (chat_id, chat_title, authorized_by, epoch_ms()))
             
             # Marcar solicitud como aprobada
             cursor.execute("""
@@ -88,26 +89,31 @@ def authorize_chat(chat_id: int, chat_title: str, authorized_by: int):
         logger.error(f"❌ Error autorizando chat: {e}")
         raise
 
+async def verificar_autorizacion(update: Update) -> bool:
+    """True si el chat puede usar el bot; en grupos no autorizados avisa y devuelve False"""
+    chat_id = update.effective_chat.id
+    
+    if not is_chat_authorized(chat_id):
+        if chat_id < 0:  # Es un grupo
+            try:
+                await update.message.reply_text(
+                    "❌ Este grupo no está autorizado para usar el bot.\n"
+                    "📝 Usa /solicitar para pedir autorización.",
+                    reply_to_message_id=update.message.message_id
+                )
+            except Exception as e:
+                logger.error(f"❌ Error enviando mensaje de no autorización: {e}")
+            return False
+        # Chat privado - siempre permitido
+    
+    return True
+
 def auth_required(func):
     """Decorador para requerir autorización en comandos"""
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = update.effective_chat.id
-        
-        if not is_chat_authorized(chat_id):
-            if chat_id < 0:  # Es un grupo
-                try:
-                    await update.message.reply_text(
-                        "❌ Este grupo no está autorizado para usar el bot.\n"
-                        "📝 Usa /solicitar para pedir autorización.",
-                        reply_to_message_id=update.message.message_id
-                    )
-                except Exception as e:
-                    logger.error(f"❌ Error enviando mensaje de no autorización: {e}")
-                return
-            else:  # Chat privado - siempre permitido
-                pass
-        
+        if not await verificar_autorizacion(update):
+            return
         return await func(update, context)
     return wrapper
 
@@ -214,10 +220,7 @@ async def cmd_solicitar_autorizacion(update: Update, context: ContextTypes.DEFAU
                     f"▫️ Para aprobar: /aprobar {chat.id}"
                 )
                 
-                await context.bot.send_message(
-                    chat_id=ADMIN_USER_ID,
-                    text=mensaje_admin
-                )
+                await enviar_mensaje(context.bot, ADMIN_USER_ID, mensaje_admin)
                 logger.info(f"📤 Notificación enviada al administrador {ADMIN_USER_ID}")
             except Exception as e:
                 logger.error(f"❌ Error notificando al administrador: {e}")
@@ -305,20 +308,21 @@ async def cmd_aprobar_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Aprobar el grupo
         authorize_chat(chat_id_to_approve, chat_title, user.id)
         
-        await update.message.reply_text(
+        await responder(
+            update,
             f"✅ Grupo aprobado exitosamente:\n"
             f"📋 {chat_title}\n"
             f"👤 Solicitado por: {requester}\n"
-            f"🆔 Chat ID: {chat_id_to_approve}",
-            reply_to_message_id=update.message.message_id
+            f"🆔 Chat ID: {chat_id_to_approve}"
         )
         
         # Notificar al grupo
         try:
-            await context.bot.send_message(
-                chat_id=chat_id_to_approve,
-                text="🎉 ¡Su grupo ha sido autorizado!\n"
-                     "Ya pueden usar todos los comandos del bot."
+            await enviar_mensaje(
+                context.bot,
+                chat_id_to_approve,
+                "🎉 ¡Su grupo ha sido autorizado!\n"
+                "Ya pueden usar todos los comandos del bot."
             )
             logger.info(f"📤 Grupo {chat_id_to_approve} notificado de autorización")
         except Exception as e:
@@ -343,7 +347,7 @@ async def cmd_ver_solicitudes(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     try:
-        conn = get_connection()
+        conn = get_read_connection(max_staleness=60)
         cursor = conn.cursor()
         
         if is_postgresql():
@@ -377,7 +381,7 @@ async def cmd_ver_solicitudes(update: Update, context: ContextTypes.DEFAULT_TYPE
             message += f"🆔 `{chat_id}`\n"
             message += f"📋 {chat_title or 'Sin título'}\n"
             message += f"👤 {requester or 'Sin nombre'}\n"
-            message += f"📅 {requested_at}\n"
+            message += f"📅 {from_epoch_ms(requested_at):%Y-%m-%d %H:%M}\n"
             message += f"▫️ Para aprobar: `/aprobar {chat_id}`\n\n"
         
         await update.message.reply_text(
@@ -449,6 +453,81 @@ async def cmd_status_auth(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_to_message_id=update.message.message_id
         )
 
+async def cmd_recargar_reglas(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recargar scoring_rules.json sin reiniciar el bot (solo administradores)"""
+    user = update.effective_user
+    
+    if ADMIN_USER_ID is None or user.id != ADMIN_USER_ID:
+        await update.message.reply_text(
+            "❌ Solo los administradores pueden usar este comando.",
+            reply_to_message_id=update.message.message_id
+        )
+        return
+    
+    from reglas_puntuacion import motor_reglas
+    
+    version_anterior = motor_reglas.version
+    if motor_reglas.recargar_si_cambio(forzar=True):
+        mensaje = f"✅ Reglas de puntuación recargadas (v{version_anterior} → v{motor_reglas.version})"
+    else:
+        mensaje = (
+            f"⚠️ No se pudieron recargar las reglas de {motor_reglas.ruta}; "
+            f"siguen activas las de la v{motor_reglas.version}. Revisa los logs."
+        )
+    await update.message.reply_text(mensaje, reply_to_message_id=update.message.message_id)
+
+async def cmd_puntos_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ajustes de puntuación del chat actual (solo administradores).
+
+    /puntoschat                 -> ver ajustes
+    /puntoschat #documental 8   -> puntos de un hashtag en este chat
+    /puntoschat reset           -> volver a las reglas generales
+    """
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    
+    if ADMIN_USER_ID is None or user.id != ADMIN_USER_ID:
+        await update.message.reply_text(
+            "❌ Solo los administradores pueden usar este comando.",
+            reply_to_message_id=update.message.message_id
+        )
+        return
+    
+    from configuracion_chats import configuracion_chats
+    
+    args = context.args or []
+    ajustes = dict(configuracion_chats.obtener(chat_id).puntuacion)
+    
+    try:
+        if not args:
+            hashtags = ajustes.get("hashtags", {})
+            if not hashtags:
+                mensaje = "ℹ️ Este chat usa las reglas de puntuación generales."
+            else:
+                lineas = [f"• #{nombre.lstrip('#')}: {datos.get('points', '=')} pts" for nombre, datos in hashtags.items()]
+                mensaje = "⚙️ Ajustes de puntuación de este chat:\n" + "\n".join(lineas)
+        elif args[0].lower() == "reset":
+            configuracion_chats.guardar_puntuacion(chat_id, None)
+            mensaje = "✅ Este chat vuelve a usar las reglas de puntuación generales."
+        elif len(args) == 2:
+            hashtag, puntos = args[0].lstrip("#"), int(args[1])
+            if puntos < 0:
+                raise ValueError("los puntos no pueden ser negativos")
+            hashtags = dict(ajustes.get("hashtags", {}))
+            hashtags[hashtag] = {**hashtags.get(hashtag, {}), "points": puntos}
+            ajustes["hashtags"] = hashtags
+            configuracion_chats.guardar_puntuacion(chat_id, ajustes)
+            mensaje = f"✅ #{hashtag} vale ahora {puntos} puntos en este chat."
+        else:
+            mensaje = "Uso: /puntoschat [#hashtag puntos | reset]"
+    except ValueError as e:
+        mensaje = f"❌ Ajuste no válido: {e}"
+    except Exception as e:
+        logger.error(f"❌ Error guardando ajustes de puntuación: {e}")
+        mensaje = "❌ Error guardando los ajustes de puntuación."
+    
+    await update.message.reply_text(mensaje, reply_to_message_id=update.message.message_id)
+
 # Función auxiliar para configurar administrador
 def set_admin_user_id(admin_id: int):
     """Configurar ID del administrador principal"""
@@ -497,7 +576,7 @@ def get_chat_auth_info(chat_id: int):
 def get_all_authorized_chats():
     """Obtener todos los chats autorizados"""
     try:
-        conn = get_connection()
+        conn = get_read_connection(max_staleness=60)
         cursor = conn.cursor()
         
         if is_postgresql():
@@ -570,16 +649,14 @@ def cleanup_old_requests(days_old: int = 30):
         conn = get_connection()
         cursor = conn.cursor()
         
+        cutoff_date = epoch_ms() - days_old * 86_400_000
         if is_postgresql():
             cursor.execute("""
                 DELETE FROM auth_requests 
-                WHERE requested_at < NOW() - INTERVAL '%s days' 
+                WHERE requested_at < %s 
                 AND status != 'pending'
-            """, (days_old,))
+            """, (cutoff_date,))
         else:
-            # Para SQLite, necesitamos calcular la fecha manualmente
-            from datetime import datetime, timedelta
-            cutoff_date = (datetime.now() - timedelta(days=days_old)).isoformat()
             cursor.execute("""
                 DELETE FROM auth_requests 
                 WHERE requested_at < ? 
@@ -649,11 +726,12 @@ async def cmd_revocar_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Notificar al grupo
         try:
-            await context.bot.send_message(
-                chat_id=chat_id_to_revoke,
-                text="🚫 La autorización de este grupo ha sido revocada.\n"
-                     "Los comandos del bot ya no funcionarán aquí.\n"
-                     "Usa /solicitar para pedir una nueva autorización."
+            await enviar_mensaje(
+                context.bot,
+                chat_id_to_revoke,
+                "🚫 La autorización de este grupo ha sido revocada.\n"
+                "Los comandos del bot ya no funcionarán aquí.\n"
+                "Usa /solicitar para pedir una nueva autorización."
             )
             logger.info(f"📤 Grupo {chat_id_to_revoke} notificado de revocación")
         except Exception as e:
@@ -689,7 +767,7 @@ async def cmd_grupos_autorizados(update: Update, context: ContextTypes.DEFAULT_T
     for chat in chats[:10]:  # Mostrar solo los primeros 10
         message += f"📋 {chat['chat_title'] or 'Sin título'}\n"
         message += f"🆔 `{chat['chat_id']}`\n"
-        message += f"📅 {chat['authorized_at']}\n"
+        message += f"📅 {from_epoch_ms(chat['authorized_at']):%Y-%m-%d %H:%M}\n"
         message += f"▫️ Para revocar: `/revocar {chat['chat_id']}`\n\n"
     
     if len(chats) > 10:
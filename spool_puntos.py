@@ -0,0 +1,90 @@
+# spool_puntos.py
+"""
+Spool local de puntos para cuando la base de datos no responde.
+
+add_points escribe aquí el evento (un archivo SQLite local, sólo
+inserciones) cuando el cortacircuitos está abierto o la conexión falla,
+y el usuario no pierde los puntos. db.replay_point_spool los reaplica
+en lotes cuando la base de datos vuelve; cada lote va en una transacción
+que también guarda en bot_state el último seq aplicado de este spool,
+así que reaplicar un lote ya aplicado (p. ej. si el proceso muere antes
+de borrarlo del spool) no suma dos veces.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SpoolPuntos:
+    """Cola persistente de eventos de puntos (seq creciente, nunca reutilizado)"""
+
+    def __init__(self, ruta: str = "spool_puntos.db"):
+        self.ruta = ruta
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._id: Optional[str] = None
+        self.estadisticas = {"guardados": 0, "reaplicados": 0}
+
+    def _conexion(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS spool (seq INTEGER PRIMARY KEY AUTOINCREMENT, datos TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS spool_meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+            # Identificador del archivo: si se borra y se recrea, los seq empiezan de nuevo
+            conn.execute("INSERT OR IGNORE INTO spool_meta (clave, valor) VALUES ('id', ?)", (uuid.uuid4().hex,))
+            self._id = conn.execute("SELECT valor FROM spool_meta WHERE clave = 'id'").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @property
+    def id(self) -> str:
+        with self._lock:
+            self._conexion()
+            return self._id
+
+    def guardar(self, evento: dict) -> int:
+        """Añade un evento; devuelve su seq"""
+        with self._lock:
+            cursor = self._conexion().execute("INSERT INTO spool (datos) VALUES (?)", (json.dumps(evento),))
+            self.estadisticas["guardados"] += 1
+            return cursor.lastrowid
+
+    def lote(self, tamaño: int) -> List[Tuple[int, dict]]:
+        """Los `tamaño` eventos más antiguos como (seq, evento)"""
+        with self._lock:
+            filas = self._conexion().execute(
+                "SELECT seq, datos FROM spool ORDER BY seq LIMIT ?", (tamaño,)
+            ).fetchall()
+        return [(seq, json.loads(datos)) for seq, datos in filas]
+
+    def borrar_hasta(self, seq: int) -> None:
+        with self._lock:
+            cursor = self._conexion().execute("DELETE FROM spool WHERE seq <= ?", (seq,))
+            self.estadisticas["reaplicados"] += cursor.rowcount
+
+    def profundidad(self) -> int:
+        with self._lock:
+            return self._conexion().execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def metricas(self) -> dict:
+        return {"ruta": self.ruta, "profundidad": self.profundidad(), **self.estadisticas}
+
+async def reaplicar_periodicamente(intervalo: float) -> None:
+    """Reaplica el spool cada `intervalo` segundos mientras tenga eventos"""
+    import db
+
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            reaplicados = await asyncio.to_thread(db.replay_point_spool)
+            if reaplicados:
+                logger.info(f"📥 Reaplicados {reaplicados} eventos de puntos del spool")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo reaplicar el spool de puntos: {e}")
@@ -0,0 +1,372 @@
+# tendencias.py
+"""
+Tendencias por chat con sketches en streaming.
+
+Cada mensaje puntuado actualiza, en el chat donde ocurrió:
+  - hashtags en tendencia: Space-Saving (los k más frecuentes con error
+    acotado) en ventanas de la última hora (12 cubetas de 5 min) y del
+    último día (24 cubetas de 1 h);
+  - usuarios más activos de la semana: Space-Saving ponderado por puntos
+    en 7 cubetas de un día;
+  - usuarios únicos: HyperLogLog (256 registros) por día.
+
+La memoria por chat está acotada (k entradas por cubeta, cubetas fijas)
+y el número de chats también (se olvidan los menos recientes). Consultar
+es fusionar como mucho 24 sketches de k entradas: no depende del volumen
+de mensajes ni toca user_points. Los chats modificados se guardan
+periódicamente en rate_limit_state (ámbito "tendencias") y se recargan al
+arrancar; los olvidados se borran de ahí en el mismo snapshot. Si guardar
+falla, los chats pendientes se reintentan en el siguiente.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from math import log
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from metricas import registrar_fuente
+
+logger = logging.getLogger(__name__)
+
+AMBITO_SNAPSHOT = "tendencias"
+_MASCARA64 = (1 << 64) - 1
+
+def _mezclar64(valor: int) -> int:
+    """splitmix64: hash estable de 64 bits para enteros (ids de usuario)"""
+    z = (valor + 0x9E3779B97F4A7C15) & _MASCARA64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASCARA64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASCARA64
+    return z ^ (z >> 31)
+
+class SpaceSaving:
+    """Los k elementos más pesados; cuenta - error es una cota inferior de la real"""
+
+    __slots__ = ("k", "contadores")
+
+    def __init__(self, k: int = 32):
+        self.k = k
+        self.contadores: Dict[str, List[int]] = {}   # elemento -> [cuenta, error]
+
+    def añadir(self, elemento: str, peso: int = 1) -> None:
+        contador = self.contadores.get(elemento)
+        if contador is not None:
+            contador[0] += peso
+        elif len(self.contadores) < self.k:
+            self.contadores[elemento] = [peso, 0]
+        else:
+            # Sustituye al mínimo y hereda su cuenta como error
+            minimo = min(self.contadores, key=lambda e: self.contadores[e][0])
+            cuenta = self.contadores.pop(minimo)[0]
+            self.contadores[elemento] = [cuenta + peso, cuenta]
+
+    def unir(self, otro: "SpaceSaving") -> None:
+        for elemento, (cuenta, error) in otro.contadores.items():
+            actual = self.contadores.setdefault(elemento, [0, 0])
+            actual[0] += cuenta
+            actual[1] += error
+        if len(self.contadores) > self.k:
+            mayores = sorted(self.contadores.items(), key=lambda e: e[1][0], reverse=True)[: self.k]
+            self.contadores = dict(mayores)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        mayores = sorted(self.contadores.items(), key=lambda e: e[1][0], reverse=True)[:n]
+        return [(elemento, cuenta) for elemento, (cuenta, _) in mayores]
+
+    def exportar(self):
+        return [[e, c, err] for e, (c, err) in self.contadores.items()]
+
+    @classmethod
+    def importar(cls, datos, k: int) -> "SpaceSaving":
+        sketch = cls(k)
+        sketch.contadores = {e: [c, err] for e, c, err in datos}
+        return sketch
+
+class HyperLogLog:
+    """Estimación de cardinalidad con 2^p registros de un byte (~1.04/sqrt(2^p) de error)"""
+
+    __slots__ = ("p", "registros")
+
+    def __init__(self, p: int = 8):
+        self.p = p
+        self.registros = bytearray(1 << p)
+
+    def añadir(self, valor: int) -> None:
+        h = _mezclar64(valor)
+        indice = h >> (64 - self.p)
+        resto = (h << self.p) & _MASCARA64
+        rango = 64 - self.p + 1 if resto == 0 else 65 - resto.bit_length()
+        if rango > self.registros[indice]:
+            self.registros[indice] = rango
+
+    def unir(self, otro: "HyperLogLog") -> None:
+        self.registros = bytearray(map(max, self.registros, otro.registros))
+
+    def estimar(self) -> int:
+        m = len(self.registros)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimacion = alfa * m * m / sum(2.0 ** -r for r in self.registros)
+        vacios = self.registros.count(0)
+        if estimacion <= 2.5 * m and vacios:
+            # Corrección para cardinalidades pequeñas (conteo lineal)
+            estimacion = m * log(m / vacios)
+        return round(estimacion)
+
+    def exportar(self):
+        return self.registros.hex()
+
+    @classmethod
+    def importar(cls, datos, p: int) -> "HyperLogLog":
+        sketch = cls(p)
+        sketch.registros = bytearray.fromhex(datos)
+        return sketch
+
+class VentanaDeslizante:
+    """Sketches en cubetas de `segundos`; la ventana abarca las últimas `cubetas`"""
+
+    __slots__ = ("segundos", "cubetas", "crear", "datos")
+
+    def __init__(self, segundos: int, cubetas: int, crear: Callable[[], object]):
+        self.segundos = segundos
+        self.cubetas = cubetas
+        self.crear = crear
+        self.datos: "OrderedDict[int, object]" = OrderedDict()
+
+    def _purgar(self, actual: int) -> None:
+        while self.datos and next(iter(self.datos)) <= actual - self.cubetas:
+            self.datos.popitem(last=False)
+
+    def cubeta(self, instante: float):
+        numero = int(instante // self.segundos)
+        self._purgar(numero)
+        sketch = self.datos.get(numero)
+        if sketch is None:
+            sketch = self.datos[numero] = self.crear()
+        return sketch
+
+    def fusion(self, instante: float):
+        self._purgar(int(instante // self.segundos))
+        total = self.crear()
+        for sketch in self.datos.values():
+            total.unir(sketch)
+        return total
+
+    def exportar(self):
+        return [[numero, sketch.exportar()] for numero, sketch in self.datos.items()]
+
+    def importar(self, datos, cargar: Callable[[object], object]) -> None:
+        self.datos = OrderedDict((numero, cargar(sketch)) for numero, sketch in sorted(datos))
+
+class TendenciasChat:
+    """Sketches de un chat"""
+
+    __slots__ = ("hashtags_hora", "hashtags_dia", "usuarios_semana", "unicos", "nombres")
+
+    def __init__(self, k: int):
+        self.hashtags_hora = VentanaDeslizante(300, 12, lambda: SpaceSaving(k))
+        self.hashtags_dia = VentanaDeslizante(3600, 24, lambda: SpaceSaving(k))
+        self.usuarios_semana = VentanaDeslizante(86400, 7, lambda: SpaceSaving(k))
+        self.unicos = VentanaDeslizante(86400, 7, HyperLogLog)
+        self.nombres: Dict[str, str] = {}   # user_id -> último nombre visto
+
+    def _ventanas(self):
+        return {
+            "hashtags_hora": self.hashtags_hora, "hashtags_dia": self.hashtags_dia,
+            "usuarios_semana": self.usuarios_semana, "unicos": self.unicos,
+        }
+
+    def exportar(self) -> dict:
+        # Sólo los nombres de usuarios que siguen en algún sketch
+        vivos = {u for s in self.usuarios_semana.datos.values() for u in s.contadores}
+        self.nombres = {u: n for u, n in self.nombres.items() if u in vivos}
+        return {
+            **{nombre: ventana.exportar() for nombre, ventana in self._ventanas().items()},
+            "nombres": self.nombres,
+        }
+
+    def importar(self, datos: dict, k: int) -> None:
+        for nombre, ventana in self._ventanas().items():
+            if nombre == "unicos":
+                ventana.importar(datos.get(nombre, []), lambda d: HyperLogLog.importar(d, 8))
+            else:
+                ventana.importar(datos.get(nombre, []), lambda d: SpaceSaving.importar(d, k))
+        self.nombres = dict(datos.get("nombres", {}))
+
+class RegistroTendencias:
+    """Tendencias de todos los chats, con un máximo de chats en memoria"""
+
+    def __init__(self, k: int = 32, max_chats: int = 5000):
+        self.k = k
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, TendenciasChat]" = OrderedDict()
+        self._modificados: set = set()
+        self._olvidados: set = set()  # chats olvidados aún guardados en rate_limit_state
+        self._lock = threading.Lock()
+        self.estadisticas = {"eventos": 0, "consultas": 0, "chats_olvidados": 0, "snapshots": 0}
+
+    def _chat(self, chat_id: int, crear: bool = True) -> Optional[TendenciasChat]:
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            self._chats.move_to_end(chat_id)
+        elif crear:
+            chat = self._chats[chat_id] = TendenciasChat(self.k)
+            self._olvidados.discard(chat_id)
+            while len(self._chats) > self.max_chats:
+                olvidado, _ = self._chats.popitem(last=False)
+                self._modificados.discard(olvidado)
+                self._olvidados.add(olvidado)
+                self.estadisticas["chats_olvidados"] += 1
+        return chat
+
+    def registrar(self, chat_id: int, user_id: int, username: Optional[str], puntos: int,
+                  hashtags: Iterable[str] = (), instante: Optional[float] = None) -> None:
+        """Actualiza los sketches del chat con un mensaje puntuado"""
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            chat = self._chat(chat_id)
+            for hashtag in dict.fromkeys(hashtags):
+                chat.hashtags_hora.cubeta(instante).añadir(hashtag)
+                chat.hashtags_dia.cubeta(instante).añadir(hashtag)
+            usuario = str(user_id)
+            if puntos > 0:
+                chat.usuarios_semana.cubeta(instante).añadir(usuario, puntos)
+            chat.unicos.cubeta(instante).añadir(user_id)
+            if username:
+                chat.nombres[usuario] = username
+            self._modificados.add(chat_id)
+            self.estadisticas["eventos"] += 1
+
+    def registrar_evento(self, evento) -> None:
+        """Atajo para un logros.EventoPuntos"""
+        instante = evento.instante.timestamp() if evento.instante else None
+        self.registrar(evento.chat_id, evento.user_id, evento.username, evento.puntos,
+                       evento.hashtags, instante)
+
+    # ---- consultas ----
+
+    def top_hashtags(self, chat_id: int, ventana: str = "hora", n: int = 5,
+                     instante: Optional[float] = None) -> List[Tuple[str, int]]:
+        """Hashtags más usados en la última hora ("hora") o día ("dia")"""
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            self.estadisticas["consultas"] += 1
+            chat = self._chat(chat_id, crear=False)
+            if chat is None:
+                return []
+            ventana_chat = chat.hashtags_hora if ventana == "hora" else chat.hashtags_dia
+            return ventana_chat.fusion(instante).top(n)
+
+    def top_usuarios(self, chat_id: int, n: int = 5,
+                     instante: Optional[float] = None) -> List[Tuple[int, str, int]]:
+        """(user_id, nombre, puntos) de los usuarios con más puntos en los últimos 7 días"""
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            self.estadisticas["consultas"] += 1
+            chat = self._chat(chat_id, crear=False)
+            if chat is None:
+                return []
+            return [
+                (int(usuario), chat.nombres.get(usuario, usuario), puntos)
+                for usuario, puntos in chat.usuarios_semana.fusion(instante).top(n)
+            ]
+
+    def usuarios_unicos(self, chat_id: int, dias: int = 1, instante: Optional[float] = None) -> int:
+        """Usuarios distintos con puntos en los últimos `dias` días naturales (UTC, máx. 7)"""
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            self.estadisticas["consultas"] += 1
+            chat = self._chat(chat_id, crear=False)
+            if chat is None:
+                return 0
+            chat.unicos.fusion(instante)  # purga cubetas caducadas
+            desde = int(instante // 86400) - dias + 1
+            total = HyperLogLog()
+            for numero, sketch in chat.unicos.datos.items():
+                if numero >= desde:
+                    total.unir(sketch)
+            return total.estimar()
+
+    # ---- snapshots ----
+
+    def _serializar(self, ids: Iterable[int]) -> Dict[str, str]:
+        return {str(chat_id): json.dumps(self._chats[chat_id].exportar()) for chat_id in ids}
+
+    def exportar(self, solo_modificados: bool = True) -> Dict[str, str]:
+        with self._lock:
+            return self._serializar(self._modificados if solo_modificados else self._chats)
+
+    def importar(self, entradas: Dict[str, str], filtro: Optional[Callable[[int], bool]] = None) -> int:
+        cargados = 0
+        with self._lock:
+            for clave, datos in entradas.items():
+                chat_id = int(clave)
+                if filtro is not None and not filtro(chat_id):
+                    continue
+                try:
+                    self._chat(chat_id).importar(json.loads(datos), self.k)
+                    cargados += 1
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.warning(f"⚠️ Tendencias inválidas para el chat {chat_id}: {e}")
+        return cargados
+
+    def guardar(self) -> int:
+        """Guarda los chats modificados desde el último snapshot y borra los olvidados"""
+        from db import delete_rate_limit_state, save_rate_limit_state
+
+        with self._lock:
+            pendientes, self._modificados = self._modificados, set()
+            olvidados, self._olvidados = self._olvidados, set()
+            entradas = self._serializar(pendientes)
+        try:
+            if olvidados:
+                delete_rate_limit_state(AMBITO_SNAPSHOT, olvidados)
+            if entradas:
+                save_rate_limit_state(AMBITO_SNAPSHOT, entradas, replace=False)
+        except Exception:
+            with self._lock:
+                # Se reintentan en el próximo snapshot, salvo lo que haya cambiado entretanto
+                self._modificados |= {chat_id for chat_id in pendientes if chat_id in self._chats}
+                self._olvidados |= {chat_id for chat_id in olvidados if chat_id not in self._chats}
+            raise
+        self.estadisticas["snapshots"] += 1
+        return len(entradas)
+
+    async def guardar_periodicamente(self, intervalo: float) -> None:
+        """Tarea en segundo plano: snapshot cada `intervalo` segundos"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await loop.run_in_executor(None, self.guardar)
+            except Exception as e:
+                logger.error(f"❌ Error guardando tendencias: {e}")
+
+    def cargar(self, filtro: Optional[Callable[[int], bool]] = None) -> None:
+        from db import load_rate_limit_state
+
+        cargados = self.importar(load_rate_limit_state(AMBITO_SNAPSHOT), filtro)
+        logger.info(f"📈 Tendencias restauradas de {cargados} chats")
+
+    def metricas(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "max_chats": self.max_chats,
+            "pendientes_snapshot": len(self._modificados),
+            "pendientes_borrar": len(self._olvidados),
+            **self.estadisticas,
+        }
+
+def crear_tendencias_desde_config() -> RegistroTendencias:
+    """Crea el registro con TRENDS_TOP_K y TRENDS_MAX_CHATS"""
+    from config import Config
+
+    registro = RegistroTendencias(k=Config.TRENDS_TOP_K, max_chats=Config.TRENDS_MAX_CHATS)
+    registrar_fuente("tendencias", registro.metricas)
+    return registro
+
+# Instancia global: la alimentan los eventos de puntos y la consulta /tendencias
+tendencias = crear_tendencias_desde_config()